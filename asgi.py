@@ -0,0 +1,128 @@
+"""ASGI entry point: async caption generation alongside the existing Flask app.
+
+Run with uvicorn workers so one process can hold hundreds of in-flight
+generations instead of pinning a sync worker per upstream call:
+
+    gunicorn -k uvicorn.workers.UvicornWorker --workers 2 --bind 0.0.0.0:5000 asgi:app
+
+POST /api/generate is served natively with AsyncOpenAI. Every other route
+is the unchanged Flask app, run on a thread pool (ASGI_WSGI_THREADS).
+"""
+
+import os
+import json
+import logging
+from http.cookies import SimpleCookie
+
+from uvicorn.middleware.wsgi import WSGIMiddleware
+
+from main import (
+    app as flask_app,
+    async_client_pool,
+    async_generate_within_budget,
+    classify_generation_error,
+    generate_response,
+    mock_generate_instagram_captions,
+    pipeline_metrics,
+    read_generate_payload,
+    GENERATION_ERROR_STATUS,
+)
+
+flask_asgi = WSGIMiddleware(flask_app, workers=int(os.environ.get("ASGI_WSGI_THREADS", "16")))
+
+
+async def read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+async def send_json(send, status, payload):
+    pipeline_metrics.set_status(status)
+    body = json.dumps(payload).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode('ascii')),
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def session_api_key(scope):
+    """Read the API key saved in the Flask session cookie, if any"""
+    cookies = SimpleCookie()
+    for name, value in scope.get('headers', []):
+        if name == b'cookie':
+            cookies.load(value.decode('latin-1'))
+    morsel = cookies.get(flask_app.config['SESSION_COOKIE_NAME'])
+    if morsel is None:
+        return ''
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    try:
+        return serializer.loads(morsel.value).get('api_key', '')
+    except Exception:
+        return ''
+
+
+async def generate(scope, receive, send):
+    """Async version of the Flask /api/generate route"""
+    try:
+        data = json.loads(await read_body(receive) or b'{}')
+    except ValueError:
+        data = {}
+    payload = read_generate_payload(data)
+
+    if not payload['topic'] or not payload['tone']:
+        await send_json(send, 400, {'error': 'Please provide a topic and a tone.', 'error_kind': 'invalid'})
+        return
+
+    if payload['use_mock']:
+        captions = mock_generate_instagram_captions(payload['topic'], payload['tone'], payload['length'])
+        await send_json(send, 200, {'captions': captions.split('\n'), 'is_mock': True})
+        return
+
+    api_key = payload['api_key'] or session_api_key(scope)
+    try:
+        captions, degraded = await async_generate_within_budget(payload['topic'], payload['tone'],
+                                                                payload['length'], api_key=api_key,
+                                                                fresh=payload['fresh'])
+    except Exception as e:
+        kind = classify_generation_error(str(e))
+        await send_json(send, GENERATION_ERROR_STATUS[kind], {'error': str(e), 'error_kind': kind})
+        return
+
+    await send_json(send, 200, generate_response(captions, degraded))
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            # Schedules AsyncOpenAI.close() for every pooled client on this loop
+            async_client_pool.close()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+    elif scope['type'] == 'http' and scope['path'] == '/api/generate' and scope['method'] == 'POST':
+        # Each ASGI request runs in its own task, so the trace context stays per request
+        pipeline_metrics.begin_request('api_generate', 'POST')
+        try:
+            await generate(scope, receive, send)
+        finally:
+            pipeline_metrics.end_request()
+    elif scope['type'] == 'http':
+        await flask_asgi(scope, receive, send)
+    else:
+        logging.warning(f"Unsupported ASGI scope type: {scope['type']}")
@@ -0,0 +1,155 @@
+"""Fingerprinted, precompressed static assets.
+
+Run `python assets.py` at build time to write content-hashed copies of the
+CSS/JS (plus .gz and .br variants) and a manifest into static/dist/. At
+runtime AssetRegistry loads the manifest and serves those bytes from memory
+with long-lived caching headers. Without a build (local development) the
+registry fingerprints and gzips the source files in memory instead.
+"""
+
+import os
+import json
+import gzip
+import hashlib
+import logging
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_NAME = 'manifest.json'
+
+# Source assets referenced by templates through asset_url()
+SOURCE_ASSETS = ('css/app.css', 'js/app.js')
+
+CONTENT_TYPES = {
+    '.css': 'text/css; charset=utf-8',
+    '.js': 'application/javascript; charset=utf-8',
+}
+
+# Preference order when the client accepts several encodings
+ENCODING_SUFFIXES = (('br', '.br'), ('gzip', '.gz'))
+
+
+def fingerprint(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def hashed_name(name, digest):
+    root, ext = os.path.splitext(name)
+    return f"{root}.{digest}{ext}"
+
+
+def compress_variants(data, with_brotli=True):
+    """Return {encoding: bytes} for the identity, gzip and (if available) brotli forms"""
+    variants = {'identity': data, 'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    if with_brotli and brotli is not None:
+        variants['br'] = brotli.compress(data, quality=11)
+    return variants
+
+
+def build_assets(static_dir=STATIC_DIR, dist_dir=DIST_DIR):
+    """Write fingerprinted and precompressed assets plus manifest.json into dist_dir"""
+    if brotli is None:
+        logging.warning("brotli is not installed; building gzip variants only (pip install brotli)")
+    manifest = {}
+    for name in SOURCE_ASSETS:
+        with open(os.path.join(static_dir, name), 'rb') as f:
+            data = f.read()
+        digest = fingerprint(data)
+        public_name = hashed_name(name, digest)
+        target = os.path.join(dist_dir, public_name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+
+        variants = compress_variants(data)
+        with open(target, 'wb') as f:
+            f.write(variants['identity'])
+        for encoding, suffix in ENCODING_SUFFIXES:
+            if encoding in variants:
+                with open(target + suffix, 'wb') as f:
+                    f.write(variants[encoding])
+
+        manifest[name] = {
+            'file': public_name,
+            'etag': digest,
+            'encodings': [e for e, _ in ENCODING_SUFFIXES if e in variants],
+            'bytes': {e: len(v) for e, v in variants.items()},
+        }
+
+    with open(os.path.join(dist_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+class Asset:
+    __slots__ = ('content_type', 'etag', 'variants')
+
+    def __init__(self, content_type, etag, variants):
+        self.content_type = content_type
+        self.etag = etag
+        self.variants = variants
+
+    def negotiate(self, accept_encoding):
+        """Pick the smallest variant the client accepts, returning (encoding, bytes)"""
+        accepted = {part.split(';')[0].strip() for part in (accept_encoding or '').lower().split(',')}
+        for encoding, _ in ENCODING_SUFFIXES:
+            if encoding in accepted and encoding in self.variants:
+                return encoding, self.variants[encoding]
+        return 'identity', self.variants['identity']
+
+
+class AssetRegistry:
+    """In-memory map from logical asset names to fingerprinted URLs and their bytes"""
+
+    def __init__(self, static_dir=STATIC_DIR, dist_dir=DIST_DIR):
+        self.urls = {}
+        self.assets = {}
+        manifest_path = os.path.join(dist_dir, MANIFEST_NAME)
+        if os.path.exists(manifest_path):
+            self._load_build(dist_dir, manifest_path)
+        else:
+            logging.info("No built assets found; fingerprinting static sources in memory")
+            self._load_sources(static_dir)
+
+    def _add(self, name, public_name, etag, variants):
+        content_type = CONTENT_TYPES.get(os.path.splitext(name)[1], 'application/octet-stream')
+        self.urls[name] = public_name
+        self.assets[public_name] = Asset(content_type, etag, variants)
+
+    def _load_build(self, dist_dir, manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        suffixes = dict(ENCODING_SUFFIXES)
+        for name, entry in manifest.items():
+            path = os.path.join(dist_dir, entry['file'])
+            variants = {}
+            with open(path, 'rb') as f:
+                variants['identity'] = f.read()
+            for encoding in entry['encodings']:
+                with open(path + suffixes[encoding], 'rb') as f:
+                    variants[encoding] = f.read()
+            self._add(name, entry['file'], entry['etag'], variants)
+
+    def _load_sources(self, static_dir):
+        for name in SOURCE_ASSETS:
+            with open(os.path.join(static_dir, name), 'rb') as f:
+                data = f.read()
+            digest = fingerprint(data)
+            # Brotli at max quality is slow; leave it to the build step
+            self._add(name, hashed_name(name, digest), digest, compress_variants(data, with_brotli=False))
+
+    def public_name(self, name):
+        return self.urls[name]
+
+    def get(self, public_name):
+        return self.assets.get(public_name)
+
+
+if __name__ == '__main__':
+    built = build_assets()
+    for name, entry in built.items():
+        sizes = ', '.join(f"{e} {n}" for e, n in entry['bytes'].items())
+        print(f"{name} -> dist/{entry['file']} ({sizes} bytes)")
@@ -0,0 +1,68 @@
+import os
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from client_pool import hash_api_key
+
+
+class BatchRunner:
+    """Runs batch caption items on a shared thread pool with a concurrency cap per API key"""
+
+    def __init__(self, max_workers=32, per_key_limit=4):
+        self.per_key_limit = per_key_limit
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="caption-batch")
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def _semaphore(self, limit_key):
+        # One semaphore per key, shared by every batch running with that key in this worker
+        with self._lock:
+            semaphore = self._semaphores.get(limit_key)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.per_key_limit)
+                self._semaphores[limit_key] = semaphore
+            return semaphore
+
+    def run(self, items, handler, api_key=None):
+        """Run handler(index, item) for every item, yielding results in completion order"""
+        limit_key = hash_api_key(api_key) if api_key else 'mock'
+        semaphore = self._semaphore(limit_key)
+        results = queue.Queue()
+        cancelled = threading.Event()
+
+        def task(index, item):
+            try:
+                results.put(handler(index, item))
+            except Exception as e:
+                logging.error(f"Batch item {index} crashed: {e}")
+                results.put({'index': index, 'status': 'error', 'error_kind': 'error', 'error': str(e)})
+            finally:
+                semaphore.release()
+
+        def feed():
+            # Submitting from a feeder thread keeps pool threads from blocking on the semaphore
+            for index, item in enumerate(items):
+                semaphore.acquire()
+                if cancelled.is_set():
+                    semaphore.release()
+                    return
+                self._executor.submit(task, index, item)
+
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+        try:
+            for _ in range(len(items)):
+                yield results.get()
+        finally:
+            # Stop feeding new items if the client disconnects mid-batch
+            cancelled.set()
+
+
+def create_batch_runner_from_env():
+    """Configure the batch runner from BATCH_* environment variables"""
+    return BatchRunner(
+        max_workers=int(os.environ.get("BATCH_WORKERS", "32")),
+        per_key_limit=int(os.environ.get("BATCH_CONCURRENCY_PER_KEY", "4")),
+    )
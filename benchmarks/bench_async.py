@@ -0,0 +1,122 @@
+"""Load test the sync deployment (gunicorn main:app) against the async one (asgi:app).
+
+Both servers are started with gunicorn and pointed at a local fake OpenAI
+server with injected latency, then driven with the same concurrent load on
+POST /api/generate:
+
+    python benchmarks/bench_async.py --latency 1.0 --requests 400 --concurrency 200
+"""
+
+import os
+import sys
+import time
+import json
+import socket
+import asyncio
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import httpx  # noqa: E402
+
+from fake_openai import FakeOpenAIServer  # noqa: E402
+from bench_client_pool import percentile  # noqa: E402
+
+MODES = {
+    'sync': ["main:app"],
+    'async': ["-k", "uvicorn.workers.UvicornWorker", "asgi:app"],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+async def drive(url, mode, args):
+    """Fire the requests from one event loop so the load generator itself stays cheap"""
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    timings = []
+    errors = 0
+
+    async with httpx.AsyncClient(limits=limits, timeout=600) as client:
+        async def one(index):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                # Unique topics so the caption cache never short-circuits the upstream call
+                response = await client.post(url, json={"topic": f"{mode} topic {index}", "tone": "funny",
+                                                        "api_key": "sk-bench", "fresh": True})
+                timings.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(index) for index in range(args.requests)))
+        return timings, errors, time.perf_counter() - start
+
+
+def run_mode(mode, base_url, args):
+    port = free_port()
+    env = dict(os.environ, OPENAI_BASE_URL=base_url)
+    command = [sys.executable, "-m", "gunicorn", "--workers", str(args.workers),
+               "--bind", f"127.0.0.1:{port}", "--timeout", "120"] + MODES[mode]
+    server = subprocess.Popen(command, cwd=ROOT, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        url = f"http://127.0.0.1:{port}/api/generate"
+        timings, errors, elapsed = asyncio.run(drive(url, mode, args))
+        return {
+            'mode': mode,
+            'workers': args.workers,
+            'requests': args.requests,
+            'errors': errors,
+            'throughput_rps': round(args.requests / elapsed, 1),
+            'p50_ms': round(percentile(timings, 50) * 1000, 1),
+            'p99_ms': round(percentile(timings, 99) * 1000, 1),
+        }
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=1.0, help="fake upstream latency in seconds")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers for both modes")
+    parser.add_argument("--modes", default="sync,async")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    with FakeOpenAIServer(latency=args.latency) as fake:
+        results = [run_mode(mode, fake.base_url, args) for mode in args.modes.split(",")]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'mode':<8}{'workers':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for r in results:
+        print(f"{r['mode']:<8}{r['workers']:>8}{r['throughput_rps']:>10}{r['p50_ms']:>10}"
+              f"{r['p99_ms']:>10}{r['errors']:>8}")
+
+
+if __name__ == '__main__':
+    main()
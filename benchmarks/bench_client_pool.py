@@ -0,0 +1,107 @@
+"""Compare a fresh OpenAI client per request against the pooled client.
+
+Runs against a local fake OpenAI server (TLS by default) so the cost of
+client construction, connection setup and TLS handshakes is visible.
+
+    python benchmarks/bench_client_pool.py --requests 300 --concurrency 4
+"""
+
+import os
+import sys
+import time
+import json
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_openai import FakeOpenAIServer  # noqa: E402
+from client_pool import OpenAIClientPool, create_openai_client  # noqa: E402
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def call(client):
+    client.chat.completions.create(
+        model="gpt-4o",
+        messages=[{"role": "user", "content": "coffee"}],
+        max_tokens=800,
+    )
+
+
+def run(label, server, requests, concurrency, one_request):
+    before = server.stats
+    timings = []
+
+    def timed(_):
+        start = time.perf_counter()
+        one_request()
+        timings.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(timed, range(requests)))
+    elapsed = time.perf_counter() - start
+    after = server.stats
+    return {
+        'mode': label,
+        'requests': requests,
+        'p50_ms': round(percentile(timings, 50) * 1000, 2),
+        'p99_ms': round(percentile(timings, 99) * 1000, 2),
+        'mean_ms': round(statistics.mean(timings) * 1000, 2),
+        'throughput_rps': round(requests / elapsed, 1),
+        'connections_opened': after['connections'] - before['connections'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.0, help="fake upstream latency in seconds")
+    parser.add_argument("--no-tls", action="store_true", help="serve plain HTTP instead of HTTPS")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    with FakeOpenAIServer(latency=args.latency, tls=not args.no_tls) as server:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        verify = server.ssl_context()
+
+        def per_request():
+            # The pre-pool behaviour: construct, use and drop a client every time
+            client = create_openai_client("sk-bench", verify=verify)
+            try:
+                call(client)
+            finally:
+                client.close()
+
+        pool = OpenAIClientPool(factory=lambda key: create_openai_client(key, verify=verify))
+
+        def pooled():
+            with pool.client("sk-bench") as client:
+                call(client)
+
+        results = [
+            run("client-per-request", server, args.requests, args.concurrency, per_request),
+            run("pooled", server, args.requests, args.concurrency, pooled),
+        ]
+        results[1]['pool'] = pool.snapshot()
+        pool.close()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'mode':<20}{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}{'req/s':>10}{'conns':>8}")
+    for r in results:
+        print(f"{r['mode']:<20}{r['p50_ms']:>10}{r['p99_ms']:>10}{r['mean_ms']:>10}"
+              f"{r['throughput_rps']:>10}{r['connections_opened']:>8}")
+    print(f"pool reuse ratio: {results[1]['pool']['reuse_ratio']}")
+
+
+if __name__ == '__main__':
+    main()
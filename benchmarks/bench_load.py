@@ -0,0 +1,281 @@
+"""End-to-end load test of the real Flask routes against the fake OpenAI server.
+
+Starts the fake server (latency distribution, token rate, injected 429/500s)
+and gunicorn serving the app, then ramps closed-loop virtual users through a
+weighted mix of page views, generations on /, demo (mock) generations,
+/setup-api-key and /update-api-key. Each ramp stage reports throughput,
+p50/p95/p99 latency, outcomes and peak RSS per gunicorn worker, and the run
+is saved as JSON so later runs can be compared with it:
+
+    python benchmarks/bench_load.py --ramp 1,8,32 --stage-seconds 15 --latency lognormal:0.8,0.5 --errors 429:0.03,500:0.01
+    python benchmarks/bench_load.py --compare benchmarks/results/load-20240601-120000.json
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import threading
+import subprocess
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import httpx  # noqa: E402
+
+import reporting  # noqa: E402
+from fake_openai import FakeOpenAIServer  # noqa: E402
+from bench_client_pool import percentile  # noqa: E402
+from bench_async import free_port, wait_for_port  # noqa: E402
+
+TONES = ["Funny", "Chill", "Romantic", "Adventurous", "Sarcastic", "Inspirational", "Playful", "Dreamy"]
+LENGTHS = ["short", "medium", "long"]
+
+WORKER_CLASSES = {
+    'sync': ["main:app"],
+    'gthread': ["-k", "gthread", "main:app"],
+    'uvicorn': ["-k", "uvicorn.workers.UvicornWorker", "asgi:app"],
+}
+
+# Outcomes that count as a served request; everything else is an error in the summary
+SUCCESS = ('ok', 'degraded')
+
+
+def build_request(scenario, user, rng, args):
+    """(method, path, form data) for one request of a scenario"""
+    topic = f"load topic {rng.randrange(args.topics)}"
+    tone = ", ".join(rng.sample(TONES, rng.randint(1, 2)))
+    key = f"sk-load-{user}"
+    if scenario == 'page':
+        return 'GET', '/', None
+    if scenario == 'generate':
+        return 'POST', '/', {'topic': topic, 'tone': tone, 'length': rng.choice(LENGTHS), 'api_key': key}
+    if scenario == 'mock':
+        return 'POST', '/', {'topic': topic, 'tone': tone, 'length': rng.choice(LENGTHS), 'use_mock': 'true'}
+    if scenario == 'setup':
+        return 'POST', '/setup-api-key', {'api_key': key, 'topic': topic, 'tone': tone}
+    if scenario == 'update':
+        return 'POST', '/update-api-key', {'new_api_key': key, 'topic': topic, 'tone': tone}
+    raise ValueError(f"unknown scenario: {scenario}")
+
+
+def classify(response, scenario):
+    """ok, degraded (fallback captions), error_page, no_captions, redirect or http_<status>"""
+    if response.status_code >= 400:
+        return f"http_{response.status_code}"
+    if response.status_code >= 300:
+        return 'redirect'
+    if scenario == 'page':
+        return 'ok'
+    body = response.text
+    if 'class="caption-card"' in body:
+        return 'degraded' if 'alert-warning' in body else 'ok'
+    return 'error_page' if 'alert-danger' in body else 'no_captions'
+
+
+def parse_mix(spec):
+    mix = {}
+    for item in spec.split(','):
+        name, _, weight = item.partition('=')
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def worker_pids(master_pid):
+    """PIDs of the gunicorn workers forked from master_pid (Linux /proc only)"""
+    pids = []
+    for entry in os.listdir('/proc') if os.path.isdir('/proc') else []:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # The command name may contain spaces, so split after its closing parenthesis
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == master_pid:
+            pids.append(int(entry))
+    return pids
+
+
+def rss_mb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class RssSampler(threading.Thread):
+    """Track the peak RSS of each gunicorn worker between calls to take()"""
+
+    def __init__(self, master_pid, interval=0.25):
+        super().__init__(daemon=True)
+        self.master_pid = master_pid
+        self.interval = interval
+        self.peaks = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        for pid in worker_pids(self.master_pid):
+            value = rss_mb(pid)
+            if value is not None:
+                with self.lock:
+                    self.peaks[pid] = max(self.peaks.get(pid, 0), value)
+
+    def take(self):
+        self.sample()
+        with self.lock:
+            peaks, self.peaks = self.peaks, {}
+        return {str(pid): round(value, 1) for pid, value in sorted(peaks.items())}
+
+
+async def run_stage(base_url, concurrency, args, mix, seed):
+    """Closed loop: each virtual user sends its next request as soon as the previous one returns"""
+    records = []
+    names, weights = list(mix), list(mix.values())
+    deadline = time.monotonic() + args.stage_seconds
+
+    async def user_loop(user):
+        rng = random.Random(seed * 1000 + user)
+        limits = httpx.Limits(max_connections=1)
+        async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+            while time.monotonic() < deadline:
+                scenario = rng.choices(names, weights)[0]
+                method, path, data = build_request(scenario, user, rng, args)
+                start = time.perf_counter()
+                try:
+                    response = await client.request(method, path, data=data)
+                    outcome = classify(response, scenario)
+                except httpx.TimeoutException:
+                    outcome = 'timeout'
+                except httpx.HTTPError:
+                    outcome = 'connection_error'
+                records.append((scenario, time.perf_counter() - start, outcome))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user_loop(user) for user in range(concurrency)))
+    return records, time.perf_counter() - start
+
+
+def latency_summary(latencies):
+    if not latencies:
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None}
+    return {f'p{pct}_ms': round(percentile(latencies, pct) * 1000, 1) for pct in (50, 95, 99)}
+
+
+def summarize(concurrency, records, elapsed, rss):
+    outcomes = Counter(outcome for _, _, outcome in records)
+    errors = sum(count for outcome, count in outcomes.items() if outcome not in SUCCESS)
+    stage = {
+        'concurrency': concurrency,
+        'requests': len(records),
+        'seconds': round(elapsed, 2),
+        'throughput_rps': round(len(records) / elapsed, 1) if elapsed else 0.0,
+        **latency_summary([latency for _, latency, _ in records]),
+        'error_rate': round(errors / len(records), 4) if records else 0.0,
+        'outcomes': dict(outcomes),
+        'scenarios': {},
+        'worker_rss_mb': rss,
+        'max_worker_rss_mb': max(rss.values()) if rss else None,
+    }
+    for scenario in sorted({scenario for scenario, _, _ in records}):
+        rows = [r for r in records if r[0] == scenario]
+        stage['scenarios'][scenario] = {
+            'requests': len(rows),
+            **latency_summary([latency for _, latency, _ in rows]),
+            'errors': sum(1 for _, _, outcome in rows if outcome not in SUCCESS),
+        }
+    return stage
+
+
+def start_app(base_url, args, job_db):
+    port = free_port()
+    env = dict(os.environ, OPENAI_BASE_URL=base_url, JOB_QUEUE_DB=job_db)
+    for item in args.env:
+        name, _, value = item.partition('=')
+        env[name] = value
+    command = [sys.executable, "-m", "gunicorn", "--workers", str(args.workers), "--threads", str(args.threads),
+               "--bind", f"127.0.0.1:{port}", "--timeout", "120"] + WORKER_CLASSES[args.worker_class]
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for_port(port)
+    return server, f"http://127.0.0.1:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ramp", default="1,4,16,32", help="virtual users per stage")
+    parser.add_argument("--stage-seconds", type=float, default=10.0)
+    parser.add_argument("--mix", default="page=1,generate=4,mock=3,setup=1,update=1",
+                        help="scenario weights: page, generate, mock, setup, update")
+    parser.add_argument("--topics", type=int, default=500, help="distinct topics (fewer means more cache hits)")
+    parser.add_argument("--latency", default="lognormal:0.8,0.5",
+                        help="fake upstream latency: seconds or uniform:LO,HI / normal:MEAN,SD / "
+                             "lognormal:MEDIAN,SIGMA / exponential:MEAN")
+    parser.add_argument("--token-rate", type=float, help="fake output tokens per second")
+    parser.add_argument("--errors", default="", help="injected upstream errors, e.g. 429:0.05,500:0.01")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--worker-class", choices=sorted(WORKER_CLASSES), default="sync")
+    parser.add_argument("--threads", type=int, default=1, help="threads per worker (gthread)")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE",
+                        help="extra environment for the app, e.g. GENERATION_BUDGET=0")
+    parser.add_argument("--timeout", type=float, default=60.0, help="client timeout per request")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="results file (default benchmarks/results/load-<time>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+    ramp = [int(users) for users in args.ramp.split(',')]
+
+    stages = []
+    with tempfile.TemporaryDirectory(prefix="bench-load-") as tmp, \
+            FakeOpenAIServer(latency=args.latency, token_rate=args.token_rate, error_rates=args.errors,
+                             seed=args.seed) as fake:
+        server, base_url = start_app(fake.base_url, args, os.path.join(tmp, "jobs.db"))
+        sampler = RssSampler(server.pid)
+        sampler.start()
+        try:
+            httpx.get(base_url + "/", timeout=30)
+            sampler.take()
+            for index, concurrency in enumerate(ramp):
+                records, elapsed = asyncio.run(run_stage(base_url, concurrency, args, mix, args.seed + index))
+                stages.append(summarize(concurrency, records, elapsed, sampler.take()))
+                stage = stages[-1]
+                print(f"{concurrency:>5} users {stage['requests']:>6} req {stage['throughput_rps']:>8} req/s  "
+                      f"p50 {stage['p50_ms']}ms  p95 {stage['p95_ms']}ms  p99 {stage['p99_ms']}ms  "
+                      f"errors {stage['error_rate']:.1%}  max rss {stage['max_worker_rss_mb']}MB", flush=True)
+        finally:
+            sampler.stopped.set()
+            server.terminate()
+            server.wait(timeout=30)
+        upstream = fake.stats
+
+    print(f"\n{'users':>6}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'err %':>7}  outcomes")
+    for stage in stages:
+        outcomes = ", ".join(f"{name}={count}" for name, count in sorted(stage['outcomes'].items()))
+        print(f"{stage['concurrency']:>6}{stage['throughput_rps']:>9}{stage['p50_ms']:>9}{stage['p95_ms']:>9}"
+              f"{stage['p99_ms']:>9}{stage['error_rate'] * 100:>7.1f}  {outcomes}")
+    print(f"upstream: {upstream}")
+
+    config = dict(vars(args), mix=mix, ramp=ramp, upstream=upstream)
+    path = reporting.save("load", config, stages, args.output)
+    print(f"results saved to {path}")
+    if args.compare:
+        reporting.compare(reporting.load(args.compare), stages, 'concurrency',
+                          ['throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms', 'error_rate', 'max_worker_rss_mb'])
+
+
+if __name__ == '__main__':
+    main()
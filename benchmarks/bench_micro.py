@@ -0,0 +1,139 @@
+"""Microbenchmark caption cleaning and the mock engine on large inputs.
+
+Times clean_caption_content (and the streaming IncrementalCaptionCleaner) on
+completions with thousands of lines, tone headers and very long lines, and
+mock_generate_instagram_captions with long topics, many tones and large
+batches. Results are saved as JSON for comparison between runs:
+
+    python benchmarks/bench_micro.py --lines 20000
+    python benchmarks/bench_micro.py --compare benchmarks/results/micro-20240601-120000.json
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import reporting  # noqa: E402
+from bench_mock import TOPICS, TONES, LENGTHS  # noqa: E402
+
+ALL_TONES = ["Funny", "Serious", "Casual", "Dramatic", "Romantic", "Sarcastic", "Playful", "Chill", "Confident",
+             "Trendy", "Grateful", "Nostalgic", "Inspirational", "Mysterious", "Adventurous", "Witty",
+             "Sophisticated", "Dreamy", "Bold", "Zen"]
+
+
+def make_completion(lines, rng, long_line_chars=0):
+    """Model-style output: numbered captions mixed with tone headers, blank lines and bold markers"""
+    out = []
+    for index in range(lines):
+        kind = rng.random()
+        if kind < 0.1:
+            out.append("**Funny + Chill Tone:**")
+        elif kind < 0.15:
+            out.append("")
+        else:
+            text = f"Caption {index} about coffee with a blended mood ☕✨ #CoffeeLover #Vibes"
+            if long_line_chars:
+                text += " more words" * (long_line_chars // 11)
+            out.append(f"{index % 3 + 1}. **{text}**" if kind < 0.3 else f"{index % 3 + 1}. {text}")
+    return "\n".join(out)
+
+
+def measure(name, fn, items, repeat, size_bytes=None):
+    """Best of repeat runs, reported per call and per item (and MB/s when size is known)"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    result = {
+        'case': name,
+        'seconds': round(best, 5),
+        'items_per_sec': round(items / best),
+        'us_per_item': round(best / items * 1e6, 3),
+    }
+    if size_bytes:
+        result['mb_per_sec'] = round(size_bytes / best / 1e6, 1)
+    return result
+
+
+def clean_cases(main, args, rng):
+    cases = []
+    for label, lines, long_chars in (("clean-3-captions", 3, 0),
+                                     (f"clean-{args.lines}-lines", args.lines, 0),
+                                     (f"clean-{args.lines // 100}-long-lines", args.lines // 100, 10000)):
+        content = make_completion(lines, rng, long_chars)
+        size = len(content.encode('utf-8'))
+        # Small inputs are repeated so the timer sees more than a few microseconds
+        loops = max(1, args.lines // max(lines, 1))
+        cases.append(measure(label, lambda: [main.clean_caption_content(content) for _ in range(loops)],
+                             lines * loops, args.repeat, size * loops))
+
+    content = make_completion(args.lines, rng)
+    chunks = [content[i:i + 4] for i in range(0, len(content), 4)]
+
+    def stream():
+        cleaner = main.IncrementalCaptionCleaner()
+        for chunk in chunks:
+            cleaner.feed(chunk)
+        cleaner.finish()
+
+    cases.append(measure(f"stream-clean-{args.lines}-lines", stream, args.lines, args.repeat,
+                         len(content.encode('utf-8'))))
+    return cases
+
+
+def mock_cases(main, args, rng):
+    requests = [(rng.choice(TOPICS), ", ".join(rng.sample(TONES, rng.randint(1, 3))), rng.choice(LENGTHS))
+                for _ in range(args.requests)]
+    long_topic = " ".join(rng.choice(TOPICS) for _ in range(args.topic_words))
+    many_tones = ", ".join(ALL_TONES)
+    return [
+        measure("mock-typical", lambda: [main.mock_generate_instagram_captions(*r) for r in requests],
+                len(requests), args.repeat),
+        measure(f"mock-batch-{args.requests}", lambda: main.mock_generate_instagram_captions_batch(requests),
+                len(requests), args.repeat),
+        measure(f"mock-{args.topic_words}-word-topic",
+                lambda: [main.mock_generate_instagram_captions(long_topic, "funny, chill", length)
+                         for length in LENGTHS * 100], 300, args.repeat, len(long_topic) * 300),
+        measure(f"mock-{len(ALL_TONES)}-tones",
+                lambda: [main.mock_generate_instagram_captions(topic, many_tones, length)
+                         for topic in TOPICS for length in LENGTHS * 50], len(TOPICS) * 150, args.repeat),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=20000, help="lines in the large completion")
+    parser.add_argument("--requests", type=int, default=20000, help="mock requests per run")
+    parser.add_argument("--topic-words", type=int, default=2000, help="words in the long topic")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case (best is reported)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="results file (default benchmarks/results/micro-<time>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.CRITICAL)
+    os.environ.setdefault("JOB_WORKERS", "0")
+    import main as app_main
+
+    rng = random.Random(args.seed)
+    results = clean_cases(app_main, args, rng) + mock_cases(app_main, args, rng)
+
+    print(f"{'case':<28}{'seconds':>10}{'items/s':>12}{'us/item':>10}{'MB/s':>8}")
+    for r in results:
+        print(f"{r['case']:<28}{r['seconds']:>10}{r['items_per_sec']:>12}{r['us_per_item']:>10}"
+              f"{r.get('mb_per_sec', '-'):>8}")
+    path = reporting.save("micro", vars(args), results, args.output)
+    print(f"results saved to {path}")
+    if args.compare:
+        reporting.compare(reporting.load(args.compare), results, 'case', ['items_per_sec', 'us_per_item'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Microbenchmark the mock caption engine against the legacy if/elif implementation.
+
+The legacy mock_generate_instagram_captions (and the clean_caption_content it
+relied on) is loaded from git history, checked for identical output, then
+both are timed in captions/sec:
+
+    python benchmarks/bench_mock.py --requests 20000
+"""
+
+import os
+import sys
+import ast
+import time
+import json
+import random
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TOPICS = ["coffee", "Sunset Hike", "my new puppy", "Monday meetings", "beach day", "birthday cake"]
+TONES = ["funny", "romantic", "chill", "adventurous", "professional", "dreamy", "bold", "zen"]
+LENGTHS = ["short", "medium", "long"]
+
+
+def legacy_ref():
+    """The commit just before the table-driven engine replaced the f-string templates"""
+    marker = "topic.replace(' ', '')}"
+    commit = subprocess.run(["git", "log", "-1", "--format=%H", "-S", marker, "--", "main.py"],
+                            cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    return f"{commit}^"
+
+
+def load_legacy(ref):
+    source = subprocess.run(["git", "show", f"{ref}:main.py"], cwd=ROOT,
+                            capture_output=True, text=True, check=True).stdout
+    wanted = {"clean_caption_line", "clean_caption_content", "mock_generate_instagram_captions"}
+    nodes = [n for n in ast.parse(source).body if isinstance(n, ast.FunctionDef) and n.name in wanted]
+    namespace = {}
+    exec(compile(ast.Module(body=nodes, type_ignores=[]), f"legacy:{ref}", "exec"), namespace)
+    return namespace["mock_generate_instagram_captions"]
+
+
+def make_requests(count, seed=7):
+    rng = random.Random(seed)
+    return [(rng.choice(TOPICS), ", ".join(rng.sample(TONES, rng.randint(1, 3))), rng.choice(LENGTHS))
+            for _ in range(count)]
+
+
+def timed(label, fn, captions):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    return {'mode': label, 'seconds': round(elapsed, 4), 'captions_per_sec': round(captions / elapsed)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--baseline-ref", help="git ref holding the legacy implementation")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.CRITICAL)
+    from main import mock_generate_instagram_captions, mock_generate_instagram_captions_batch
+
+    requests = make_requests(args.requests)
+    captions = 3 * len(requests)
+    results = []
+
+    try:
+        legacy = load_legacy(args.baseline_ref or legacy_ref())
+    except (subprocess.CalledProcessError, FileNotFoundError) as e:
+        print(f"legacy implementation unavailable ({e}); timing the current engine only", file=sys.stderr)
+        legacy = None
+
+    if legacy is not None:
+        mismatches = sum(1 for r in requests[:2000] if legacy(*r) != mock_generate_instagram_captions(*r))
+        if mismatches:
+            print(f"warning: {mismatches} outputs differ from the legacy implementation", file=sys.stderr)
+        results.append(timed("legacy", lambda: [legacy(*r) for r in requests], captions))
+
+    results.append(timed("engine", lambda: [mock_generate_instagram_captions(*r) for r in requests], captions))
+    results.append(timed("engine-batch", lambda: mock_generate_instagram_captions_batch(requests), captions))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'mode':<14}{'seconds':>10}{'captions/s':>14}")
+    for r in results:
+        print(f"{r['mode']:<14}{r['seconds']:>10}{r['captions_per_sec']:>14}")
+
+
+if __name__ == '__main__':
+    main()
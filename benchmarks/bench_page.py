@@ -0,0 +1,116 @@
+"""Measure page weight and render time against the legacy inline-asset template.
+
+The legacy templates/index.html (CSS and JS inlined) is loaded from git
+history and rendered next to the current one, with and without captions.
+Bytes are reported for the HTML itself and for what a first and a repeat
+visit transfer in total (assets are fingerprinted and cached immutably):
+
+    python benchmarks/bench_page.py --renders 500
+"""
+
+import os
+import sys
+import json
+import time
+import gzip
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CAPTIONS = [
+    "Morning light and slow sips, nothing else on the agenda #coffee #slowliving",
+    "Proof that the best plans are the unplanned ones #weekend #goodvibes",
+    "Chasing sunsets and calling it cardio #sunsethike #adventure",
+]
+
+
+def legacy_ref():
+    """The commit just before the page CSS/JS moved out of the template"""
+    marker = "<style>"
+    commit = subprocess.run(["git", "log", "-1", "--format=%H", "-S", marker, "--", "templates/index.html"],
+                            cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    return f"{commit}^"
+
+
+def load_legacy(ref):
+    return subprocess.run(["git", "show", f"{ref}:templates/index.html"], cwd=ROOT,
+                          capture_output=True, text=True, check=True).stdout
+
+
+def timed_render(render, renders):
+    html = render()
+    start = time.perf_counter()
+    for _ in range(renders):
+        render()
+    elapsed = time.perf_counter() - start
+    return html.encode('utf-8'), elapsed / renders * 1000
+
+
+def measure(label, render, asset_bytes, renders):
+    html, ms = timed_render(render, renders)
+    gzipped = len(gzip.compress(html))
+    return {
+        'page': label,
+        'html_bytes': len(html),
+        'html_gzip_bytes': gzipped,
+        'first_visit_bytes': gzipped + asset_bytes,
+        'repeat_visit_bytes': gzipped,
+        'render_ms': round(ms, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--renders", type=int, default=500)
+    parser.add_argument("--baseline-ref", help="git ref holding the legacy template")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.CRITICAL)
+    from main import app, asset_registry
+
+    # Best encoding a browser gets for each fingerprinted asset
+    asset_bytes = sum(len(asset_registry.get(asset_registry.public_name(name)).negotiate('gzip, br')[1])
+                      for name in asset_registry.urls)
+
+    contexts = {
+        'empty': {},
+        'captions': {'captions': '\n'.join(CAPTIONS), 'topic': 'coffee', 'tone': 'funny', 'length': 'medium'},
+    }
+    try:
+        legacy = load_legacy(args.baseline_ref or legacy_ref())
+    except (subprocess.CalledProcessError, FileNotFoundError) as e:
+        print(f"legacy template unavailable ({e}); measuring the current page only", file=sys.stderr)
+        legacy = None
+
+    def renderer(template, context):
+        def render():
+            values = dict(context)
+            app.update_template_context(values)  # session, flashes, etc. as render_template would add
+            return template.render(values)
+        return render
+
+    results = []
+    with app.test_request_context('/'):
+        # Both templates are compiled once up front so only rendering is timed
+        current = app.jinja_env.get_template('index.html')
+        legacy_template = app.jinja_env.from_string(legacy) if legacy is not None else None
+        for name, context in contexts.items():
+            if legacy_template is not None:
+                results.append(measure(f"legacy/{name}", renderer(legacy_template, context), 0, args.renders))
+            results.append(measure(f"current/{name}", renderer(current, context), asset_bytes, args.renders))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'page':<20}{'html':>10}{'html gz':>10}{'1st visit':>12}{'repeat':>10}{'render ms':>12}")
+    for r in results:
+        print(f"{r['page']:<20}{r['html_bytes']:>10}{r['html_gzip_bytes']:>10}{r['first_visit_bytes']:>12}"
+              f"{r['repeat_visit_bytes']:>10}{r['render_ms']:>12}")
+
+
+if __name__ == '__main__':
+    main()
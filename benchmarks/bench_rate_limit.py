@@ -0,0 +1,134 @@
+"""Drive the client-side rate limiter against scripted 429 sequences from the fake server.
+
+Each scenario scripts the fake OpenAI server's responses, calls the app's
+generation path and checks the outcome: transient 429s and 5xx are retried
+(honouring Retry-After) within the deadline, hard quota errors fail at once,
+and a burst against a requests-per-minute limit queues locally instead of
+surfacing 429s:
+
+    python benchmarks/bench_rate_limit.py --burst 70 --rpm 60
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_openai import FakeOpenAIServer  # noqa: E402
+
+RATE_LIMITED = {"status": 429, "retry_after": 0.3}
+
+# name -> (scripted responses, expected outcome)
+SCENARIOS = {
+    'retry-after': ([RATE_LIMITED, RATE_LIMITED, 200], 'ok'),
+    'backoff': ([{"status": 429}, {"status": 500}, 200], 'ok'),
+    'hard-quota': ([{"status": 429, "code": "insufficient_quota"}], 'quota'),
+    'past-deadline': ([{"status": 429, "retry_after": 60}], 'rate_limited'),
+    'persistent': ([{"status": 429}] * 50, 'rate_limited'),
+}
+
+
+def generate(main, key, topic):
+    """Return 'ok' or the error kind the routes would report"""
+    try:
+        main.generate_instagram_captions(topic, "funny", "short", api_key=key)
+        return 'ok'
+    except Exception as e:
+        return main.classify_generation_error(str(e))
+
+
+def run_scenario(main, fake, name, script, expected):
+    fake.set_script(script)
+    before = fake.stats['requests']
+    start = time.perf_counter()
+    outcome = generate(main, f"sk-{name}", f"{name} topic")
+    return {
+        'scenario': name,
+        'expected': expected,
+        'outcome': outcome,
+        'upstream_requests': fake.stats['requests'] - before,
+        'seconds': round(time.perf_counter() - start, 2),
+        'passed': outcome == expected,
+    }
+
+
+def run_burst(main, fake, args, limited):
+    """Fire a burst above the server's RPM limit, with or without the client-side limiter"""
+    key = f"sk-burst-{'limited' if limited else 'direct'}"
+    before = dict(fake.stats)
+
+    def direct(index):
+        lease = main.lease_openai_client(key)
+        try:
+            lease.client.chat.completions.create(model="gpt-4o", max_tokens=100,
+                                                 messages=[{"role": "user", "content": f"burst {index}"}])
+            return 'ok'
+        except Exception as e:
+            return main.classify_generation_error(str(main.translate_openai_error(e)))
+        finally:
+            main.client_pool.release(lease)
+
+    def one(index):
+        return generate(main, key, f"burst topic {index}") if limited else direct(index)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        outcomes = list(pool.map(one, range(args.burst)))
+    return {
+        'scenario': f"burst-{'limiter' if limited else 'no-limiter'}",
+        'expected': 'ok' if limited else '-',
+        'outcome': f"{outcomes.count('ok')}/{len(outcomes)} ok",
+        'upstream_requests': fake.stats['requests'] - before['requests'],
+        'upstream_429s': fake.stats['errors'] - before['errors'],
+        'seconds': round(time.perf_counter() - start, 2),
+        'passed': outcomes.count('ok') == len(outcomes) if limited else True,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--deadline", type=float, default=20.0, help="per-request retry deadline in seconds")
+    parser.add_argument("--rpm", type=int, default=60, help="fake server requests-per-minute limit for the burst")
+    parser.add_argument("--burst", type=int, default=70)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    results = []
+    with FakeOpenAIServer() as fake:
+        os.environ["OPENAI_BASE_URL"] = fake.base_url
+        os.environ["OPENAI_RETRY_DEADLINE"] = str(args.deadline)
+        os.environ["OPENAI_RETRY_BASE_DELAY"] = "0.1"
+        import main as app_main
+
+        for name, (script, expected) in SCENARIOS.items():
+            results.append(run_scenario(app_main, fake, name, script, expected))
+
+    # Fresh server per burst so both runs start with a full RPM allowance
+    for limited in (False, True):
+        with FakeOpenAIServer(rpm=args.rpm) as fake:
+            os.environ["OPENAI_BASE_URL"] = fake.base_url
+            app_main.client_pool.close()
+            results.append(run_burst(app_main, fake, args, limited))
+
+    if args.json:
+        print(json.dumps({'results': results, 'limiter': app_main.rate_limiter.snapshot()}, indent=2))
+    else:
+        print(f"{'scenario':<22}{'expected':>14}{'outcome':>14}{'upstream':>10}{'429s':>6}{'seconds':>9}  result")
+        for r in results:
+            print(f"{r['scenario']:<22}{r['expected']:>14}{r['outcome']:>14}{r['upstream_requests']:>10}"
+                  f"{r.get('upstream_429s', '-'):>6}{r['seconds']:>9}  {'ok' if r['passed'] else 'FAIL'}")
+        print(f"limiter: {app_main.rate_limiter.snapshot()}")
+    sys.exit(0 if all(r['passed'] for r in results) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""Cold-start profile: import time breakdown and time to first byte from a fresh gunicorn.
+
+Runs `python -X importtime -c "import main"` and reports the slowest
+packages and modules, then starts gunicorn several times and measures the
+time from spawn to the first byte of GET /, plus the first and second
+request latency once the port is open. --baseline-ref measures an older
+commit (extracted with git archive) the same way for comparison:
+
+    python benchmarks/bench_startup.py --runs 5 --baseline-ref HEAD~1
+"""
+
+import os
+import sys
+import time
+import socket
+import argparse
+import tempfile
+import statistics
+import subprocess
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import reporting  # noqa: E402
+from bench_async import free_port  # noqa: E402
+
+# Same settings for every tree, so only the code differs
+APP_ENV = {"LOG_LEVEL": "WARNING", "JOB_WORKERS": "1"}
+
+
+def app_env(tmp):
+    env = dict(os.environ, **APP_ENV, JOB_QUEUE_DB=os.path.join(tmp, "jobs.db"))
+    # Cold starts in production read cached bytecode
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+
+def import_profile(tree, env, top):
+    """Parse -X importtime output into totals per top-level package and the slowest modules"""
+    # Warm the bytecode cache first so compilation isn't counted
+    subprocess.run([sys.executable, "-c", "import main"], cwd=tree, env=env, capture_output=True)
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=tree, env=env,
+                            capture_output=True, text=True).stderr
+    packages = defaultdict(int)
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        packages[name.split(".")[0]] += int(self_us)
+        modules.append((name, int(cumulative_us)))
+    total = next((us for name, us in modules if name == "main"), None)
+    return {
+        'main_import_ms': round(total / 1000, 1) if total else None,
+        'openai_loaded': 'openai' in packages,
+        'packages_ms': {name: round(us / 1000, 1) for name, us in
+                        sorted(packages.items(), key=lambda item: -item[1])[:top]},
+        'slowest_modules_ms': {name: round(us / 1000, 1) for name, us in
+                               sorted(modules, key=lambda item: -item[1])[:top]},
+    }
+
+
+def import_wall_time(tree, env, runs):
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", code], cwd=tree, env=env, capture_output=True, text=True)
+        samples.append(float(out.stdout.strip().splitlines()[-1]))
+    return round(statistics.median(samples) * 1000, 1)
+
+
+def first_byte(port, timeout=5.0):
+    """Seconds from sending GET / to the first response byte"""
+    with socket.create_connection(("127.0.0.1", port), timeout=timeout) as sock:
+        start = time.perf_counter()
+        sock.sendall(b"GET / HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+        sock.recv(1)
+        elapsed = time.perf_counter() - start
+        while sock.recv(65536):
+            pass
+    return elapsed
+
+
+def cold_start(tree, env, workers, timeout=60.0):
+    """Spawn gunicorn and time spawn -> first byte of GET /, plus first and second request TTFB"""
+    port = free_port()
+    command = [sys.executable, "-m", "gunicorn", "--workers", str(workers), "--bind", f"127.0.0.1:{port}",
+               "main:app"]
+    spawned = time.perf_counter()
+    server = subprocess.Popen(command, cwd=tree, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = spawned + timeout
+        while True:
+            try:
+                first = first_byte(port)
+                break
+            except OSError:
+                if time.perf_counter() > deadline:
+                    raise RuntimeError(f"gunicorn in {tree} did not answer within {timeout}s")
+                time.sleep(0.005)
+        spawn_to_first_byte = time.perf_counter() - spawned
+        second = first_byte(port)
+        return {
+            'spawn_to_first_byte_ms': round(spawn_to_first_byte * 1000, 1),
+            'first_request_ttfb_ms': round(first * 1000, 2),
+            'second_request_ttfb_ms': round(second * 1000, 2),
+        }
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def profile_tree(label, tree, args, tmp):
+    env = app_env(tmp)
+    runs = [cold_start(tree, env, args.workers) for _ in range(args.runs)]
+    return {
+        'tree': label,
+        'import_wall_ms': import_wall_time(tree, env, args.runs),
+        **{key: round(statistics.median(run[key] for run in runs), 2) for key in runs[0]},
+        **import_profile(tree, env, args.top),
+    }
+
+
+def extract(ref, directory):
+    archive = subprocess.run(["git", "archive", ref], cwd=ROOT, capture_output=True, check=True).stdout
+    subprocess.run(["tar", "-x", "-C", directory], input=archive, check=True)
+    return directory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="cold starts per tree (median is reported)")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--top", type=int, default=10, help="packages and modules to list")
+    parser.add_argument("--baseline-ref", help="git ref to measure the same way, e.g. HEAD~1")
+    parser.add_argument("--output", help="results file (default benchmarks/results/startup-<time>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench-startup-") as tmp:
+        if args.baseline_ref:
+            baseline = extract(args.baseline_ref, tempfile.mkdtemp(dir=tmp))
+            results.append(profile_tree(args.baseline_ref, baseline, args, tmp))
+        results.append(profile_tree("working tree", ROOT, args, tmp))
+
+    for r in results:
+        print(f"\n== {r['tree']} ==")
+        print(f"import main: {r['import_wall_ms']}ms wall, {r['main_import_ms']}ms per -X importtime "
+              f"(openai SDK loaded: {'yes' if r['openai_loaded'] else 'no'})")
+        print(f"spawn -> first byte: {r['spawn_to_first_byte_ms']}ms   first request TTFB: "
+              f"{r['first_request_ttfb_ms']}ms   second: {r['second_request_ttfb_ms']}ms")
+        print("slowest packages (self time): " +
+              ", ".join(f"{name} {ms}ms" for name, ms in r['packages_ms'].items()))
+    path = reporting.save("startup", vars(args), results, args.output)
+    print(f"\nresults saved to {path}")
+    if args.compare:
+        reporting.compare(reporting.load(args.compare), results, 'tree',
+                          ['import_wall_ms', 'spawn_to_first_byte_ms', 'first_request_ttfb_ms'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,376 @@
+"""Local stand-in for the OpenAI chat completions API, used by the benchmarks.
+
+Also runs standalone, e.g. to point a dev server at it:
+
+    python benchmarks/fake_openai.py --port 8001 --latency lognormal:0.8,0.5 --token-rate 60 --errors 429:0.05,500:0.01
+"""
+
+import os
+import ssl
+import json
+import math
+import time
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SAMPLE_CAPTIONS = """1. Coffee first, adulting second ☕😂 #CoffeeLover #MorningMood
+2. Sip happens, and honestly it's the best part of my day ✨ #CoffeeTime #ChillVibes
+3. Brewed to perfection, just like this mood 🌟 #CoffeeMagic #GoodVibes"""
+
+
+STRUCTURED_CAPTIONS = [
+    {"text": "Coffee first, adulting second", "emoji": "☕😂", "hashtags": ["CoffeeLover", "MorningMood"]},
+    {"text": "Sip happens, and honestly it's the best part of my day", "emoji": "✨",
+     "hashtags": ["CoffeeTime", "ChillVibes"]},
+    {"text": "Brewed to perfection, just like this mood", "emoji": "🌟", "hashtags": ["CoffeeMagic", "GoodVibes"]},
+]
+
+
+def choice_content(index, content=SAMPLE_CAPTIONS):
+    """Content for choice index of an n > 1 request; later choices get distinct captions"""
+    if index == 0:
+        return content
+    return '\n'.join(f"{line} (take {index + 1})" for line in content.split('\n'))
+
+
+def structured_content(index=0):
+    """JSON schema mode reply matching the app's instagram_captions schema"""
+    suffix = f" (take {index + 1})" if index else ""
+    captions = [dict(item, text=item["text"] + suffix) for item in STRUCTURED_CAPTIONS]
+    return json.dumps({"captions": captions}, ensure_ascii=False)
+
+
+def make_completion(content=SAMPLE_CAPTIONS, model="gpt-4o", n=1, structured=False):
+    """Build a minimal chat.completions response body"""
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": index,
+            "message": {"role": "assistant",
+                        "content": structured_content(index) if structured else choice_content(index, content)},
+            "finish_reason": "stop",
+        } for index in range(n)],
+        "usage": {"prompt_tokens": 180, "completion_tokens": 90 * n, "total_tokens": 180 + 90 * n},
+    }
+
+
+def make_chunk(content=None, finish_reason=None, model="gpt-4o", index=0):
+    """Build one chat.completion.chunk event for streamed responses"""
+    delta = {"content": content} if content is not None else {}
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": index, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+def make_error(status, code=None, message=None):
+    """Build an OpenAI-style error body; 429s default to a transient rate limit"""
+    if status == 429 and code == "insufficient_quota":
+        message = message or "You exceeded your current quota, please check your plan and billing details."
+        kind = "insufficient_quota"
+    elif status == 429:
+        code = code or "rate_limit_exceeded"
+        message = message or "Rate limit reached for gpt-4o on requests per min (RPM). Please try again shortly."
+        kind = "requests"
+    else:
+        message = message or "The server had an error while processing your request."
+        kind = "server_error"
+    return {"error": {"message": message, "type": kind, "param": None, "code": code}}
+
+
+def latency_sampler(spec, rng=None):
+    """Turn a latency spec into a function returning seconds to wait before each reply.
+
+    spec is a number of seconds, a callable, or one of "fixed:S", "uniform:LO,HI",
+    "normal:MEAN,SD", "lognormal:MEDIAN,SIGMA" and "exponential:MEAN".
+    """
+    rng = rng or random.Random()
+    if callable(spec):
+        return spec
+    if spec is None or isinstance(spec, (int, float)):
+        seconds = float(spec or 0)
+        return lambda: seconds
+    kind, _, values = str(spec).partition(':')
+    if not values:
+        seconds = float(kind)
+        return lambda: seconds
+    params = [float(v) for v in values.split(',')]
+    if kind == 'fixed':
+        return lambda: params[0]
+    if kind == 'uniform':
+        return lambda: rng.uniform(params[0], params[1])
+    if kind == 'normal':
+        return lambda: max(0.0, rng.gauss(params[0], params[1]))
+    if kind == 'lognormal':
+        # Parameterised by the median, which is easier to read off a latency chart than mu
+        return lambda: rng.lognormvariate(math.log(params[0]), params[1])
+    if kind == 'exponential':
+        return lambda: rng.expovariate(1 / params[0])
+    raise ValueError(f"unknown latency distribution: {spec}")
+
+
+def parse_error_rates(spec):
+    """Parse "429:0.05,500:0.01" into {429: 0.05, 500: 0.01}"""
+    if not spec:
+        return {}
+    if isinstance(spec, dict):
+        return {int(k): float(v) for k, v in spec.items()}
+    return {int(status): float(rate) for status, _, rate in (item.partition(':') for item in spec.split(','))}
+
+
+class _RequestBucket:
+    """Server-side requests-per-minute limit, reported through x-ratelimit-* headers"""
+
+    def __init__(self, rpm):
+        self.limit = rpm
+        self.rate = rpm / 60.0
+        self.tokens = float(rpm)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        """Return (allowed, headers) for one request"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.limit, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            allowed = self.tokens >= 1
+            if allowed:
+                self.tokens -= 1
+            remaining = int(self.tokens)
+            reset = (self.limit - self.tokens) / self.rate
+            headers = {
+                "x-ratelimit-limit-requests": str(self.limit),
+                "x-ratelimit-remaining-requests": str(remaining),
+                "x-ratelimit-reset-requests": f"{reset:.3f}s",
+            }
+            if not allowed:
+                headers["retry-after-ms"] = str(int((1 - self.tokens) / self.rate * 1000) + 1)
+            return allowed, headers
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Buffer writes so headers and body leave in one segment (avoids Nagle/delayed-ACK stalls)
+    wbufsize = 1 << 16
+
+    def setup(self):
+        # One handler instance per TCP connection, so this counts handshakes
+        super().setup()
+        with self.server.stats_lock:
+            self.server.stats['connections'] += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_stream(self, content, chunk_chars=4, headers=None, n=1, structured=False):
+        # Stream the completion a few characters at a time, like token deltas; n choices interleave
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        contents = [structured_content(index) if structured else choice_content(index, content)
+                    for index in range(n)]
+        # ~4 characters per token, all choices generated in parallel
+        delay = self.server.token_delay or (chunk_chars / 4 / self.server.token_rate if self.server.token_rate else 0)
+        for start in range(0, max(len(c) for c in contents), chunk_chars):
+            if delay:
+                time.sleep(delay)
+            for index, text in enumerate(contents):
+                if start < len(text):
+                    event = json.dumps(make_chunk(text[start:start + chunk_chars], index=index))
+                    self._write_chunk(f"data: {event}\n\n".encode('utf-8'))
+        for index in range(n):
+            self._write_chunk(f"data: {json.dumps(make_chunk(finish_reason='stop', index=index))}\n\n".encode('utf-8'))
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        with self.server.stats_lock:
+            self.server.stats['requests'] += 1
+        if not self.path.endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        scripted = self.server.next_scripted() or self.server.injected_error()
+        if scripted is not None:
+            # Scripted failures: {"status": 429, "code": ..., "retry_after": seconds}
+            with self.server.stats_lock:
+                self.server.stats['errors'] += 1
+            headers = {}
+            if scripted.get("retry_after") is not None:
+                headers["retry-after"] = str(scripted["retry_after"])
+            self._send_json(scripted["status"], make_error(scripted["status"], scripted.get("code")), headers)
+            return
+        headers = {}
+        if self.server.bucket is not None:
+            allowed, headers = self.server.bucket.take()
+            if not allowed:
+                with self.server.stats_lock:
+                    self.server.stats['errors'] += 1
+                self._send_json(429, make_error(429), headers)
+                return
+        latency = self.server.sample_latency()
+        if latency > 0:
+            time.sleep(latency)
+        n = int(body.get("n") or 1)
+        structured = (body.get("response_format") or {}).get("type") == "json_schema"
+        if body.get("stream"):
+            self._send_stream(SAMPLE_CAPTIONS, headers=headers, n=n, structured=structured)
+            return
+        completion = make_completion(n=n, structured=structured)
+        if self.server.token_rate:
+            time.sleep(completion["usage"]["completion_tokens"] / n / self.server.token_rate)
+        self._send_json(200, completion, headers)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Load tests open hundreds of connections at once; the default backlog of 5 drops SYNs
+    request_queue_size = 1024
+
+    def next_scripted(self):
+        with self.stats_lock:
+            if self.script:
+                entry = self.script.pop(0)
+                return None if entry in (None, 200) else entry
+        return None
+
+    def injected_error(self):
+        """Random failure per error_rates; injected 429s carry a short Retry-After like the real API"""
+        if not self.error_rates:
+            return None
+        roll = self.rng.random()
+        for status, rate in self.error_rates.items():
+            if roll < rate:
+                with self.stats_lock:
+                    self.stats['injected'] += 1
+                return {"status": status, "retry_after": 1} if status == 429 else {"status": status}
+            roll -= rate
+        return None
+
+
+class FakeOpenAIServer:
+    """Threaded fake OpenAI server, optionally served over TLS with a throwaway certificate.
+
+    latency is seconds or a distribution spec (see latency_sampler); token_rate
+    paces generated output in tokens per second. script is a list of
+    per-request outcomes consumed in order (None/200 for a normal reply, or an
+    error dict such as {"status": 429, "retry_after": 1}); error_rates injects
+    random failures, e.g. {429: 0.05, 500: 0.01}; rpm enforces a
+    requests-per-minute limit and sends x-ratelimit-* headers.
+    """
+
+    handler_class = FakeOpenAIHandler
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, token_delay=0.0, tls=False, script=None, rpm=None,
+                 token_rate=None, error_rates=None, seed=None):
+        self.httpd = _Server((host, port), self.handler_class)
+        self.httpd.rng = random.Random(seed)
+        self.httpd.sample_latency = latency_sampler(latency, self.httpd.rng)
+        self.httpd.token_delay = token_delay
+        self.httpd.token_rate = token_rate
+        self.httpd.error_rates = parse_error_rates(error_rates)
+        self.httpd.script = list(script or [])
+        self.httpd.bucket = _RequestBucket(rpm) if rpm else None
+        self.httpd.stats = {'connections': 0, 'requests': 0, 'errors': 0, 'injected': 0}
+        self.httpd.stats_lock = threading.Lock()
+        self.cert_file = None
+        if tls:
+            self.cert_file = self._make_certificate()
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(self.cert_file, self._key_file)
+            self.httpd.socket = context.wrap_socket(self.httpd.socket, server_side=True)
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def _make_certificate(self):
+        directory = tempfile.mkdtemp(prefix="fake-openai-")
+        cert_file = os.path.join(directory, "cert.pem")
+        self._key_file = os.path.join(directory, "key.pem")
+        subprocess.run(
+            ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+             "-subj", "/CN=localhost", "-addext", "subjectAltName=IP:127.0.0.1,DNS:localhost",
+             "-keyout", self._key_file, "-out", cert_file],
+            check=True, capture_output=True
+        )
+        return cert_file
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        scheme = "https" if self.cert_file else "http"
+        return f"{scheme}://{host}:{port}/v1"
+
+    @property
+    def stats(self):
+        with self.httpd.stats_lock:
+            return dict(self.httpd.stats)
+
+    def set_script(self, script):
+        with self.httpd.stats_lock:
+            self.httpd.script = list(script)
+
+    def ssl_context(self):
+        """Client-side SSL context that trusts the throwaway certificate"""
+        return ssl.create_default_context(cafile=self.cert_file) if self.cert_file else True
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", default="0", help="seconds or a distribution, e.g. lognormal:0.8,0.5")
+    parser.add_argument("--token-rate", type=float, help="output tokens per second")
+    parser.add_argument("--errors", help="injected error rates, e.g. 429:0.05,500:0.01")
+    parser.add_argument("--rpm", type=int, help="requests-per-minute limit")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(args.host, args.port, latency=args.latency, token_rate=args.token_rate,
+                              error_rates=args.errors, rpm=args.rpm, seed=args.seed)
+    print(f"fake OpenAI API on {server.base_url} (set OPENAI_BASE_URL to use it)", flush=True)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(server.stats))
+
+
+if __name__ == '__main__':
+    main()
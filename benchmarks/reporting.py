@@ -0,0 +1,60 @@
+"""Save benchmark results as JSON and compare them with an earlier run"""
+
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+
+def environment():
+    """Where and on what code a result was measured"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def save(name, config, results, path=None):
+    """Write {environment, config, results} to path (default benchmarks/results/<name>-<time>.json)"""
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump({'benchmark': name, 'environment': environment(), 'config': config, 'results': results},
+                  f, indent=2)
+    return path
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(previous, results, key, metrics, out=sys.stdout):
+    """Print each metric of results next to the matching row (by key) of an earlier saved run"""
+    earlier = {row[key]: row for row in previous['results']}
+    commit = previous['environment'].get('commit') or 'previous run'
+    print(f"\ncompared with {commit} ({previous['environment'].get('timestamp')}):", file=out)
+    for row in results:
+        before = earlier.get(row[key])
+        if before is None:
+            continue
+        changes = []
+        for metric in metrics:
+            old, new = before.get(metric), row.get(metric)
+            if isinstance(old, (int, float)) and isinstance(new, (int, float)) and old:
+                changes.append(f"{metric} {old} -> {new} ({(new - old) / old * 100:+.1f}%)")
+        print(f"  {key}={row[key]}: " + ", ".join(changes), file=out)
@@ -0,0 +1,149 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class CandidatePool:
+    """Unseen captions per browser session and request key, served to later regenerate clicks.
+
+    One upstream call asks for several completions; the captions not shown yet
+    are kept here under (session, topic/tones/length). Each regenerate click
+    takes the next set_size, and when a pool drops below low_water (two sets
+    by default) a background refill tops it up while a set is still left, so
+    the following click is served without waiting.
+    Sessions are LRU-bounded and idle ones expire after ttl seconds.
+    """
+
+    def __init__(self, max_sessions=1024, max_per_key=30, set_size=3, low_water=None, ttl=1800.0, refill_threads=4):
+        self.max_sessions = max_sessions
+        self.max_per_key = max_per_key
+        self.low_water = low_water if low_water is not None else 2 * set_size
+        self.ttl = ttl
+        # session id -> {key: deque of captions}, with last-used time
+        self._sessions = OrderedDict()
+        self._touched = {}
+        self._refilling = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=refill_threads, thread_name_prefix="caption-refill")
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'captions_added': 0,
+            'captions_served': 0,
+            'refills': 0,
+            'refill_errors': 0,
+            'evictions': 0,
+            'expirations': 0,
+        }
+
+    def _expire(self, now):
+        # Caller holds self._lock; sessions are kept in last-used order
+        while self._sessions:
+            session_id = next(iter(self._sessions))
+            if now - self._touched[session_id] <= self.ttl:
+                break
+            self._drop(session_id)
+            self.stats['expirations'] += 1
+
+    def _drop(self, session_id):
+        self._sessions.pop(session_id, None)
+        self._touched.pop(session_id, None)
+
+    def _keys(self, session_id, now):
+        # Caller holds self._lock
+        keys = self._sessions.get(session_id)
+        if keys is None:
+            keys = self._sessions[session_id] = {}
+            while len(self._sessions) > self.max_sessions:
+                self._drop(next(iter(self._sessions)))
+                self.stats['evictions'] += 1
+        self._sessions.move_to_end(session_id)
+        self._touched[session_id] = now
+        return keys
+
+    def take(self, session_id, key, count):
+        """Pop the next count unseen captions, or None if the pool can't fill a whole set"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            pool = self._keys(session_id, now).get(key)
+            if not pool or len(pool) < count:
+                self.stats['misses'] += 1
+                return None
+            self.stats['hits'] += 1
+            self.stats['captions_served'] += count
+            return [pool.popleft() for _ in range(count)]
+
+    def add(self, session_id, key, captions):
+        """Store captions for later clicks, skipping ones already waiting in the pool"""
+        now = time.monotonic()
+        with self._lock:
+            keys = self._keys(session_id, now)
+            pool = keys.setdefault(key, deque(maxlen=self.max_per_key))
+            for caption in captions:
+                if caption not in pool:
+                    pool.append(caption)
+                    self.stats['captions_added'] += 1
+
+    def refill(self, session_id, key, produce):
+        """Top up a pool that has run low in the background; produce() returns a list of captions"""
+        token = (session_id, key)
+        with self._lock:
+            pool = self._sessions.get(session_id, {}).get(key)
+            if (pool and len(pool) >= self.low_water) or token in self._refilling:
+                return False
+            self._refilling.add(token)
+            self.stats['refills'] += 1
+
+        def run():
+            try:
+                captions = produce()
+                with self._lock:
+                    discarded = session_id not in self._sessions
+                # A session cleared while the refill ran doesn't get its pool back
+                if not discarded:
+                    self.add(session_id, key, captions)
+            except Exception as e:
+                logging.warning(f"Caption pool refill failed: {e}")
+                with self._lock:
+                    self.stats['refill_errors'] += 1
+            finally:
+                with self._lock:
+                    self._refilling.discard(token)
+
+        self._executor.submit(run)
+        return True
+
+    def discard_session(self, session_id):
+        with self._lock:
+            self._drop(session_id)
+
+    def snapshot(self):
+        with self._lock:
+            self._expire(time.monotonic())
+            data = dict(self.stats)
+            data['sessions'] = len(self._sessions)
+            data['pooled_captions'] = sum(len(pool) for keys in self._sessions.values() for pool in keys.values())
+            data['refills_in_flight'] = len(self._refilling)
+        requests = data['hits'] + data['misses']
+        data['hit_ratio'] = round(data['hits'] / requests, 3) if requests else 0.0
+        return data
+
+
+def create_candidate_pool_from_env(set_size=3):
+    """Configure the per-session candidate pool from CANDIDATE_POOL_* environment variables.
+
+    set_size is the number of captions each click shows; the low-water mark defaults to two sets.
+    """
+    low_water = os.environ.get("CANDIDATE_POOL_LOW_WATER")
+    return CandidatePool(
+        max_sessions=int(os.environ.get("CANDIDATE_POOL_SESSIONS", "1024")),
+        max_per_key=int(os.environ.get("CANDIDATE_POOL_MAX_PER_KEY", "30")),
+        set_size=set_size,
+        low_water=int(low_water) if low_water else None,
+        ttl=float(os.environ.get("CANDIDATE_POOL_TTL", "1800")),
+        refill_threads=int(os.environ.get("CANDIDATE_POOL_REFILL_THREADS", "4")),
+    )
@@ -0,0 +1,228 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+
+
+def normalize_cache_key(topic, tone, length="medium"):
+    """Build the cache key for a caption request: lower-cased topic, sorted tones and length"""
+    tones = sorted({t.strip().lower() for t in tone.split(',') if t.strip()})
+    return f"{topic.strip().lower()}|{','.join(tones)}|{(length or 'medium').strip().lower()}"
+
+
+class SQLiteCaptionStore:
+    """Shared on-disk cache tier so every gunicorn worker can reuse generated captions"""
+
+    def __init__(self, path, ttl, max_entries=10000, stale_ttl=0):
+        self.path = path
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        # Short-lived connection, so nothing is left open if a preloading gunicorn master forks after import
+        conn = self._open()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS caption_cache ("
+            "key TEXT PRIMARY KEY, captions TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        conn.close()
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _connect(self):
+        # sqlite3 connections cannot be shared between threads, so keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._open()
+        return conn
+
+    def get(self, key, max_age=None):
+        max_age = self.ttl if max_age is None else max_age
+        row = self._connect().execute(
+            "SELECT captions, created FROM caption_cache WHERE key = ? AND created >= ?",
+            (key, time.time() - max_age)
+        ).fetchone()
+        return row
+
+    def set(self, key, captions, created):
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO caption_cache (key, captions, created) VALUES (?, ?, ?)",
+            (key, captions, created)
+        )
+        self._writes += 1
+        # Prune expired and overflow rows every so often instead of on each write
+        if self._writes % 100 == 0:
+            return self.prune()
+        return 0
+
+    def prune(self):
+        conn = self._connect()
+        removed = conn.execute(
+            "DELETE FROM caption_cache WHERE created < ?", (time.time() - self.ttl - self.stale_ttl,)
+        ).rowcount
+        removed += conn.execute(
+            "DELETE FROM caption_cache WHERE key IN ("
+            "SELECT key FROM caption_cache ORDER BY created DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        ).rowcount
+        return removed
+
+    def clear(self):
+        self._connect().execute("DELETE FROM caption_cache")
+
+
+class CaptionCache:
+    """Bounded in-memory LRU cache with TTL, optionally backed by a shared SQLite tier.
+
+    Expired entries are kept for a further stale_ttl seconds so get_stale() can
+    serve them as a degraded fallback when OpenAI is slow or unavailable.
+    """
+
+    def __init__(self, max_entries=256, ttl=3600, db_path=None, stale_ttl=0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'disk_evictions': 0,
+            'expirations': 0,
+            'bypasses': 0,
+            'stores': 0,
+            'stale_hits': 0,
+        }
+        self.store = None
+        if db_path:
+            try:
+                self.store = SQLiteCaptionStore(db_path, ttl, stale_ttl=stale_ttl)
+            except sqlite3.Error as e:
+                logging.warning(f"Caption cache disk tier disabled: {e}")
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 or self.store is not None
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def _remember(self, key, captions, created):
+        """Insert into the memory tier, evicting least recently used entries past the bound"""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (captions, created)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def get(self, key):
+        """Return cached captions for a key or None, checking memory first and then disk"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[1] < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    self.stats['memory_hits'] += 1
+                    return entry[0]
+                if now - entry[1] >= self.ttl + self.stale_ttl:
+                    del self._entries[key]
+                self.stats['expirations'] += 1
+
+        if self.store is not None:
+            try:
+                row = self.store.get(key)
+            except sqlite3.Error as e:
+                logging.warning(f"Caption cache disk read failed: {e}")
+                row = None
+            if row is not None:
+                self._remember(key, row[0], row[1])
+                self._count('hits')
+                self._count('disk_hits')
+                return row[0]
+
+        self._count('misses')
+        return None
+
+    def get_stale(self, key):
+        """Return captions for a key even if expired (within the stale window), or None"""
+        max_age = self.ttl + self.stale_ttl
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[1] < max_age:
+                self.stats['stale_hits'] += 1
+                return entry[0]
+
+        if self.store is not None:
+            try:
+                row = self.store.get(key, max_age=max_age)
+            except sqlite3.Error as e:
+                logging.warning(f"Caption cache disk read failed: {e}")
+                row = None
+            if row is not None:
+                self._count('stale_hits')
+                return row[0]
+        return None
+
+    def set(self, key, captions):
+        """Store freshly generated captions in both tiers"""
+        if not captions:
+            return
+        created = time.time()
+        self._remember(key, captions, created)
+        self._count('stores')
+        if self.store is not None:
+            try:
+                removed = self.store.set(key, captions, created)
+                if removed:
+                    self._count('disk_evictions', removed)
+            except sqlite3.Error as e:
+                logging.warning(f"Caption cache disk write failed: {e}")
+
+    def record_bypass(self):
+        self._count('bypasses')
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.store is not None:
+            self.store.clear()
+
+    def snapshot(self):
+        """Return a copy of the counters plus current sizes for reporting"""
+        with self._lock:
+            data = dict(self.stats)
+            data['entries'] = len(self._entries)
+        lookups = data['hits'] + data['misses']
+        data['hit_ratio'] = round(data['hits'] / lookups, 4) if lookups else 0.0
+        data['max_entries'] = self.max_entries
+        data['ttl'] = self.ttl
+        data['disk_tier'] = self.store is not None
+        return data
+
+
+def create_caption_cache_from_env():
+    """Configure the caption cache from CAPTION_CACHE_* environment variables"""
+    return CaptionCache(
+        max_entries=int(os.environ.get("CAPTION_CACHE_SIZE", "256")),
+        ttl=float(os.environ.get("CAPTION_CACHE_TTL", "3600")),
+        db_path=os.environ.get("CAPTION_CACHE_DB") or None,
+        stale_ttl=float(os.environ.get("CAPTION_CACHE_STALE_TTL", "86400")),
+    )
@@ -0,0 +1,185 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Numeric state for the /metrics gauge
+STATE_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling OpenAI while the circuit breaker is open"""
+
+
+def is_upstream_failure(e):
+    """True for failures that say OpenAI itself is unhealthy: 5xx, timeouts and connection errors.
+
+    Client-side problems (bad key, quota, 429 for one key) don't count against upstream health.
+    """
+    status = getattr(e, 'status_code', None)
+    if status is not None:
+        return status >= 500
+    try:
+        from openai import APIConnectionError
+    except ImportError:
+        return False
+    return isinstance(e, APIConnectionError)
+
+
+class CircuitBreaker:
+    """Stop calling OpenAI while it is erroring or slow, then probe for recovery.
+
+    Closed: outcomes from the last window seconds are tracked; once there are
+    at least min_calls and the share of failures (errors plus calls slower
+    than slow_call_seconds) reaches failure_ratio, the breaker opens.
+    Open: calls are rejected for open_seconds. Half-open: up to
+    half_open_probes calls go through; if they all succeed the breaker closes,
+    and any failure opens it again.
+    """
+
+    def __init__(self, failure_ratio=0.5, min_calls=10, window=30.0, slow_call_seconds=8.0,
+                 open_seconds=15.0, half_open_probes=3):
+        self.failure_ratio = failure_ratio
+        self.min_calls = min_calls
+        self.window = window
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self._outcomes = deque()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self._lock = threading.Lock()
+        self.stats = {
+            'calls': 0,
+            'failures': 0,
+            'slow_calls': 0,
+            'rejected': 0,
+            'opened': 0,
+            'probes': 0,
+        }
+
+    def _trim(self, now):
+        # Caller holds self._lock
+        while self._outcomes and now - self._outcomes[0][0] > self.window:
+            _, failed = self._outcomes.popleft()
+            self._failures -= failed
+
+    def _open(self, now):
+        self.state = OPEN
+        self._opened_at = now
+        self._outcomes.clear()
+        self._failures = 0
+        self.stats['opened'] += 1
+        logging.warning("Circuit breaker opened: skipping OpenAI calls for "
+                        f"{self.open_seconds:.0f}s after repeated upstream failures")
+
+    def allow(self):
+        """Whether a call may go upstream now; in half-open state this takes a probe slot"""
+        now = time.monotonic()
+        with self._lock:
+            if self.state == OPEN and now - self._opened_at >= self.open_seconds:
+                self.state = HALF_OPEN
+                self._probes_in_flight = 0
+                self._probe_successes = 0
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and self._probes_in_flight < self.half_open_probes:
+                self._probes_in_flight += 1
+                self.stats['probes'] += 1
+                return True
+            self.stats['rejected'] += 1
+            return False
+
+    def record(self, duration, ok):
+        """Record a finished call; ok=None means the outcome says nothing about upstream health"""
+        now = time.monotonic()
+        with self._lock:
+            if ok is None:
+                if self.state == HALF_OPEN:
+                    self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                return
+            slow = duration >= self.slow_call_seconds
+            failed = not ok or slow
+            self.stats['calls'] += 1
+            self.stats['failures'] += not ok
+            self.stats['slow_calls'] += slow
+
+            if self.state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if failed:
+                    self._open(now)
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_probes:
+                        self.state = CLOSED
+                        logging.info("Circuit breaker closed: OpenAI recovered")
+                return
+            if self.state == OPEN:
+                # A call that started before the breaker opened
+                return
+
+            self._outcomes.append((now, failed))
+            self._failures += failed
+            self._trim(now)
+            if len(self._outcomes) >= self.min_calls and self._failures / len(self._outcomes) >= self.failure_ratio:
+                self._open(now)
+
+    def call(self, send):
+        """Run send() if the breaker allows it, recording its outcome and latency"""
+        if not self.allow():
+            raise CircuitOpenError("OpenAI circuit breaker is open")
+        started = time.monotonic()
+        try:
+            result = send()
+        except Exception as e:
+            self.record(time.monotonic() - started, False if is_upstream_failure(e) else None)
+            raise
+        self.record(time.monotonic() - started, True)
+        return result
+
+    async def async_call(self, send):
+        """Async counterpart of call()"""
+        if not self.allow():
+            raise CircuitOpenError("OpenAI circuit breaker is open")
+        started = time.monotonic()
+        try:
+            result = await send()
+        except Exception as e:
+            self.record(time.monotonic() - started, False if is_upstream_failure(e) else None)
+            raise
+        self.record(time.monotonic() - started, True)
+        return result
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            data = dict(self.stats)
+            data['state'] = self.state
+            data['state_code'] = STATE_CODES[self.state]
+            data['window_calls'] = len(self._outcomes)
+            data['window_failures'] = self._failures
+        return data
+
+
+def create_circuit_breaker_from_env(slow_call_seconds=8.0):
+    """Configure the OpenAI circuit breaker from CIRCUIT_* environment variables.
+
+    Calls slower than slow_call_seconds (normally the generation budget) count as failures.
+    """
+    return CircuitBreaker(
+        failure_ratio=float(os.environ.get("CIRCUIT_FAILURE_RATIO", "0.5")),
+        min_calls=int(os.environ.get("CIRCUIT_MIN_CALLS", "10")),
+        window=float(os.environ.get("CIRCUIT_WINDOW", "30")),
+        slow_call_seconds=float(os.environ.get("CIRCUIT_SLOW_CALL_SECONDS", slow_call_seconds)),
+        open_seconds=float(os.environ.get("CIRCUIT_OPEN_SECONDS", "15")),
+        half_open_probes=int(os.environ.get("CIRCUIT_HALF_OPEN_PROBES", "3")),
+    )
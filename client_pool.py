@@ -0,0 +1,241 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+def hash_api_key(api_key):
+    """Return a stable fingerprint for an API key so raw keys are never used as dict keys"""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+
+
+def create_openai_client(api_key, keepalive_expiry=30.0, max_keepalive=20, verify=True, timeout=30.0):
+    """Build an OpenAI client whose HTTP connections stay alive between caption requests"""
+    try:
+        import httpx
+        from openai import OpenAI, DefaultHttpxClient
+    except ImportError:
+        raise Exception("OpenAI library not available.")
+
+    http_client = DefaultHttpxClient(
+        limits=httpx.Limits(
+            max_connections=100,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        ),
+        verify=verify,
+    )
+    # Retries and backoff are handled per API key by rate_limit.RateLimiter; the timeout
+    # bounds calls that outlive a request's latency budget and keep running in the background
+    return OpenAI(api_key=api_key, http_client=http_client, max_retries=0, timeout=timeout)
+
+
+def create_async_openai_client(api_key, keepalive_expiry=30.0, max_keepalive=100, verify=True, timeout=30.0):
+    """Build an AsyncOpenAI client for the ASGI entry point, with keep-alive connections"""
+    try:
+        import httpx
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+    except ImportError:
+        raise Exception("OpenAI library not available.")
+
+    # Async workers multiplex many generations per process, so allow more connections
+    http_client = DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=1000,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        ),
+        verify=verify,
+    )
+    return AsyncOpenAI(api_key=api_key, http_client=http_client, max_retries=0, timeout=timeout)
+
+
+class _PooledClient:
+    """A pooled client plus the bookkeeping needed for LRU and idle eviction"""
+
+    __slots__ = ('client', 'last_used', 'leases', 'retired')
+
+    def __init__(self, client):
+        self.client = client
+        self.last_used = time.monotonic()
+        self.leases = 0
+        self.retired = False
+
+
+class OpenAIClientPool:
+    """LRU pool of OpenAI clients keyed by API key hash, with idle timeouts"""
+
+    def __init__(self, max_clients=64, idle_timeout=300.0, factory=None):
+        self.max_clients = max_clients
+        self.idle_timeout = idle_timeout
+        self.factory = factory or create_openai_client
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {
+            'created': 0,
+            'reused': 0,
+            'evictions': 0,
+            'idle_evictions': 0,
+            'create_errors': 0,
+        }
+
+    def _close(self, entry):
+        try:
+            result = entry.client.close()
+            # AsyncOpenAI.close() is a coroutine; run it on the event loop that owns the client
+            # (asyncio is imported here so sync workers don't load it at startup)
+            if hasattr(result, '__await__'):
+                import asyncio
+                try:
+                    asyncio.get_running_loop().create_task(result)
+                except RuntimeError:
+                    result.close()
+        except Exception as e:
+            logging.debug(f"Error closing pooled OpenAI client: {e}")
+
+    def _retire(self, entry, to_close):
+        # Clients still leased by another request are closed when that lease ends
+        entry.retired = True
+        if entry.leases == 0:
+            to_close.append(entry)
+
+    def _evict_idle(self, now, to_close):
+        for key in list(self._clients):
+            entry = self._clients[key]
+            if entry.leases == 0 and now - entry.last_used > self.idle_timeout:
+                del self._clients[key]
+                self.stats['idle_evictions'] += 1
+                self._retire(entry, to_close)
+
+    def lease(self, api_key):
+        """Check out the pooled client entry for an API key, creating it on first use"""
+        key = hash_api_key(api_key)
+        now = time.monotonic()
+        to_close = []
+        with self._lock:
+            self._evict_idle(now, to_close)
+            entry = self._clients.get(key)
+            if entry is not None:
+                self._clients.move_to_end(key)
+                self.stats['reused'] += 1
+                entry.last_used = now
+                entry.leases += 1
+        for stale in to_close:
+            self._close(stale)
+        if entry is not None:
+            return entry
+
+        # Build outside the lock so a slow constructor does not block other keys
+        try:
+            client = self.factory(api_key)
+        except Exception:
+            with self._lock:
+                self.stats['create_errors'] += 1
+            raise
+
+        fresh = _PooledClient(client)
+        fresh.leases = 1
+        with self._lock:
+            existing = self._clients.get(key)
+            if existing is not None:
+                # Another thread created one first; keep theirs and drop ours
+                existing.leases += 1
+                existing.last_used = now
+                self._clients.move_to_end(key)
+                self.stats['reused'] += 1
+                to_close.append(fresh)
+                entry = existing
+            else:
+                self._clients[key] = fresh
+                self.stats['created'] += 1
+                while len(self._clients) > self.max_clients:
+                    _, evicted = self._clients.popitem(last=False)
+                    self.stats['evictions'] += 1
+                    self._retire(evicted, to_close)
+                entry = fresh
+        for stale in to_close:
+            self._close(stale)
+        return entry
+
+    def release(self, entry):
+        """Return a leased entry, closing it if it was evicted while in use"""
+        with self._lock:
+            entry.leases -= 1
+            entry.last_used = time.monotonic()
+            close_now = entry.retired and entry.leases == 0
+        if close_now:
+            self._close(entry)
+
+    @contextmanager
+    def client(self, api_key):
+        """Lease the pooled client for an API key for the duration of one request"""
+        entry = self.lease(api_key)
+        try:
+            yield entry.client
+        finally:
+            self.release(entry)
+
+    def warm(self, api_key):
+        """Create (or touch) the client for a key ahead of its first generation"""
+        try:
+            entry = self.lease(api_key)
+        except Exception as e:
+            logging.debug(f"Could not pre-create OpenAI client: {e}")
+            return
+        self.release(entry)
+
+    def discard(self, api_key):
+        """Drop the client for a key, e.g. after the key is rejected or cleared"""
+        to_close = []
+        with self._lock:
+            entry = self._clients.pop(hash_api_key(api_key), None)
+            if entry is not None:
+                self._retire(entry, to_close)
+        for stale in to_close:
+            self._close(stale)
+
+    def close(self):
+        to_close = []
+        with self._lock:
+            while self._clients:
+                _, entry = self._clients.popitem()
+                self._retire(entry, to_close)
+        for stale in to_close:
+            self._close(stale)
+
+    def snapshot(self):
+        """Return pool counters plus live client count and reuse ratio"""
+        with self._lock:
+            data = dict(self.stats)
+            data['live_clients'] = len(self._clients)
+            data['leased_clients'] = sum(1 for e in self._clients.values() if e.leases)
+        checkouts = data['created'] + data['reused']
+        data['reuse_ratio'] = round(data['reused'] / checkouts, 4) if checkouts else 0.0
+        data['max_clients'] = self.max_clients
+        data['idle_timeout'] = self.idle_timeout
+        return data
+
+
+def create_client_pool_from_env():
+    """Configure the OpenAI client pool from OPENAI_POOL_* environment variables"""
+    keepalive = float(os.environ.get("OPENAI_KEEPALIVE_EXPIRY", "30"))
+    timeout = float(os.environ.get("OPENAI_TIMEOUT", "30"))
+    return OpenAIClientPool(
+        max_clients=int(os.environ.get("OPENAI_POOL_SIZE", "64")),
+        idle_timeout=float(os.environ.get("OPENAI_POOL_IDLE_TIMEOUT", "300")),
+        factory=lambda api_key: create_openai_client(api_key, keepalive_expiry=keepalive, timeout=timeout),
+    )
+
+
+def create_async_client_pool_from_env():
+    """Configure the AsyncOpenAI client pool from the same OPENAI_POOL_* environment variables"""
+    keepalive = float(os.environ.get("OPENAI_KEEPALIVE_EXPIRY", "30"))
+    timeout = float(os.environ.get("OPENAI_TIMEOUT", "30"))
+    return OpenAIClientPool(
+        max_clients=int(os.environ.get("OPENAI_POOL_SIZE", "64")),
+        idle_timeout=float(os.environ.get("OPENAI_POOL_IDLE_TIMEOUT", "300")),
+        factory=lambda api_key: create_async_openai_client(api_key, keepalive_expiry=keepalive, timeout=timeout),
+    )
@@ -0,0 +1,32 @@
+"""Gunicorn settings, picked up automatically when gunicorn starts in this directory.
+
+Deployments preload the app: main.py is imported once in the master (OpenAI
+SDK not included, page template compiled and rendered, assets hashed) and
+every worker forks with that already done, so autoscale cold starts and
+worker restarts skip it. `--reload` (the dev workflow) can't preload, so it
+keeps importing per worker.
+"""
+
+import os
+import sys
+
+reload_mode = "--reload" in sys.argv
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+# One worker, as before; the in-process caches and limits are per worker
+workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+preload_app = not reload_mode
+
+# Production log levels unless LOG_LEVEL says otherwise
+os.environ.setdefault("LOG_LEVEL", "INFO" if reload_mode else "WARNING")
+loglevel = os.environ["LOG_LEVEL"].lower()
+
+if preload_app:
+    # Tells main.py to leave thread startup to post_fork; threads don't survive fork
+    os.environ["PRELOAD_APP"] = "1"
+
+
+def post_fork(server, worker):
+    if preload_app:
+        from main import start_job_workers
+        start_job_workers()
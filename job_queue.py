@@ -0,0 +1,329 @@
+import os
+import time
+import uuid
+import socket
+import sqlite3
+import logging
+import threading
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+FINISHED = (DONE, FAILED)
+
+# Next to the app rather than the current directory, so every process finds the same queue
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'caption_jobs.db')
+
+# Priorities run highest first; the page submits at DEFAULT_PRIORITY
+MIN_PRIORITY, MAX_PRIORITY, DEFAULT_PRIORITY = 0, 9, 5
+
+
+class QueueFull(Exception):
+    """The queue already holds max_depth pending jobs"""
+
+
+class JobFailed(Exception):
+    """Raised by a job handler to fail a job with a specific error kind"""
+
+    def __init__(self, message, error_kind='error'):
+        super().__init__(message)
+        self.error_kind = error_kind
+
+
+class RetryJob(JobFailed):
+    """Raised by a job handler for transient failures; the job is queued again after a backoff"""
+
+
+class JobQueue:
+    """SQLite-backed caption job queue shared by every worker process on this machine.
+
+    Web requests only submit and poll. Background threads claim the highest
+    priority queued job, run the handler and store the result. A running job
+    whose claim expires (its process died or restarted) is picked up again, so
+    queued work survives restarts. The API key is stored only until the job
+    finishes, or until it expires unclaimed after queue_ttl, and is never
+    returned by get().
+    """
+
+    def __init__(self, path, handler, max_depth=1000, lease_seconds=120.0, max_attempts=3,
+                 result_ttl=3600.0, queue_ttl=600.0, poll_interval=0.25):
+        self.path = path
+        self.handler = handler
+        self.max_depth = max_depth
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.result_ttl = result_ttl
+        self.queue_ttl = queue_ttl
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._local = threading.local()
+        self._threads = []
+        self._stopping = threading.Event()
+        # Wakes idle workers and long-polls in this process; other processes notice by polling
+        self._changed = threading.Condition()
+        self.stats = {'submitted': 0, 'rejected': 0, 'completed': 0, 'failed': 0, 'retried': 0, 'reclaimed': 0,
+                      'expired': 0}
+        self._stats_lock = threading.Lock()
+        # Set up the table on a short-lived connection, so nothing is left open if a
+        # preloading gunicorn master forks after import
+        conn = self._open()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS caption_jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, priority INTEGER NOT NULL, "
+            "topic TEXT NOT NULL, tone TEXT NOT NULL, length TEXT NOT NULL, "
+            "fresh INTEGER NOT NULL DEFAULT 0, use_mock INTEGER NOT NULL DEFAULT 0, api_key TEXT, "
+            "result TEXT, error TEXT, error_kind TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+            "created REAL NOT NULL, run_after REAL NOT NULL, started REAL, finished REAL, "
+            "lease_expires REAL, worker TEXT)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS caption_jobs_pending ON caption_jobs (status, priority DESC, created)"
+        )
+        conn.close()
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _connect(self):
+        # sqlite3 connections cannot be shared between threads, so keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._open()
+        return conn
+
+    def _count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def _notify(self):
+        with self._changed:
+            self._changed.notify_all()
+
+    def submit(self, topic, tone, length='medium', api_key=None, fresh=False, use_mock=False,
+               priority=DEFAULT_PRIORITY):
+        """Queue a caption job and return its ID, or raise QueueFull"""
+        priority = min(MAX_PRIORITY, max(MIN_PRIORITY, int(priority)))
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            depth = conn.execute(
+                "SELECT COUNT(*) FROM caption_jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+            ).fetchone()[0]
+            if depth >= self.max_depth:
+                conn.execute("ROLLBACK")
+                self._count('rejected')
+                raise QueueFull(f"Caption queue is full ({depth} jobs pending)")
+            conn.execute(
+                "INSERT INTO caption_jobs (id, status, priority, topic, tone, length, fresh, use_mock, "
+                "api_key, created, run_after) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, priority, topic, tone, length, int(bool(fresh)), int(bool(use_mock)),
+                 api_key or None, now, now)
+            )
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        self._count('submitted')
+        self._notify()
+        return job_id
+
+    def _claim(self):
+        """Atomically take the next runnable job (or an abandoned running one) for this worker"""
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "UPDATE caption_jobs SET status = ?, worker = ?, lease_expires = ?, "
+                "started = COALESCE(started, ?), attempts = attempts + 1 "
+                "WHERE id = (SELECT id FROM caption_jobs "
+                "WHERE (status = ? AND run_after <= ?) OR (status = ? AND lease_expires < ?) "
+                "ORDER BY priority DESC, created LIMIT 1) RETURNING *",
+                (RUNNING, self.worker_id, now + self.lease_seconds, now, QUEUED, now, RUNNING, now)
+            ).fetchone()
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        if row is not None and row['attempts'] > 1 and row['error_kind'] is None:
+            # Claimed from a process that died mid-job rather than a scheduled retry
+            self._count('reclaimed')
+        return row
+
+    def _finish(self, job_id, status, result=None, error=None, error_kind=None):
+        self._connect().execute(
+            "UPDATE caption_jobs SET status = ?, result = ?, error = ?, error_kind = ?, finished = ?, "
+            "api_key = NULL, lease_expires = NULL WHERE id = ?",
+            (status, result, error, error_kind, time.time(), job_id)
+        )
+        self._count('completed' if status == DONE else 'failed')
+        self._notify()
+
+    def _retry(self, job, error):
+        # Exponential backoff between attempts: 2s, 4s, 8s...
+        delay = 2.0 ** job['attempts']
+        self._connect().execute(
+            "UPDATE caption_jobs SET status = ?, error = ?, error_kind = ?, run_after = ?, "
+            "lease_expires = NULL WHERE id = ?",
+            (QUEUED, str(error), error.error_kind, time.time() + delay, job['id'])
+        )
+        self._count('retried')
+
+    def _run(self, job):
+        try:
+            result = self.handler(dict(job))
+        except RetryJob as e:
+            if job['attempts'] < self.max_attempts:
+                self._retry(job, e)
+            else:
+                self._finish(job['id'], FAILED, error=str(e), error_kind=e.error_kind)
+        except JobFailed as e:
+            self._finish(job['id'], FAILED, error=str(e), error_kind=e.error_kind)
+        except Exception as e:
+            logging.error(f"Caption job {job['id']} failed: {e}")
+            self._finish(job['id'], FAILED, error=str(e), error_kind='error')
+        else:
+            self._finish(job['id'], DONE, result=result)
+
+    def _work(self):
+        while not self._stopping.is_set():
+            try:
+                job = self._claim()
+            except sqlite3.Error as e:
+                logging.warning(f"Caption job claim failed: {e}")
+                job = None
+            if job is None:
+                with self._changed:
+                    self._changed.wait(self.poll_interval * 4)
+                continue
+            if job['attempts'] > self.max_attempts:
+                self._finish(job['id'], FAILED, error="Job abandoned after repeated worker restarts.",
+                             error_kind='error')
+                continue
+            self._run(job)
+
+    def recover_orphans(self):
+        """Requeue running jobs left behind by dead processes on this host, without waiting for their lease"""
+        host = socket.gethostname()
+        conn = self._connect()
+        orphans = []
+        for row in conn.execute("SELECT id, worker FROM caption_jobs WHERE status = ?", (RUNNING,)).fetchall():
+            worker_host, _, pid = (row['worker'] or '').rpartition(':')
+            if worker_host != host or not pid.isdigit() or int(pid) == os.getpid():
+                continue
+            try:
+                os.kill(int(pid), 0)
+            except ProcessLookupError:
+                orphans.append(row['id'])
+            except PermissionError:
+                pass
+        for job_id in orphans:
+            conn.execute("UPDATE caption_jobs SET status = ?, lease_expires = NULL WHERE id = ? AND status = ?",
+                         (QUEUED, job_id, RUNNING))
+        if orphans:
+            logging.info(f"Requeued {len(orphans)} caption jobs from stopped workers")
+        return len(orphans)
+
+    def start(self, workers):
+        """Start background worker threads (call once per process)"""
+        # Claims are tagged with this process, which may have been forked since __init__
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        try:
+            self.recover_orphans()
+        except sqlite3.Error as e:
+            logging.warning(f"Caption job recovery failed: {e}")
+        for index in range(workers):
+            thread = threading.Thread(target=self._work, name=f"caption-job-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        threading.Thread(target=self._prune_loop, name="caption-job-prune", daemon=True).start()
+
+    def stop(self):
+        self._stopping.set()
+        self._notify()
+
+    def _prune_loop(self):
+        while not self._stopping.wait(60):
+            try:
+                self.prune()
+            except sqlite3.Error as e:
+                logging.warning(f"Caption job prune failed: {e}")
+
+    def prune(self):
+        """Fail jobs nobody picked up within queue_ttl (clearing their API keys), then drop
+        finished jobs older than result_ttl"""
+        now = time.time()
+        conn = self._connect()
+        expired = conn.execute(
+            "UPDATE caption_jobs SET status = ?, error = ?, error_kind = ?, finished = ?, api_key = NULL, "
+            "lease_expires = NULL WHERE created < ? AND (status = ? OR (status = ? AND lease_expires < ?))",
+            (FAILED, "Job expired before a worker could finish it.", 'expired', now,
+             now - self.queue_ttl, QUEUED, RUNNING, now)
+        ).rowcount
+        if expired:
+            with self._stats_lock:
+                self.stats['expired'] += expired
+            self._notify()
+        return conn.execute(
+            "DELETE FROM caption_jobs WHERE status IN (?, ?) AND finished < ?",
+            (DONE, FAILED, now - self.result_ttl)
+        ).rowcount
+
+    def get(self, job_id):
+        """Public view of a job (never includes the API key), or None"""
+        row = self._connect().execute(
+            "SELECT id, status, priority, use_mock, result, error, error_kind, attempts, created, started, finished, "
+            "(SELECT COUNT(*) FROM caption_jobs AS ahead WHERE ahead.status = ? "
+            " AND (ahead.priority > j.priority OR (ahead.priority = j.priority AND ahead.created < j.created))) "
+            "AS position FROM caption_jobs AS j WHERE id = ?",
+            (QUEUED, job_id)
+        ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        if job['status'] != QUEUED:
+            job['position'] = None
+        return job
+
+    def wait(self, job_id, timeout):
+        """Long-poll: return the job once it has finished, or its current state after timeout"""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job['status'] in FINISHED or remaining <= 0:
+                return job
+            with self._changed:
+                self._changed.wait(min(self.poll_interval, remaining))
+
+    def snapshot(self):
+        counts = dict(self._connect().execute(
+            "SELECT status, COUNT(*) FROM caption_jobs GROUP BY status"
+        ).fetchall())
+        with self._stats_lock:
+            data = dict(self.stats)
+        for status in (QUEUED, RUNNING, DONE, FAILED):
+            data[status] = counts.get(status, 0)
+        data['max_depth'] = self.max_depth
+        data['workers'] = len(self._threads)
+        return data
+
+
+def create_job_queue_from_env(handler):
+    """Configure the caption job queue from JOB_* environment variables"""
+    return JobQueue(
+        path=os.environ.get("JOB_QUEUE_DB", DEFAULT_DB_PATH),
+        handler=handler,
+        max_depth=int(os.environ.get("JOB_QUEUE_MAX_DEPTH", "1000")),
+        lease_seconds=float(os.environ.get("JOB_LEASE_SECONDS", "120")),
+        max_attempts=int(os.environ.get("JOB_MAX_ATTEMPTS", "3")),
+        result_ttl=float(os.environ.get("JOB_RESULT_TTL", "3600")),
+        queue_ttl=float(os.environ.get("JOB_QUEUE_TTL", "600")),
+    )
@@ -1,151 +1,348 @@
 import os
+import json
+import time
+import hmac
+import uuid
+import queue
 import logging
-from flask import Flask, render_template, request, flash, redirect, url_for, session
+import threading
+import importlib.util
+from contextvars import copy_context
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from flask import Flask, render_template, request, flash, redirect, url_for, session, jsonify, Response, stream_with_context
+from caption_cache import create_caption_cache_from_env, normalize_cache_key
+from client_pool import create_client_pool_from_env, create_async_client_pool_from_env, hash_api_key
+from batch import create_batch_runner_from_env
+from single_flight import create_single_flight_from_env
+from mock_captions import MockCaptionEngine
+from assets import AssetRegistry
+from metrics import create_pipeline_metrics_from_env
+from circuit_breaker import create_circuit_breaker_from_env, CircuitOpenError, is_upstream_failure
+from rate_limit import create_rate_limiter_from_env, estimate_request_tokens, is_hard_quota_error, RateLimitTimeout
+from candidate_pool import create_candidate_pool_from_env
+from job_queue import create_job_queue_from_env, JobFailed, RetryJob, QueueFull, MIN_PRIORITY, MAX_PRIORITY, DEFAULT_PRIORITY
 
-# Set up logging for debugging
-logging.basicConfig(level=logging.DEBUG)
+# LOG_LEVEL sets the app's log level (gunicorn.conf.py defaults deployments to WARNING)
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+logging.basicConfig(level=LOG_LEVEL)
+if LOG_LEVEL != "DEBUG":
+    # httpx logs every upstream request at INFO
+    logging.getLogger("httpx").setLevel(logging.WARNING)
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key")
 
+# Stage histograms and token counters served at /metrics (METRICS_SLOW_REQUEST_MS logs slow requests)
+pipeline_metrics = create_pipeline_metrics_from_env()
+pipeline_metrics.instrument_flask(app)
+
 # No preloaded API key - users must provide their own
 openai_client = None
 
-try:
-    from openai import OpenAI
+# Caption cache: per-worker LRU with TTL, plus optional shared SQLite tier (CAPTION_CACHE_DB)
+caption_cache = create_caption_cache_from_env()
+
+# Identical in-flight generations share one upstream call (SINGLE_FLIGHT_LOCK_DIR spans workers)
+single_flight = create_single_flight_from_env()
+
+# Pooled OpenAI clients keyed by API key hash, reused across requests and routes
+client_pool = create_client_pool_from_env()
+
+# Per-key token buckets sized from x-ratelimit-* headers, with backoff on 429 (OPENAI_RETRY_*)
+rate_limiter = create_rate_limiter_from_env()
+
+# Latency budget for a generation; past it the request falls back to cached or demo captions
+GENERATION_BUDGET = float(os.environ.get("GENERATION_BUDGET", "8"))
+GENERATION_THREADS = int(os.environ.get("GENERATION_THREADS", "32"))
+generation_executor = ThreadPoolExecutor(max_workers=GENERATION_THREADS, thread_name_prefix="caption-generate")
+# At most GENERATION_QUEUE_SIZE generations wait for a thread; past that requests degrade straight away
+generation_slots = threading.BoundedSemaphore(GENERATION_THREADS + int(os.environ.get("GENERATION_QUEUE_SIZE", "32")))
+
+# Skips OpenAI entirely while it is erroring or slower than the budget (CIRCUIT_*)
+circuit_breaker = create_circuit_breaker_from_env(slow_call_seconds=GENERATION_BUDGET or 8.0)
+
+# Extra captions from multi-completion calls, kept per session so regenerate clicks skip GPT-4o
+# (CANDIDATE_POOL_N completions per call; 0 or 1 turns the pool off)
+CAPTIONS_PER_SET = 3
+CANDIDATE_POOL_N = int(os.environ.get("CANDIDATE_POOL_N", "0"))
+candidate_pool = create_candidate_pool_from_env(set_size=CAPTIONS_PER_SET)
+
+# AsyncOpenAI clients for the async generation path served by the ASGI entry point (asgi.py)
+async_client_pool = create_async_client_pool_from_env()
+
+# Shared thread pool for the JSON batch API, capped per API key (BATCH_CONCURRENCY_PER_KEY)
+batch_runner = create_batch_runner_from_env()
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", "500"))
+
+# Fingerprinted CSS/JS held in memory (built by `python assets.py`, else hashed from static/ at startup)
+asset_registry = AssetRegistry()
+ASSET_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@app.template_global()
+def asset_url(name):
+    """URL of the content-hashed build of a static asset, safe to cache forever"""
+    return url_for('asset', filename=asset_registry.public_name(name))
+
+# Only check that the SDK is installed: importing it takes longer than the rest of startup,
+# so client_pool imports it on the first real (non-mock) generation
+if importlib.util.find_spec("openai") is not None:
     logging.info("OpenAI library available - users can provide their own API keys")
-except ImportError:
+else:
     logging.warning("OpenAI library not available, using mock fallback")
 
+def clean_caption_line(line):
+    """Clean a single line of caption output, returning '' for lines that should be dropped"""
+    line = line.strip()
+    # Skip tone headers like "**Serious Tone:**" or "**Motivational Tone:**"
+    if line.startswith('**') and line.endswith('Tone:**'):
+        return ''
+    # Remove number prefixes like "1. ", "2. ", "3. " etc.
+    if line and len(line) > 3:
+        # Check if line starts with number followed by dot and space
+        if line[0].isdigit() and line[1:3] == '. ':
+            line = line[3:]  # Remove "1. " prefix
+        elif len(line) > 4 and line[0].isdigit() and line[1].isdigit() and line[2:4] == '. ':
+            line = line[4:]  # Remove "10. " prefix for double digits
+    return line
+
 def clean_caption_content(content):
     """Remove tone headers and number prefixes from caption content"""
-    lines = content.split('\n')
     cleaned_lines = []
     
-    for line in lines:
-        line = line.strip()
-        # Skip tone headers like "**Serious Tone:**" or "**Motivational Tone:**"
-        if line.startswith('**') and line.endswith('Tone:**'):
-            continue
-        # Remove number prefixes like "1. ", "2. ", "3. " etc.
-        if line and len(line) > 3:
-            # Check if line starts with number followed by dot and space
-            if line[0].isdigit() and line[1:3] == '. ':
-                line = line[3:]  # Remove "1. " prefix
-            elif len(line) > 4 and line[0].isdigit() and line[1].isdigit() and line[2:4] == '. ':
-                line = line[4:]  # Remove "10. " prefix for double digits
+    for line in content.split('\n'):
+        line = clean_caption_line(line)
         # Keep clean caption content
         if line:
             cleaned_lines.append(line)
     
     return '\n'.join(cleaned_lines)
 
-def mock_generate_instagram_captions(topic, tone, length="medium"):
-    """Mock fallback function for generating Instagram captions that blend multiple tones"""
+class IncrementalCaptionCleaner:
+    """Streaming counterpart of clean_caption_content that emits each caption once its line ends"""
     
-    # Handle multiple tones
-    tones = [t.strip().lower() for t in tone.split(',') if t.strip()]
-    
-    # Create tone description for hashtags
-    tone_hashtags = ''.join([f"#{t.title()}" for t in tones])
-    
-    # Generate captions based on length preference
-    if length == "short":
-        # Short captions (1-2 sentences)
-        if 'funny' in tones and 'romantic' in tones:
-            captions = f"""1. {topic} = instant love-laugh combo 😂💕 #{topic.replace(' ', '')}Love {tone_hashtags}
-2. Found my {topic} comedy-romance match 🤪❤️ #{topic.replace(' ', '')}Magic {tone_hashtags}
-3. {topic} + giggles + heart eyes ✨ #{topic.replace(' ', '')}Vibes {tone_hashtags}"""
-        else:
-            tone_blend = ' and '.join(tones)
-            captions = f"""1. {topic} + {tone_blend} energy ✨ #{topic.replace(' ', '')}Magic {tone_hashtags}
-2. Perfect {tone_blend} vibes 🌟 #{topic.replace(' ', '')}Mood {tone_hashtags}
-3. {topic} through {tone_blend} lens 💫 #{topic.replace(' ', '')}Life {tone_hashtags}"""
-    
-    elif length == "long":
-        # Long captions (5+ sentences)
-        if 'funny' in tones and 'romantic' in tones:
-            captions = f"""1. So here's the thing about {topic} - it's got me feeling like the main character in a romantic comedy, except I can't tell if I'm falling in love or just falling over my own two feet. Either way, I'm here for this chaotic energy that somehow makes perfect sense. Life's too short not to laugh at your own love story, right? Sometimes the best relationships are built on inside jokes and shared adventures. This is what happens when romance meets comedy in real life. 😂💕 #{topic.replace(' ', '')}Love {tone_hashtags} #RomCom
-2. They told me {topic} was serious business, but nobody warned me I'd be over here making heart eyes while simultaneously crafting the world's corniest jokes. Plot twist: apparently you can be swoony AND silly at the same time, and honestly? It's the best combination I never knew I needed. When you find someone who laughs at your terrible puns and still thinks you're attractive, you hold onto that forever. This is what happens when humor meets heart. 🤪❤️ #{topic.replace(' ', '')}Magic {tone_hashtags} #LoveAndLaughs
-3. Update from the front lines of {topic}: I've discovered that the secret ingredient to everything is being equal parts dreamy romantic and absolute goofball. Some days you're writing poetry, other days you're making terrible jokes, but every day you're authentically, beautifully, chaotically yourself. And that's the kind of energy I'm bringing to everything now. Because why choose between heart eyes and belly laughs when you can have both? ✨ #{topic.replace(' ', '')}Vibes {tone_hashtags} #AuthenticChaos"""
-        else:
-            tone_blend = ' and '.join(tones)
-            captions = f"""1. There's something magical that happens when you approach {topic} with {tone_blend} energy - suddenly everything feels more intentional, more meaningful, more authentically you. It's like finding the perfect filter for life, except instead of changing how you look, it changes how you feel about everything around you. This is what happens when you stop forcing yourself into boxes and start embracing the beautiful complexity of who you actually are. Why settle for one-dimensional when life is meant to be a full spectrum experience? ✨ #{topic.replace(' ', '')}Magic {tone_hashtags} #Authentic
-2. Been thinking a lot about how {topic} hits different when you're channeling that perfect {tone_blend} vibe. It's not about being one thing or another - it's about finding that sweet spot where all parts of your personality can coexist and actually enhance each other. Like a perfectly balanced playlist where every song flows into the next, creating something bigger than the sum of its parts. This is how we're meant to live - not in rigid categories, but in beautiful, flowing authenticity. 🌟 #{topic.replace(' ', '')}Mood {tone_hashtags} #RealTalk
-3. Here's what I've learned about seeing {topic} through a {tone_blend} lens: it's not just about changing your perspective, it's about expanding it. When you allow yourself to hold space for seemingly contradictory energies, you create room for growth, for surprise, for the kind of authentic moments that make life feel less like performance and more like art. This is how I choose to see the world now - complex, nuanced, and beautifully contradictory, just like life should be. 💫 #{topic.replace(' ', '')}Life {tone_hashtags} #BeYou"""
+    def __init__(self):
+        # Only the unfinished trailing line is buffered, so text is never re-scanned
+        self.partial = ''
+        self.captions = []
     
-    else:
-        # Medium captions (3-4 sentences) - default
-        if 'funny' in tones and 'romantic' in tones:
-            captions = f"""1. When {topic} makes you laugh until you fall in love all over again 😂💕 Can't tell if I'm falling for the moment or just falling over my own feet, but either way I'm here for it! This is what happens when romance meets comedy in the best possible way. #{topic.replace(' ', '')}Love {tone_hashtags} #RomCom
-2. Found someone who thinks my {topic} jokes are actually romantic... definitely a keeper! 🤪❤️ Plot twist: apparently you can be swoony AND silly at the same time, and honestly? It's the perfect combination I never knew I needed. #{topic.replace(' ', '')}Magic {tone_hashtags} #LoveAndLaughs
-3. They say laughter is the best medicine, but {topic} with you is pure magic 😍🎭 Some days you're writing poetry, other days you're making terrible puns, but every day you're authentically, beautifully, chaotically yourself. This is my kind of energy! ✨ #{topic.replace(' ', '')}Vibes {tone_hashtags} #AuthenticChaos"""
-        
-        elif 'adventurous' in tones and 'chill' in tones:
-            captions = f"""1. Finding adventure in {topic} while keeping my zen intact 🏔️☮️ It's called balanced exploration, and I'm absolutely here for it! Sometimes the best adventures happen when you're completely relaxed about the outcome. #{topic.replace(' ', '')}Balance {tone_hashtags} #AdventurousZen
-2. Sometimes the best adventures happen when you're completely relaxed about {topic} 🌊✨ Ready for anything but also totally fine doing absolutely nothing - it's the perfect mindset! Both mountain climbing and Netflix marathons count as valid exploration. #{topic.replace(' ', '')}Vibes {tone_hashtags} #ChillAdventure
-3. Peaceful exploration of {topic} - because not all adventures need adrenaline 🧘‍♀️🗺️ Found my sweet spot: adventurous enough to try new things, chill enough to actually enjoy them. Perfect balance between pushing boundaries and savoring moments! #{topic.replace(' ', '')}Journey {tone_hashtags} #MindfulAdventure"""
-        
-        elif 'professional' in tones and 'funny' in tones:
-            captions = f"""1. Bringing humor to the workplace: {topic} edition 💼😄 Turns out balancing business acumen with a healthy sense of humor is actually the secret sauce. Who knew professionalism could be this fun? #{topic.replace(' ', '')}Success {tone_hashtags} #ProfessionallyFunny
-2. When {topic} meets corporate comedy - productivity through laughter! 📈🎭 Apparently you can close deals AND crack jokes - revolutionary concept, honestly. Serious goals don't always require serious faces. #{topic.replace(' ', '')}Growth {tone_hashtags} #BusinessHumor
-3. Serious about success, silly about everything else - especially {topic} 🎯😂 The best boardrooms have the best laughs, and I'm here to prove it. Sometimes the best ideas come from the silliest moments! #{topic.replace(' ', '')}Life {tone_hashtags} #WorkHardLaughHard"""
-        
-        elif len(tones) > 2:
-            # For multiple complex tones
-            tone_blend = ', '.join(tones[:-1]) + f', and {tones[-1]}'
-            captions = f"""1. {topic} hits different when you blend {tone_blend} energy together ✨ There's something beautiful about embracing all facets of who you are instead of picking just one. Why choose one vibe when you can be authentically multifaceted? #{topic.replace(' ', '')}Fusion {tone_hashtags} #Authentic
-2. Why choose one vibe when {topic} can be {tone_blend} all at once? 🌟 It's not about being one thing or another - it's about being completely, authentically you. Complex, nuanced, and beautifully contradictory! #{topic.replace(' ', '')}Multifaceted {tone_hashtags} #RealTalk
-3. Embracing every shade of {topic} - {tone_blend} and unapologetically me 💫 When you allow yourself to hold space for seemingly contradictory energies, you create room for authentic growth. This is how I choose to see the world! #{topic.replace(' ', '')}Journey {tone_hashtags} #BeYou"""
+    def feed(self, chunk):
+        """Consume a chunk of streamed text and return any captions it completed"""
+        if '\n' not in chunk:
+            self.partial += chunk
+            return []
         
-        else:
-            # Default blended approach for any two tones
-            tone_blend = ' and '.join(tones)
-            captions = f"""1. When {topic} meets {tone_blend} energy - pure magic happens ✨ There's something beautiful about embracing all facets of who you are instead of picking just one. This is what authentic living looks like! #{topic.replace(' ', '')}Magic {tone_hashtags} #Authentic
-2. Blending {tone_blend} vibes with {topic} for the perfect mood 🌟 It's not about being one thing or another - it's about being authentically, completely you. Complex and beautifully contradictory! #{topic.replace(' ', '')}Vibes {tone_hashtags} #RealTalk
-3. {topic} through a {tone_blend} lens - this is how I see the world 💫 When you stop forcing yourself into boxes and start embracing beautiful complexity, everything feels more meaningful. This is my authentic energy! #{topic.replace(' ', '')}Perspective {tone_hashtags} #BeYou"""
+        pieces = chunk.split('\n')
+        pieces[0] = self.partial + pieces[0]
+        self.partial = pieces.pop()
+        
+        completed = []
+        for line in pieces:
+            line = clean_caption_line(line)
+            if line:
+                completed.append(line)
+        self.captions.extend(completed)
+        return completed
+    
+    def finish(self):
+        """Flush the final line once the stream ends"""
+        line = clean_caption_line(self.partial)
+        self.partial = ''
+        if line:
+            self.captions.append(line)
+            return [line]
+        return []
     
-    return clean_caption_content(captions)
+    def result(self):
+        """Return the cleaned captions in the same format as clean_caption_content"""
+        return '\n'.join(self.captions)
 
-def generate_instagram_captions(topic, tone, length="medium", api_key=None):
-    """Generate Instagram captions using OpenAI GPT-4o API that blend multiple tones"""
+class IncrementalStructuredCaptionParser:
+    """Streaming counterpart of parse_structured_captions that emits each caption once its JSON object closes"""
     
-    # Handle multiple tones
-    tones = [t.strip() for t in tone.split(',') if t.strip()]
+    def __init__(self):
+        # Nesting outside strings: 1 is the response object, 2 its captions array, 3 one caption
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        # Characters of the caption object being read; everything before it is already parsed
+        self.item = None
+        self.captions = []
     
-    if not api_key:
-        # If no API key provided, require user to provide one
-        raise Exception("API key required. Please provide your OpenAI API key to generate captions.")
+    def feed(self, chunk):
+        """Consume a chunk of streamed JSON and return any captions it completed"""
+        completed = []
+        for char in chunk:
+            if self.item is not None:
+                self.item.append(char)
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in '{[':
+                self.depth += 1
+                if self.depth == 3 and char == '{':
+                    self.item = [char]
+            elif char in '}]':
+                self.depth -= 1
+                if self.depth == 2 and self.item is not None:
+                    caption = format_structured_caption(json.loads(''.join(self.item)))
+                    self.item = None
+                    if caption:
+                        completed.append(caption)
+        self.captions.extend(completed)
+        return completed
     
-    # Create OpenAI client with provided API key
-    try:
-        from openai import OpenAI
-        client = OpenAI(api_key=api_key)
-    except ImportError:
-        raise Exception("OpenAI library not available.")
-    except Exception as e:
-        raise Exception(f"Failed to initialize OpenAI client: {str(e)}")
+    def finish(self):
+        """Nothing is buffered past the last closed caption; a truncated one is dropped"""
+        return []
     
-    try:
-        # Build tone description for multiple tones
-        if len(tones) == 1:
-            tone_description = tones[0]
-        elif len(tones) == 2:
-            tone_description = f"{tones[0]} and {tones[1]} combined"
+    def result(self):
+        """Return the parsed captions one per line, like IncrementalCaptionCleaner.result"""
+        return '\n'.join(self.captions)
+
+def mock_generate_instagram_captions(topic, tone, length="medium"):
+    """Mock fallback function for generating Instagram captions that blend multiple tones"""
+    pipeline_metrics.record_mock()
+    return mock_engine.render(topic, tone, length)
+
+def mock_generate_instagram_captions_batch(requests):
+    """Render mock captions for many (topic, tone, length) requests in one call"""
+    pipeline_metrics.record_mock(len(requests))
+    return mock_engine.render_batch(requests)
+
+# Table-driven mock engine; its templates are already clean, so no cleaning pass is needed
+mock_engine = MockCaptionEngine(cleaner=clean_caption_content)
+
+# Length specifications shared by the free-text and structured prompts
+CAPTION_LENGTH_SPECS = {
+    "short": "1-2 sentences, concise and punchy",
+    "medium": "3-4 sentences, balanced detail",
+    "long": "5+ sentences, detailed and storytelling"
+}
+
+# Completion budget for 3 captions of each length, with headroom for hashtags and JSON keys
+CAPTION_MAX_TOKENS = {
+    "short": 300,
+    "medium": 500,
+    "long": 800
+}
+
+# "text" parses numbered free-text captions; "json" asks for a JSON schema response (also when streaming)
+CAPTION_OUTPUT = os.environ.get("CAPTION_OUTPUT", "text")
+
+SYSTEM_PROMPT = "You are an expert social media content creator specializing in Instagram captions. You create engaging, authentic captions that drive engagement and match specific tones perfectly."
+
+# Everything that doesn't depend on the request sits in this fixed prefix, so OpenAI's prompt cache can reuse it
+STRUCTURED_SYSTEM_PROMPT = SYSTEM_PROMPT + """
+
+Write exactly 3 unique Instagram captions for the topic, tones and length given by the user.
+- Every caption blends ALL of the requested tones at once, never one tone per caption
+- Keep to the requested length
+- text: the caption on a single line, without hashtags
+- emoji: 1-3 emojis that fit the blended mood, shown after the text
+- hashtags: 2-4 hashtags that capture the topic and blended mood, without the # sign
+- Make each caption Instagram-ready: engaging, shareable, authentic"""
+
+CAPTION_SCHEMA = {
+    "name": "instagram_captions",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "captions": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "text": {"type": "string"},
+                        "emoji": {"type": "string"},
+                        "hashtags": {"type": "array", "items": {"type": "string"}}
+                    },
+                    "required": ["text", "emoji", "hashtags"],
+                    "additionalProperties": False
+                }
+            }
+        },
+        "required": ["captions"],
+        "additionalProperties": False
+    }
+}
+
+def describe_tones(tones):
+    """Phrase the selected tones as one blended tone for the prompt"""
+    if len(tones) == 1:
+        return tones[0]
+    elif len(tones) == 2:
+        return f"{tones[0]} and {tones[1]} combined"
+    return f"{', '.join(tones[:-1])}, and {tones[-1]} blended together"
+
+def build_structured_messages(topic, tones, length="medium"):
+    """Build the chat messages for the JSON schema mode: the static system prefix plus a short request"""
+    length_instruction = CAPTION_LENGTH_SPECS.get(length, CAPTION_LENGTH_SPECS["medium"])
+    return [
+        {"role": "system", "content": STRUCTURED_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Topic: {topic}\nTones: {describe_tones(tones)}\nLength: {length_instruction}"}
+    ]
+
+def caption_request_params(topic, tones, length="medium", structured=None):
+    """Messages, max_tokens and (in JSON mode) response_format for one caption request"""
+    structured = CAPTION_OUTPUT == 'json' if structured is None else structured
+    params = {'max_tokens': CAPTION_MAX_TOKENS.get(length, CAPTION_MAX_TOKENS["medium"])}
+    if structured:
+        params['messages'] = build_structured_messages(topic, tones, length)
+        params['response_format'] = {"type": "json_schema", "json_schema": CAPTION_SCHEMA}
+    else:
+        params['messages'] = build_caption_messages(topic, tones, length)
+    return params
+
+def format_structured_caption(item):
+    """One caption line from a JSON schema caption object: text, then emoji, then hashtags"""
+    # Collapse any line breaks, since captions are stored one per line
+    text = ' '.join(item['text'].split())
+    hashtags = ' '.join('#' + tag.strip().lstrip('#').replace(' ', '') for tag in item['hashtags']
+                        if tag.strip().lstrip('#'))
+    return ' '.join(part for part in (text, item['emoji'].strip(), hashtags) if part)
+
+def parse_structured_captions(content):
+    """Turn a JSON schema response into caption lines"""
+    captions = []
+    for item in json.loads(content)['captions']:
+        caption = format_structured_caption(item)
+        if caption:
+            captions.append(caption)
+    return captions
+
+def parse_caption_choices(choices, structured):
+    """Every distinct caption across the completion choices, in order"""
+    captions = []
+    for choice in choices:
+        content = (choice.message.content or "").strip()
+        if structured:
+            if getattr(choice.message, 'refusal', None):
+                raise Exception(f"Caption request refused: {choice.message.refusal}")
+            lines = parse_structured_captions(content)
         else:
-            tone_description = f"{', '.join(tones[:-1])}, and {tones[-1]} blended together"
-        
-        # Define length specifications
-        length_specs = {
-            "short": "1-2 sentences, concise and punchy",
-            "medium": "3-4 sentences, balanced detail",
-            "long": "5+ sentences, detailed and storytelling"
-        }
-        
-        length_instruction = length_specs.get(length, length_specs["medium"])
-        
-        # Create comprehensive prompt for blended tone caption generation
-        prompt = f"""Generate Instagram captions for the topic "{topic}" that seamlessly blend {tone_description} into each caption.
+            # Clean the content to remove tone headers
+            lines = clean_caption_content(content).split('\n')
+        for caption in lines:
+            if caption and caption not in captions:
+                captions.append(caption)
+    return captions
+
+def build_caption_messages(topic, tones, length="medium"):
+    """Build the chat messages asking GPT-4o for 3 captions that blend the selected tones"""
+    
+    tone_description = describe_tones(tones)
+    length_instruction = CAPTION_LENGTH_SPECS.get(length, CAPTION_LENGTH_SPECS["medium"])
+    
+    # Create comprehensive prompt for blended tone caption generation
+    prompt = f"""Generate Instagram captions for the topic "{topic}" that seamlessly blend {tone_description} into each caption.
 
 Requirements:
 - Create exactly 3 unique captions where EACH caption embodies ALL selected tones simultaneously
@@ -163,39 +360,460 @@ Format your response as exactly 3 numbered captions:
 1. [blended caption with emojis and hashtags]
 2. [blended caption with emojis and hashtags] 
 3. [blended caption with emojis and hashtags]"""
+    
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+RATE_LIMITED_MESSAGE = "OpenAI API rate limit reached. Please wait a few seconds and try again."
+UNAVAILABLE_MESSAGE = "OpenAI API is temporarily unavailable. Please try again shortly."
+
+class UpstreamError(Exception):
+    """A translated OpenAI failure that should clear by itself: an open breaker, a timeout, 5xx or a dropped connection"""
+
+def create_chat_completion(lease, api_key, **params):
+    """Call chat.completions.create through the per-key rate limiter and the circuit breaker"""
+    cost = estimate_request_tokens(params['messages'], params['max_tokens'] * params.get('n', 1))
+    # The breaker wraps each attempt, so retries are judged on upstream latency alone
+    send = lambda: circuit_breaker.call(lambda: lease.client.chat.completions.with_raw_response.create(**params))
+    return rate_limiter.call(api_key, send, cost=cost)
+
+async def async_create_chat_completion(lease, api_key, **params):
+    """Async counterpart of create_chat_completion"""
+    cost = estimate_request_tokens(params['messages'], params['max_tokens'] * params.get('n', 1))
+    send = lambda: circuit_breaker.async_call(lambda: lease.client.chat.completions.with_raw_response.create(**params))
+    return await rate_limiter.async_call(api_key, send, cost=cost)
+
+def translate_openai_error(e):
+    """Map an OpenAI SDK error to the user-facing exception the routes know how to handle"""
+    logging.error(f"OpenAI API error: {e}")
+    if isinstance(e, CircuitOpenError):
+        return UpstreamError(UNAVAILABLE_MESSAGE)
+    # Only a hard quota error is final; transient 429s were already retried within the deadline
+    elif is_hard_quota_error(e):
+        return Exception("OpenAI API quota exceeded. Please check your usage limits and try again later.")
+    elif isinstance(e, RateLimitTimeout) or getattr(e, 'status_code', None) == 429:
+        return Exception(RATE_LIMITED_MESSAGE)
+    elif is_upstream_failure(e):
+        return UpstreamError(f"OpenAI API error: {str(e)}")
+    elif "authentication" in str(e).lower():
+        return Exception("OpenAI API authentication failed. Please check your API key.")
+    else:
+        return Exception(f"OpenAI API error: {str(e)}")
+
+def lease_openai_client(api_key, pool=None):
+    """Lease the pooled OpenAI client for this key so its connections are reused"""
+    pool = pool or client_pool
+    if not api_key:
+        # If no API key provided, require user to provide one
+        raise Exception("API key required. Please provide your OpenAI API key to generate captions.")
+    
+    try:
+        return pool.lease(api_key)
+    except Exception as e:
+        if "not available" in str(e):
+            raise
+        raise Exception(f"Failed to initialize OpenAI client: {str(e)}")
+
+def generate_instagram_captions(topic, tone, length="medium", api_key=None):
+    """Generate Instagram captions using OpenAI GPT-4o API that blend multiple tones"""
+    return '\n'.join(generate_caption_candidates(topic, tone, length, api_key=api_key))
+
+def generate_caption_candidates(topic, tone, length="medium", api_key=None, n=1):
+    """Ask GPT-4o for n completions of blended captions in one call and return every distinct caption"""
+    
+    # Handle multiple tones
+    tones = [t.strip() for t in tone.split(',') if t.strip()]
+    
+    lease = lease_openai_client(api_key)
+    
+    try:
+        with pipeline_metrics.stage('prompt', length, tones):
+            params = caption_request_params(topic, tones, length)
+            # n is only sent when asking for extra candidates
+            if n > 1:
+                params['n'] = n
         
         # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
         # do not change this unless explicitly requested by the user
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are an expert social media content creator specializing in Instagram captions. You create engaging, authentic captions that drive engagement and match specific tones perfectly."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=800,
-            temperature=0.8
-        )
-        
-        content = response.choices[0].message.content
-        if content:
-            content = content.strip()
-        else:
-            content = ""
+        with pipeline_metrics.stage('upstream', length, tones):
+            response = create_chat_completion(
+                lease, api_key,
+                model="gpt-4o",
+                temperature=0.8,
+                **params
+            )
+        pipeline_metrics.record_usage(response.usage, length, tones)
+        
+        with pipeline_metrics.stage('clean', length, tones):
+            captions = parse_caption_choices(response.choices, 'response_format' in params)
+        
+        pipeline_metrics.record_generation(length, tones, False, 'ok')
+        return captions
+        
+    except Exception as e:
+        pipeline_metrics.record_generation(length, tones, False, 'error')
+        raise translate_openai_error(e)
+    finally:
+        client_pool.release(lease)
+
+def stream_instagram_captions(topic, tone, length="medium", api_key=None, n=1, on_extra=None):
+    """Stream captions from GPT-4o, yielding each one as soon as its line is complete.
+    
+    With n > 1 only the first completion is streamed; the captions of the others
+    are passed to on_extra(captions) once the stream ends.
+    """
+    
+    tones = [t.strip() for t in tone.split(',') if t.strip()]
+    lease = lease_openai_client(api_key)
+    
+    try:
+        with pipeline_metrics.stage('prompt', length, tones):
+            params = caption_request_params(topic, tones, length)
+            if n > 1:
+                params['n'] = n
+        # JSON responses emit a caption as each object closes, free text as each line ends
+        parser = IncrementalStructuredCaptionParser if 'response_format' in params else IncrementalCaptionCleaner
+        cleaner = parser()
+        # Completions other than the first interleave with it in the stream; each gets its own parser
+        extra_cleaners = {}
         
-        # Clean the content to remove tone headers
-        cleaned_captions = clean_caption_content(content)
+        with pipeline_metrics.stage('upstream', length, tones):
+            stream = create_chat_completion(
+                lease, api_key,
+                model="gpt-4o",
+                temperature=0.8,
+                stream=True,
+                stream_options={"include_usage": True},
+                **params
+            )
+        with pipeline_metrics.stage('stream', length, tones):
+            for chunk in stream:
+                # The final chunk carries usage and no choices
+                if chunk.usage is not None:
+                    pipeline_metrics.record_usage(chunk.usage, length, tones)
+                for choice in chunk.choices:
+                    if choice.index == 0 and getattr(choice.delta, 'refusal', None):
+                        raise Exception(f"Caption request refused: {choice.delta.refusal}")
+                    delta = choice.delta.content
+                    if not delta:
+                        continue
+                    if choice.index == 0:
+                        yield from cleaner.feed(delta)
+                    else:
+                        extra_cleaners.setdefault(choice.index, parser()).feed(delta)
+            yield from cleaner.finish()
+        pipeline_metrics.record_generation(length, tones, False, 'ok')
         
-        return cleaned_captions
+        if on_extra is not None and extra_cleaners:
+            extra = []
+            for index in sorted(extra_cleaners):
+                extra_cleaners[index].finish()
+                extra.extend(extra_cleaners[index].captions)
+            on_extra(extra)
         
     except Exception as e:
-        logging.error(f"OpenAI API error: {e}")
-        # Check for quota exceeded or other specific errors
-        if "quota" in str(e).lower() or "rate" in str(e).lower():
-            raise Exception("OpenAI API quota exceeded. Please check your usage limits and try again later.")
-        elif "authentication" in str(e).lower():
-            raise Exception("OpenAI API authentication failed. Please check your API key.")
+        pipeline_metrics.record_generation(length, tones, False, 'error')
+        raise translate_openai_error(e)
+    finally:
+        client_pool.release(lease)
+
+async def async_generate_instagram_captions(topic, tone, length="medium", api_key=None):
+    """Async counterpart of generate_instagram_captions using a pooled AsyncOpenAI client"""
+    
+    tones = [t.strip() for t in tone.split(',') if t.strip()]
+    lease = lease_openai_client(api_key, pool=async_client_pool)
+    
+    try:
+        with pipeline_metrics.stage('prompt', length, tones):
+            params = caption_request_params(topic, tones, length)
+        
+        with pipeline_metrics.stage('upstream', length, tones):
+            response = await async_create_chat_completion(
+                lease, api_key,
+                model="gpt-4o",
+                temperature=0.8,
+                **params
+            )
+        pipeline_metrics.record_usage(response.usage, length, tones)
+        
+        with pipeline_metrics.stage('clean', length, tones):
+            captions = '\n'.join(parse_caption_choices(response.choices, 'response_format' in params))
+        pipeline_metrics.record_generation(length, tones, False, 'ok')
+        return captions
+        
+    except Exception as e:
+        pipeline_metrics.record_generation(length, tones, False, 'error')
+        raise translate_openai_error(e)
+    finally:
+        async_client_pool.release(lease)
+
+def candidate_pool_id():
+    """This browser session's candidate pool ID, or None when the pool is off"""
+    if CANDIDATE_POOL_N <= 1:
+        return None
+    if 'pool_id' not in session:
+        session['pool_id'] = uuid.uuid4().hex
+    return session['pool_id']
+
+def refill_candidates(pool_id, key, topic, tone, length, api_key):
+    """Top up a session's candidate pool in the background once it runs low"""
+    candidate_pool.refill(pool_id, key, lambda: generate_caption_candidates(
+        topic, tone, length, api_key=api_key, n=CANDIDATE_POOL_N))
+
+def take_or_generate_candidates(pool_id, key, topic, tone, length="medium", api_key=None):
+    """Serve the next unseen captions from the session's candidate pool, generating n sets on a miss"""
+    captions = candidate_pool.take(pool_id, key, CAPTIONS_PER_SET)
+    if captions is None:
+        candidates = generate_caption_candidates(topic, tone, length, api_key=api_key, n=CANDIDATE_POOL_N)
+        captions = candidates[:CAPTIONS_PER_SET]
+        candidate_pool.add(pool_id, key, candidates[CAPTIONS_PER_SET:])
+        # Shared cache still gets the shown set, for fallbacks and other sessions
+        caption_cache.set(key, '\n'.join(captions))
+    refill_candidates(pool_id, key, topic, tone, length, api_key)
+    return '\n'.join(captions)
+
+def get_or_generate_captions(topic, tone, length="medium", api_key=None, fresh=False, pool_id=None):
+    """Serve repeat requests from the caption cache, generating and storing on a miss.
+    
+    With a pool_id, each call serves the session's next unseen captions instead of the cached set.
+    """
+    key = normalize_cache_key(topic, tone, length)
+    
+    if pool_id:
+        return take_or_generate_candidates(pool_id, key, topic, tone, length, api_key=api_key)
+    
+    # "Fresh captions" skips the lookup but still refreshes the cached entry
+    if fresh:
+        caption_cache.record_bypass()
+    else:
+        cached = caption_cache.get(key)
+        if cached is not None:
+            logging.debug(f"Caption cache hit for {key}")
+            return cached
+    
+    def produce():
+        captions = generate_instagram_captions(topic, tone, length, api_key=api_key)
+        caption_cache.set(key, captions)
+        return captions
+    
+    # Coalesce with an identical in-flight generation; after waiting on another
+    # worker, re-check the shared cache (unless the user asked for fresh captions)
+    return single_flight.do(key, hash_api_key(api_key or ''), produce,
+                            recheck=None if fresh else lambda: caption_cache.get(key))
+
+async def async_get_or_generate_captions(topic, tone, length="medium", api_key=None, fresh=False):
+    """Async counterpart of get_or_generate_captions, sharing the same caption cache"""
+    key = normalize_cache_key(topic, tone, length)
+    
+    if fresh:
+        caption_cache.record_bypass()
+    else:
+        cached = caption_cache.get(key)
+        if cached is not None:
+            return cached
+    
+    async def produce():
+        captions = await async_generate_instagram_captions(topic, tone, length, api_key=api_key)
+        caption_cache.set(key, captions)
+        return captions
+    
+    # Coalesce with an identical in-flight generation in this event loop
+    return await single_flight.async_do(key, hash_api_key(api_key or ''), produce)
+
+def degraded_captions(topic, tone, length, reason):
+    """Captions to show when live generation can't finish: cached ones if we have any, else demo ones"""
+    stale = caption_cache.get_stale(normalize_cache_key(topic, tone, length))
+    source = 'cache' if stale is not None else 'mock'
+    pipeline_metrics.record_generation(length, tone, source == 'mock', f"fallback_{reason}")
+    captions = stale if stale is not None else mock_generate_instagram_captions(topic, tone, length)
+    return captions, {'reason': reason, 'source': source}
+
+def degrade_reason(error):
+    """Why a failed generation may be served degraded, or None if the error has to surface.
+    
+    Only transient upstream failures degrade; key problems, bad responses and bugs are raised.
+    """
+    if not isinstance(error, UpstreamError):
+        return None
+    return 'circuit_open' if classify_generation_error(str(error)) == 'unavailable' else 'upstream_error'
+
+def submit_generation(fn, *args):
+    """Run fn(*args) on the generation pool, or return None if its queue is already full"""
+    if not generation_slots.acquire(blocking=False):
+        return None
+    try:
+        future = generation_executor.submit(copy_context().run, fn, *args)
+    except Exception:
+        generation_slots.release()
+        raise
+    # Also called when a queued call is cancelled
+    future.add_done_callback(lambda _: generation_slots.release())
+    return future
+
+def generate_within_budget(topic, tone, length="medium", api_key=None, fresh=False, pool_id=None):
+    """Run get_or_generate_captions within GENERATION_BUDGET, degrading instead of failing.
+    
+    Returns (captions, degraded) where degraded is None for live or cached results, or
+    {'reason', 'source'} when the captions came from the stale cache or the mock engine.
+    """
+    if GENERATION_BUDGET <= 0:
+        return get_or_generate_captions(topic, tone, length, api_key=api_key, fresh=fresh, pool_id=pool_id), None
+    
+    future = submit_generation(get_or_generate_captions, topic, tone, length, api_key, fresh, pool_id)
+    if future is None:
+        logging.warning("Generation queue is full; serving a fallback")
+        return degraded_captions(topic, tone, length, 'overloaded')
+    try:
+        return future.result(timeout=GENERATION_BUDGET), None
+    except FutureTimeout:
+        # A call still waiting for a thread is dropped; one already running finishes and fills the cache
+        future.cancel()
+        logging.warning(f"Generation exceeded the {GENERATION_BUDGET:.1f}s budget; serving a fallback")
+        return degraded_captions(topic, tone, length, 'timeout')
+    except Exception as e:
+        reason = degrade_reason(e)
+        if reason is None:
+            raise
+        return degraded_captions(topic, tone, length, reason)
+
+class GenerationQueueFull(Exception):
+    """The generation pool already has GENERATION_QUEUE_SIZE calls waiting"""
+
+def stream_within_budget(source):
+    """Iterate a caption stream, raising FutureTimeout if no caption arrives within GENERATION_BUDGET.
+    
+    The stream runs on the generation pool and hands captions over through a queue,
+    so after a timeout a stream that has started keeps going and still fills the cache
+    for the next request. Raises GenerationQueueFull if the pool can't take it.
+    """
+    if GENERATION_BUDGET <= 0:
+        yield from source
+        return
+    
+    items = queue.Queue()
+    
+    def run():
+        try:
+            for item in source:
+                items.put((True, item))
+        except Exception as e:
+            items.put((False, e))
         else:
-            raise Exception(f"OpenAI API error: {str(e)}")
+            items.put((False, None))
+    
+    future = submit_generation(run)
+    if future is None:
+        raise GenerationQueueFull("Generation queue is full")
+    deadline = time.monotonic() + GENERATION_BUDGET
+    first = True
+    while True:
+        try:
+            # Only the first caption is bounded; once captions flow the stream finishes normally
+            ok, value = items.get(timeout=max(deadline - time.monotonic(), 0) if first else None)
+        except queue.Empty:
+            # Never started: drop it rather than open the stream for nobody
+            future.cancel()
+            raise FutureTimeout()
+        if not ok:
+            if value is not None:
+                raise value
+            return
+        first = False
+        yield value
+
+async def async_generate_within_budget(topic, tone, length="medium", api_key=None, fresh=False):
+    """Async counterpart of generate_within_budget"""
+    # Imported here so sync workers don't load asyncio at startup
+    import asyncio
+    
+    if GENERATION_BUDGET <= 0:
+        return await async_get_or_generate_captions(topic, tone, length, api_key=api_key, fresh=fresh), None
+    
+    task = asyncio.ensure_future(async_get_or_generate_captions(topic, tone, length, api_key=api_key, fresh=fresh))
+    try:
+        # shield() lets the generation finish (and fill the cache) after we stop waiting
+        return await asyncio.wait_for(asyncio.shield(task), GENERATION_BUDGET), None
+    except asyncio.TimeoutError:
+        logging.warning(f"Generation exceeded the {GENERATION_BUDGET:.1f}s budget; serving a fallback")
+        return degraded_captions(topic, tone, length, 'timeout')
+    except Exception as e:
+        reason = degrade_reason(e)
+        if reason is None:
+            raise
+        return degraded_captions(topic, tone, length, reason)
+
+def flash_degraded(degraded):
+    """Tell the user that these captions are a fallback rather than a fresh generation"""
+    if degraded['source'] == 'cache':
+        flash('OpenAI is slow or unavailable right now, so these are recently generated captions '
+              'for the same request.', 'warning')
+    else:
+        flash('OpenAI is slow or unavailable right now, so these are demo captions. '
+              'Try again shortly for AI-generated ones.', 'warning')
+
+def run_caption_job(job):
+    """Job queue handler: generate captions for one queued job, retrying transient failures"""
+    if job['use_mock']:
+        return mock_generate_instagram_captions(job['topic'], job['tone'], job['length'])
+    try:
+        return get_or_generate_captions(job['topic'], job['tone'], job['length'],
+                                        api_key=job['api_key'], fresh=bool(job['fresh']))
+    except Exception as e:
+        kind = classify_generation_error(str(e))
+        if kind in ('rate_limited', 'unavailable', 'error'):
+            raise RetryJob(str(e), kind)
+        raise JobFailed(str(e), kind)
+
+# "stream" renders captions over /stream; "job" submits to /jobs and polls for the result
+GENERATION_MODE = os.environ.get("GENERATION_MODE", "stream")
+app.jinja_env.globals['job_mode'] = GENERATION_MODE == 'job'
+
+# Background caption jobs persisted in SQLite (JOB_QUEUE_DB), run by JOB_WORKERS threads per process.
+# Only job mode has a queue, so stream deployments never create its database or polling threads
+job_queue = create_job_queue_from_env(run_caption_job) if GENERATION_MODE == 'job' else None
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+# A held poll pins a sync worker, so polls return at once unless a deployment opts in
+JOB_POLL_MAX_WAIT = float(os.environ.get("JOB_POLL_MAX_WAIT", "0"))
+# Priorities above the default need this token in X-Job-Priority-Token; without it they are capped
+JOB_PRIORITY_TOKEN = os.environ.get("JOB_PRIORITY_TOKEN", "")
+
+def start_job_workers():
+    """Start this process's job queue threads"""
+    if job_queue is not None and JOB_WORKERS > 0:
+        job_queue.start(JOB_WORKERS)
+
+# Threads don't survive fork, so a preloading gunicorn master leaves this to post_fork (gunicorn.conf.py)
+if os.environ.get("PRELOAD_APP") != "1":
+    start_job_workers()
+
+def read_job_priority(value, use_mock):
+    """Validate a submitted job priority, or return None if it isn't a whole number from 0 to 9.
+    
+    Only callers with JOB_PRIORITY_TOKEN may jump ahead of the default; other
+    submissions, and demo jobs always, are capped at DEFAULT_PRIORITY.
+    """
+    if value is None or value == '':
+        return DEFAULT_PRIORITY
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        return None
+    try:
+        priority = int(value)
+    except ValueError:
+        return None
+    if not MIN_PRIORITY <= priority <= MAX_PRIORITY:
+        return None
+    token = request.headers.get('X-Job-Priority-Token', '')
+    trusted = bool(JOB_PRIORITY_TOKEN) and hmac.compare_digest(token, JOB_PRIORITY_TOKEN)
+    if use_mock or not trusted:
+        priority = min(priority, DEFAULT_PRIORITY)
+    return priority
+
+def jobs_disabled():
+    """404 for the job routes when GENERATION_MODE isn't job"""
+    return jsonify({'error': 'The job queue is off; set GENERATION_MODE=job to use it.',
+                    'error_kind': 'jobs_disabled'}), 404
 
 @app.route('/setup-api-key', methods=['POST'])
 def setup_api_key():
@@ -216,17 +834,23 @@ def setup_api_key():
     
     # Save the API key to session
     session['api_key'] = api_key
+    client_pool.warm(api_key)
     flash('API key saved for this session!', 'success')
     
     # If topic and tone are provided, generate captions immediately
     if topic and tone:
         try:
-            captions = generate_instagram_captions(topic, tone, api_key=api_key)
-            flash('API key saved and captions generated successfully!', 'success')
+            captions, degraded = generate_within_budget(topic, tone, api_key=api_key)
+            if degraded:
+                flash_degraded(degraded)
+            else:
+                flash('API key saved and captions generated successfully!', 'success')
             return render_template('index.html', 
                                  captions=captions, 
                                  topic=topic, 
                                  tone=tone,
+                                 is_mock=bool(degraded) and degraded['source'] == 'mock',
+                                 degraded=degraded,
                                  has_session_key=True)
         except Exception as e:
             logging.error(f"Failed to generate captions: {e}")
@@ -235,11 +859,14 @@ def setup_api_key():
             if "authentication" in error_message.lower() or "invalid" in error_message.lower():
                 flash('Invalid API key. Please check your OpenAI API key and try again.', 'error')
                 session.pop('api_key', None)  # Remove invalid key
+                client_pool.discard(api_key)
                 return render_template('index.html', 
                                      api_key_required=True,
                                      topic=topic,
                                      tone=tone,
                                      has_session_key=False)
+            elif "rate limit reached" in error_message.lower():
+                flash('API key saved, but OpenAI is busy right now. Please wait a few seconds and try again.', 'error')
             elif "quota" in error_message.lower():
                 flash('The provided API key has exceeded its quota. Please try a different key or use demo mode.', 'error')
                 return render_template('index.html', 
@@ -270,16 +897,22 @@ def update_api_key():
     
     # Save the new API key to session first
     session['api_key'] = new_api_key
+    client_pool.warm(new_api_key)
     
     # Try to generate captions with the new key
     try:
-        captions = generate_instagram_captions(topic, tone, api_key=new_api_key)
-        flash('API key saved and captions generated successfully!', 'success')
+        captions, degraded = generate_within_budget(topic, tone, api_key=new_api_key)
+        if degraded:
+            flash_degraded(degraded)
+        else:
+            flash('API key saved and captions generated successfully!', 'success')
         
         return render_template('index.html', 
                              captions=captions, 
                              topic=topic, 
                              tone=tone,
+                             is_mock=bool(degraded) and degraded['source'] == 'mock',
+                             degraded=degraded,
                              has_session_key=True)
         
     except Exception as e:
@@ -289,6 +922,9 @@ def update_api_key():
         # Check for specific error types
         if "authentication" in error_message.lower() or "invalid" in error_message.lower():
             flash('Invalid API key. Please check your OpenAI API key and try again.', 'error')
+            client_pool.discard(new_api_key)
+        elif "rate limit reached" in error_message.lower():
+            flash('OpenAI is busy right now. Please wait a few seconds and try again.', 'error')
         elif "quota" in error_message.lower():
             flash('The provided API key has exceeded its quota. Please try a different key or use demo mode.', 'error')
         else:
@@ -309,7 +945,9 @@ def index():
         tone = request.form.get('tone', '').strip()
         length = request.form.get('length', 'medium').strip()
         use_mock = request.form.get('use_mock', '').strip() == 'true'
+        fresh = request.form.get('fresh_captions', '').strip() == 'true'
         trigger_api_setup = request.form.get('trigger_api_setup', '').strip() == 'true'
+        trigger_quota_modal = request.form.get('trigger_quota_modal', '').strip() == 'true'
         
         # Handle API key setup trigger
         if trigger_api_setup:
@@ -319,6 +957,13 @@ def index():
                                  tone=tone,
                                  has_session_key=False)
         
+        # Quota error reported by /stream: show the modal without generating again
+        if trigger_quota_modal:
+            return render_template('index.html', 
+                                 quota_exceeded=True,
+                                 topic=topic,
+                                 tone=tone)
+        
         # Validate inputs
         if not topic:
             flash('Please enter a topic for your Instagram caption.', 'error')
@@ -362,15 +1007,21 @@ def index():
             session.permanent = True
         
         try:
-            # Generate captions with session API key
-            captions = generate_instagram_captions(topic, tone, length, api_key=api_key)
-            flash('Captions generated successfully!', 'success')
+            # Generate captions with session API key, within the latency budget
+            captions, degraded = generate_within_budget(topic, tone, length, api_key=api_key, fresh=fresh,
+                                                        pool_id=candidate_pool_id())
+            if degraded:
+                flash_degraded(degraded)
+            else:
+                flash('Captions generated successfully!', 'success')
             
             return render_template('index.html', 
                                  captions=captions, 
                                  topic=topic, 
                                  tone=tone,
                                  length=length,
+                                 is_mock=bool(degraded) and degraded['source'] == 'mock',
+                                 degraded=degraded,
                                  has_session_key=bool(session.get('api_key')))
             
         except Exception as e:
@@ -378,7 +1029,15 @@ def index():
             error_message = str(e)
             
             # Check for specific error types
-            if "quota exceeded" in error_message.lower() or "rate" in error_message.lower():
+            if "rate limit reached" in error_message.lower():
+                # Transient: the key still works, so keep the form rather than showing the quota modal
+                flash('OpenAI is busy right now. Please wait a few seconds and try again.', 'error')
+                return render_template('index.html', 
+                                     topic=topic,
+                                     tone=tone,
+                                     length=length,
+                                     has_session_key=bool(session.get('api_key')))
+            elif "quota exceeded" in error_message.lower():
                 return render_template('index.html', 
                                      quota_exceeded=True,
                                      topic=topic,
@@ -392,6 +1051,7 @@ def index():
                                      tone=tone)
             elif "authentication" in error_message.lower() or "invalid" in error_message.lower():
                 flash('Invalid API key. Please check your OpenAI API key and try again.', 'error')
+                client_pool.discard(api_key)
                 return render_template('index.html', 
                                      api_key_required=True,
                                      topic=topic,
@@ -409,9 +1069,412 @@ def index():
 @app.route('/clear-session', methods=['POST'])
 def clear_session():
     """Clear the stored API key from session"""
-    session.pop('api_key', None)
+    api_key = session.pop('api_key', None)
+    if api_key:
+        client_pool.discard(api_key)
+    # Drop captions pooled for this session, so no more refills run on the cleared key
+    pool_id = session.pop('pool_id', None)
+    if pool_id:
+        candidate_pool.discard_session(pool_id)
     flash('Session API key cleared successfully.', 'success')
     return redirect(url_for('index'))
 
+def classify_generation_error(error_message):
+    """Classify a generation error the same way the index route does (for JSON/SSE clients)"""
+    # Missing key is checked first since "generate" contains "rate"
+    if "API key required" in error_message:
+        return 'api_key_required'
+    elif "rate limit reached" in error_message.lower():
+        return 'rate_limited'
+    elif "temporarily unavailable" in error_message.lower():
+        return 'unavailable'
+    elif "quota exceeded" in error_message.lower():
+        return 'quota'
+    elif "authentication" in error_message.lower() or "invalid" in error_message.lower():
+        return 'auth'
+    return 'error'
+
+# HTTP status returned by the JSON APIs for each generation error kind
+GENERATION_ERROR_STATUS = {
+    'invalid': 400,
+    'api_key_required': 401,
+    'auth': 401,
+    'quota': 429,
+    'rate_limited': 429,
+    'unavailable': 503,
+    'error': 502,
+}
+
+def read_generate_payload(data):
+    """Pull topic, tone, length and flags out of a JSON generation request body"""
+    data = data if isinstance(data, dict) else {}
+    return {
+        'topic': str(data.get('topic') or '').strip(),
+        'tone': str(data.get('tone') or '').strip(),
+        'length': str(data.get('length') or 'medium').strip(),
+        'use_mock': bool(data.get('use_mock')),
+        'fresh': bool(data.get('fresh')),
+        'api_key': str(data.get('api_key') or '').strip(),
+    }
+
+def sse_event(event, data):
+    """Format a single Server-Sent Events message with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/stream', methods=['POST'])
+def stream_captions():
+    """Stream captions as Server-Sent Events so the first one shows up before GPT-4o finishes"""
+    
+    # Get form data (same fields as the main form)
+    topic = request.form.get('topic', '').strip()
+    tone = request.form.get('tone', '').strip()
+    length = request.form.get('length', 'medium').strip()
+    use_mock = request.form.get('use_mock', '').strip() == 'true'
+    fresh = request.form.get('fresh_captions', '').strip() == 'true'
+    
+    if not topic or not tone:
+        return jsonify({'error': 'Please enter a topic and select a tone.'}), 400
+    
+    # Get API key from form or session, saving it if requested (before the response starts)
+    api_key = request.form.get('api_key', '').strip() or session.get('api_key', '')
+    if request.form.get('save_for_session') == 'true' and api_key:
+        session['api_key'] = api_key
+        session.permanent = True
+    
+    # Resolved before streaming starts, while the session cookie can still be set
+    pool_id = candidate_pool_id()
+    
+    def events():
+        if use_mock:
+            captions = mock_generate_instagram_captions(topic, tone, length)
+            for index, caption in enumerate(captions.split('\n')):
+                yield sse_event('caption', {'index': index, 'caption': caption})
+            yield sse_event('done', {'count': index + 1, 'is_mock': True})
+            return
+        
+        key = normalize_cache_key(topic, tone, length)
+        pooled = candidate_pool.take(pool_id, key, CAPTIONS_PER_SET) if pool_id else None
+        if pooled is not None:
+            for index, caption in enumerate(pooled):
+                yield sse_event('caption', {'index': index, 'caption': caption})
+            yield sse_event('done', {'count': len(pooled), 'pooled': True})
+            refill_candidates(pool_id, key, topic, tone, length, api_key)
+            return
+        
+        if fresh or pool_id:
+            # With the pool on, every click should show captions this session hasn't seen
+            # (only an explicit "fresh" request counts as a cache bypass)
+            if fresh:
+                caption_cache.record_bypass()
+            cached = None
+        else:
+            cached = caption_cache.get(key)
+        if cached is not None:
+            captions = cached.split('\n')
+            for index, caption in enumerate(captions):
+                yield sse_event('caption', {'index': index, 'caption': caption})
+            yield sse_event('done', {'count': len(captions), 'cached': True})
+            return
+        
+        def produce():
+            captions = []
+            on_extra = (lambda extra: candidate_pool.add(pool_id, key, extra)) if pool_id else None
+            for caption in stream_instagram_captions(topic, tone, length, api_key=api_key,
+                                                     n=CANDIDATE_POOL_N if pool_id else 1, on_extra=on_extra):
+                captions.append(caption)
+                yield caption
+            caption_cache.set(key, '\n'.join(captions))
+        
+        def recheck():
+            cached = caption_cache.get(key)
+            return cached.split('\n') if cached is not None else None
+        
+        if pool_id:
+            # Pooled streams hold this session's extra candidates, so they aren't shared
+            source = produce()
+        else:
+            # Identical streams share one upstream call; followers replay the leader's captions as they arrive
+            source = single_flight.stream('stream:' + key, hash_api_key(api_key or ''), produce,
+                                          recheck=None if fresh else recheck)
+        
+        def degraded_events(reason):
+            captions, degraded = degraded_captions(topic, tone, length, reason)
+            captions = captions.split('\n')
+            yield sse_event('degraded', degraded)
+            for index, caption in enumerate(captions):
+                yield sse_event('caption', {'index': index, 'caption': caption})
+            yield sse_event('done', {'count': len(captions), 'is_mock': degraded['source'] == 'mock',
+                                     'degraded': degraded})
+        
+        count = 0
+        try:
+            for caption in stream_within_budget(source):
+                yield sse_event('caption', {'index': count, 'caption': caption})
+                count += 1
+        except FutureTimeout:
+            logging.warning(f"No streamed caption within the {GENERATION_BUDGET:.1f}s budget; serving a fallback")
+            yield from degraded_events('timeout')
+            return
+        except GenerationQueueFull:
+            logging.warning("Generation queue is full; serving a fallback")
+            yield from degraded_events('overloaded')
+            return
+        except Exception as e:
+            logging.error(f"Error streaming captions: {e}")
+            error_message = str(e)
+            
+            # Same fallbacks as generate_within_budget, as long as nothing has been shown yet
+            reason = degrade_reason(e) if count == 0 else None
+            if reason is not None:
+                yield from degraded_events(reason)
+                return
+            
+            kind = classify_generation_error(error_message)
+            if kind == 'auth':
+                client_pool.discard(api_key)
+            yield sse_event('error', {'kind': kind, 'message': error_message})
+            return
+        
+        yield sse_event('done', {'count': count})
+        if pool_id:
+            refill_candidates(pool_id, key, topic, tone, length, api_key)
+    
+    return Response(stream_with_context(events()),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def generate_response(captions, degraded):
+    """JSON body for a generation, labelling fallback captions with why and where they came from"""
+    body = {'captions': captions.split('\n'), 'is_mock': bool(degraded) and degraded['source'] == 'mock'}
+    if degraded:
+        body['degraded'] = degraded
+    return body
+
+@app.route('/api/generate', methods=['POST'])
+def api_generate():
+    """Generate captions for one topic as JSON (asgi.py serves this route natively async)"""
+    payload = read_generate_payload(request.get_json(silent=True))
+    
+    if not payload['topic'] or not payload['tone']:
+        return jsonify({'error': 'Please provide a topic and a tone.', 'error_kind': 'invalid'}), 400
+    
+    if payload['use_mock']:
+        captions = mock_generate_instagram_captions(payload['topic'], payload['tone'], payload['length'])
+        return jsonify({'captions': captions.split('\n'), 'is_mock': True})
+    
+    api_key = payload['api_key'] or session.get('api_key', '')
+    try:
+        captions, degraded = generate_within_budget(payload['topic'], payload['tone'], payload['length'],
+                                                    api_key=api_key, fresh=payload['fresh'],
+                                                    pool_id=candidate_pool_id())
+    except Exception as e:
+        kind = classify_generation_error(str(e))
+        return jsonify({'error': str(e), 'error_kind': kind}), GENERATION_ERROR_STATUS[kind]
+    
+    return jsonify(generate_response(captions, degraded))
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Queue a caption generation and return its job ID straight away (JSON body or the page form)"""
+    if job_queue is None:
+        return jobs_disabled()
+    if request.is_json:
+        data = request.get_json(silent=True) or {}
+        payload = read_generate_payload(data)
+    else:
+        data = request.form
+        payload = read_generate_payload({
+            'topic': data.get('topic'),
+            'tone': data.get('tone'),
+            'length': data.get('length'),
+            'use_mock': data.get('use_mock') == 'true',
+            'fresh': data.get('fresh_captions') == 'true',
+            'api_key': data.get('api_key'),
+        })
+    
+    if not payload['topic'] or not payload['tone']:
+        return jsonify({'error': 'Please provide a topic and a tone.', 'error_kind': 'invalid'}), 400
+    priority = read_job_priority(data.get('priority'), payload['use_mock'])
+    if priority is None:
+        return jsonify({'error': 'Priority must be a whole number from 0 to 9.', 'error_kind': 'invalid'}), 400
+    
+    api_key = payload['api_key'] or session.get('api_key', '')
+    if not payload['use_mock'] and not api_key:
+        return jsonify({'error': 'Please provide your OpenAI API key to generate captions.',
+                        'error_kind': 'api_key_required'}), 401
+    if data.get('save_for_session') == 'true' and payload['api_key']:
+        session['api_key'] = payload['api_key']
+        session.permanent = True
+    
+    try:
+        job_id = job_queue.submit(payload['topic'], payload['tone'], payload['length'],
+                                  api_key=None if payload['use_mock'] else api_key,
+                                  fresh=payload['fresh'], use_mock=payload['use_mock'], priority=priority)
+    except QueueFull as e:
+        return jsonify({'error': 'Too many captions are being generated right now. Please try again shortly.',
+                        'error_kind': 'queue_full', 'detail': str(e)}), 503, {'Retry-After': '5'}
+    
+    poll_url = url_for('job_status', job_id=job_id)
+    return jsonify({'job_id': job_id, 'status': 'queued', 'poll_url': poll_url}), 202, {'Location': poll_url}
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Report a caption job; ?wait=N long-polls up to N seconds (capped by JOB_POLL_MAX_WAIT) for it to finish"""
+    if job_queue is None:
+        return jobs_disabled()
+    try:
+        wait = min(max(float(request.args.get('wait', 0)), 0), JOB_POLL_MAX_WAIT)
+    except ValueError:
+        wait = 0
+    job = job_queue.wait(job_id, wait) if wait else job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job.', 'error_kind': 'not_found'}), 404
+    
+    body = {'job_id': job['id'], 'status': job['status'], 'position': job['position'],
+            'attempts': job['attempts']}
+    if job['status'] == 'done':
+        body['captions'] = job['result'].split('\n')
+        body['is_mock'] = bool(job['use_mock'])
+    elif job['status'] == 'failed':
+        body['error'] = job['error']
+        body['error_kind'] = job['error_kind']
+    return jsonify(body), 200, {'Cache-Control': 'no-store'}
+
+@app.route('/api/batch', methods=['POST'])
+def batch_captions():
+    """Generate captions for a list of {topic, tone, length} items, streamed back as NDJSON"""
+    
+    data = request.get_json(silent=True) or {}
+    items = data.get('items')
+    use_mock = bool(data.get('use_mock'))
+    fresh = bool(data.get('fresh'))
+    
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'Request body must include a non-empty "items" list.'}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({'error': f'Batches are limited to {BATCH_MAX_ITEMS} items.'}), 400
+    
+    # Get API key from the request body or session
+    api_key = (data.get('api_key') or '').strip() or session.get('api_key', '')
+    if not use_mock and not api_key:
+        return jsonify({'error': 'Please provide your OpenAI API key to generate captions.',
+                        'error_kind': 'api_key_required'}), 401
+    
+    def handle(index, item):
+        item = item if isinstance(item, dict) else {}
+        topic = str(item.get('topic') or '').strip()
+        tone = str(item.get('tone') or '').strip()
+        length = str(item.get('length') or 'medium').strip()
+        result = {'index': index, 'topic': topic, 'tone': tone, 'length': length}
+        
+        if not topic or not tone:
+            result.update(status='error', error_kind='invalid', error='Each item needs a topic and a tone.')
+            return result
+        
+        try:
+            if use_mock:
+                captions = mock_generate_instagram_captions(topic, tone, length)
+            else:
+                captions = get_or_generate_captions(topic, tone, length, api_key=api_key, fresh=fresh)
+        except Exception as e:
+            # Report failures per item instead of failing the whole batch
+            result.update(status='error', error_kind=classify_generation_error(str(e)), error=str(e))
+            return result
+        
+        result.update(status='ok', captions=captions.split('\n'), is_mock=use_mock)
+        return result
+    
+    def lines():
+        succeeded = 0
+        for result in batch_runner.run(items, handle, api_key=None if use_mock else api_key):
+            if result['status'] == 'ok':
+                succeeded += 1
+            yield json.dumps(result) + '\n'
+        yield json.dumps({'summary': {'total': len(items), 'succeeded': succeeded,
+                                      'failed': len(items) - succeeded}}) + '\n'
+    
+    return Response(lines(), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/cache-stats', methods=['GET'])
+def cache_stats():
+    """Report caption cache and request coalescing counters for this worker"""
+    stats = caption_cache.snapshot()
+    stats['single_flight'] = single_flight.snapshot()
+    return jsonify(stats)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text-format metrics for this worker's caption pipeline"""
+    return Response(pipeline_metrics.render(), mimetype='text/plain; version=0.0.4')
+
+pipeline_metrics.add_collector('caption_cache', caption_cache.snapshot)
+pipeline_metrics.add_collector('caption_single_flight', single_flight.snapshot)
+pipeline_metrics.add_collector('openai_client_pool', client_pool.snapshot)
+pipeline_metrics.add_collector('openai_rate_limit', rate_limiter.snapshot)
+pipeline_metrics.add_collector('openai_circuit', circuit_breaker.snapshot)
+pipeline_metrics.add_collector('caption_candidate_pool', candidate_pool.snapshot)
+if job_queue is not None:
+    pipeline_metrics.add_collector('caption_jobs', job_queue.snapshot)
+
+@app.route('/job-stats', methods=['GET'])
+def job_stats():
+    """Report caption job queue depth by status and worker counters for this process"""
+    if job_queue is None:
+        return jobs_disabled()
+    return jsonify(job_queue.snapshot())
+
+@app.route('/circuit-stats', methods=['GET'])
+def circuit_stats():
+    """Report the OpenAI circuit breaker state and recent failure counts for this worker"""
+    return jsonify(circuit_breaker.snapshot())
+
+@app.route('/candidate-stats', methods=['GET'])
+def candidate_stats():
+    """Report candidate pool hits, refills and pooled captions for this worker"""
+    return jsonify(candidate_pool.snapshot())
+
+@app.route('/rate-limit-stats', methods=['GET'])
+def rate_limit_stats():
+    """Report client-side rate limiting (queued requests, retries, upstream 429s) for this worker"""
+    return jsonify(rate_limiter.snapshot())
+
+@app.route('/pool-stats', methods=['GET'])
+def pool_stats():
+    """Report OpenAI client pool usage (live clients, reuse ratio, evictions) for this worker"""
+    return jsonify(client_pool.snapshot())
+
+@app.route('/assets/<path:filename>', methods=['GET'])
+def asset(filename):
+    """Serve a fingerprinted asset, precompressed to match Accept-Encoding"""
+    entry = asset_registry.get(filename)
+    if entry is None:
+        return Response('Not found', status=404, mimetype='text/plain')
+
+    headers = {
+        'Cache-Control': ASSET_CACHE_CONTROL,
+        'ETag': f'"{entry.etag}"',
+        'Vary': 'Accept-Encoding',
+    }
+    if entry.etag in request.if_none_match:
+        return Response(status=304, headers=headers)
+
+    encoding, body = entry.negotiate(request.headers.get('Accept-Encoding'))
+    if encoding != 'identity':
+        headers['Content-Encoding'] = encoding
+    return Response(body, content_type=entry.content_type, headers=headers)
+
+def warm_up():
+    """Compile and render the page template once so the first request doesn't pay for it"""
+    template = app.jinja_env.get_template('index.html')
+    with app.test_request_context('/'):
+        # Rendered directly rather than via render_template, so the warm-up isn't counted in /metrics
+        context = {'has_session_key': False}
+        app.update_template_context(context)
+        template.render(context)
+
+# Runs at import: once per worker, or once in the master when gunicorn.conf.py preloads the app
+warm_up()
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
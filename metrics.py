@@ -0,0 +1,296 @@
+import os
+import time
+import random
+import logging
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+
+# Upper bounds (seconds) for stage and request latency histograms
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Label values come from user input, so they are folded into a fixed set
+KNOWN_LENGTHS = ('short', 'medium', 'long')
+
+_current_trace = ContextVar('caption_request_trace', default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter keyed by a tuple of label values"""
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values=(), amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for label_values, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values"""
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        # Store per-bucket (non-cumulative) counts; collect() accumulates them
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def collect(self):
+        with self._lock:
+            series = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._series.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, label_values, le)} {cumulative}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class RequestTrace:
+    """Per-request route label plus, when slow-request sampling is on, every stage timing"""
+
+    __slots__ = ('route', 'method', 'status', 'started', 'stages', 'deferred', 'finished')
+
+    def __init__(self, route, method, sample):
+        self.route = route
+        self.method = method
+        self.status = None
+        self.deferred = False
+        self.finished = False
+        self.started = time.perf_counter()
+        self.stages = [] if sample else None
+
+
+class _Stage:
+    __slots__ = ('metrics', 'name', 'labels', 'started')
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe_stage(self.name, time.perf_counter() - self.started, *self.labels)
+        return False
+
+
+class PipelineMetrics:
+    """Histograms and counters for the caption pipeline, rendered in Prometheus text format.
+
+    Stages are labelled by route, length, tone count and mock vs. real. Setting
+    slow_request_ms turns on slow-request sampling: requests slower than that
+    log every stage timing (for a slow_sample_rate fraction of them).
+    """
+
+    def __init__(self, slow_request_ms=0, slow_sample_rate=1.0):
+        self.slow_request_ms = slow_request_ms
+        self.slow_sample_rate = slow_sample_rate
+        stage_labels = ('stage', 'route', 'length', 'tones', 'mock')
+        self.stage_seconds = Histogram(
+            'caption_stage_seconds', 'Time spent in each caption pipeline stage', stage_labels)
+        self.request_seconds = Histogram(
+            'caption_request_seconds', 'Request duration, including the full body for streamed responses',
+            ('route', 'method', 'status'))
+        self.tokens = Counter(
+            'caption_tokens_total', 'OpenAI prompt and completion tokens reported in response usage',
+            ('type', 'route', 'length', 'tones'))
+        self.generations = Counter(
+            'caption_generations_total', 'Caption generations by outcome',
+            ('route', 'length', 'tones', 'mock', 'outcome'))
+        # Unlabelled, since demo captions render in microseconds and labelling would cost more than rendering
+        self.mock_generations = Counter(
+            'caption_mock_generations_total', 'Demo caption sets rendered by the mock engine')
+        self._collectors = []
+        self._fallback_trace = None
+
+    @staticmethod
+    def labels(length, tones, mock):
+        """Fold request values into bounded label values: (length, tone count, mock)"""
+        length = length if length in KNOWN_LENGTHS else 'other'
+        count = len(tones) if isinstance(tones, (list, tuple)) else len([t for t in tones.split(',') if t.strip()])
+        return length, str(count) if count < 3 else '3+', 'true' if mock else 'false'
+
+    def current_trace(self):
+        trace = _current_trace.get()
+        if trace is None and self._fallback_trace is not None:
+            trace = self._fallback_trace()
+        return trace
+
+    def current_route(self):
+        trace = self.current_trace()
+        return trace.route if trace is not None else 'background'
+
+    def begin_request(self, route, method):
+        sample = self.slow_request_ms > 0 and random.random() < self.slow_sample_rate
+        trace = RequestTrace(route or 'unknown', method, sample)
+        _current_trace.set(trace)
+        return trace
+
+    def set_status(self, status):
+        trace = self.current_trace()
+        if trace is not None:
+            trace.status = status
+
+    def end_request(self, trace=None):
+        trace = trace or self.current_trace()
+        if trace is None or trace.finished:
+            return
+        trace.finished = True
+        _current_trace.set(None)
+        elapsed = time.perf_counter() - trace.started
+        self.request_seconds.observe((trace.route, trace.method, str(trace.status or 500)), elapsed)
+        if trace.stages is not None and elapsed * 1000 >= self.slow_request_ms:
+            timings = ', '.join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in trace.stages)
+            logging.warning(f"Slow request {trace.method} {trace.route} ({trace.status}) "
+                            f"took {elapsed * 1000:.1f}ms: {timings or 'no stages recorded'}")
+
+    def stage(self, name, length, tones, mock=False):
+        """Context manager timing one pipeline stage"""
+        return _Stage(self, name, self.labels(length, tones, mock))
+
+    def observe_stage(self, name, seconds, length, tones, mock):
+        trace = self.current_trace()
+        route = trace.route if trace is not None else 'background'
+        self.stage_seconds.observe((name, route, length, tones, mock), seconds)
+        if trace is not None and trace.stages is not None:
+            trace.stages.append((name, seconds))
+
+    def record_usage(self, usage, length, tones):
+        """Count prompt/completion tokens from an OpenAI response's usage block"""
+        if usage is None:
+            return
+        length, tones, _ = self.labels(length, tones, False)
+        route = self.current_route()
+        self.tokens.inc(('prompt', route, length, tones), getattr(usage, 'prompt_tokens', 0) or 0)
+        self.tokens.inc(('completion', route, length, tones), getattr(usage, 'completion_tokens', 0) or 0)
+
+    def record_generation(self, length, tones, mock, outcome):
+        self.generations.inc((self.current_route(),) + self.labels(length, tones, mock) + (outcome,))
+
+    def record_mock(self, count=1):
+        """Count demo caption sets; a single counter bump, no timing or labels"""
+        self.mock_generations.inc((), count)
+
+    def instrument_flask(self, app):
+        """Time every request and template render through Flask hooks and signals"""
+        from flask import g, request, has_app_context, before_render_template, template_rendered
+
+        # Streamed bodies run outside the context the request started in, but keep g
+        self._fallback_trace = lambda: g.get('caption_trace') if has_app_context() else None
+
+        @app.before_request
+        def _begin():
+            g.caption_trace = self.begin_request(request.endpoint, request.method)
+
+        @app.after_request
+        def _status(response):
+            trace = g.get('caption_trace')
+            if trace is not None:
+                trace.status = response.status_code
+                # Finish when the server closes the body, so streamed responses are timed in full
+                trace.deferred = True
+                response.call_on_close(lambda: self.end_request(trace))
+            return response
+
+        @app.teardown_request
+        def _end(exc):
+            # Requests that failed before after_request still need recording
+            trace = g.get('caption_trace')
+            if trace is not None and not trace.deferred:
+                self.end_request(trace)
+
+        render_started = ContextVar('caption_render_started', default=None)
+
+        def _before_render(sender, template, context, **extra):
+            render_started.set(time.perf_counter())
+
+        def _rendered(sender, template, context, **extra):
+            started = render_started.get()
+            if started is not None:
+                labels = self.labels(context.get('length') or 'medium', context.get('tone') or '',
+                                     context.get('is_mock'))
+                self.observe_stage('render', time.perf_counter() - started, *labels)
+
+        before_render_template.connect(_before_render, app, weak=False)
+        template_rendered.connect(_rendered, app, weak=False)
+
+    def add_collector(self, prefix, snapshot):
+        """Expose the numeric values of snapshot() (e.g. cache or pool stats) as gauges"""
+        self._collectors.append((prefix, snapshot))
+
+    def render(self):
+        lines = []
+        for metric in (self.request_seconds, self.stage_seconds, self.tokens, self.generations,
+                       self.mock_generations):
+            lines.extend(metric.collect())
+        for prefix, snapshot in self._collectors:
+            try:
+                values = snapshot()
+            except Exception as e:
+                logging.error(f"Metrics collector {prefix} failed: {e}")
+                continue
+            for key, value in sorted(values.items()):
+                # bool is an int subclass; flags like disk_tier are config, not measurements
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f"# TYPE {prefix}_{key} gauge")
+                    lines.append(f"{prefix}_{key} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+def create_pipeline_metrics_from_env():
+    """Configure pipeline metrics from METRICS_* environment variables"""
+    return PipelineMetrics(
+        slow_request_ms=float(os.environ.get("METRICS_SLOW_REQUEST_MS", "0")),
+        slow_sample_rate=float(os.environ.get("METRICS_SLOW_SAMPLE_RATE", "1.0")),
+    )
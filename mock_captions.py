@@ -0,0 +1,155 @@
+import string
+import operator
+import functools
+
+# Mock caption templates indexed by (length, canonical tone combination).
+# Placeholders: {topic}, {slug} (topic without spaces, for hashtags),
+# {tags} (one hashtag per tone) and {blend} (the tones written out).
+# Lines are stored already clean: no "1. " prefixes and no tone headers.
+MOCK_TEMPLATES = {
+    ("short", "funny+romantic"): (
+        "{topic} = instant love-laugh combo 😂💕 #{slug}Love {tags}",
+        "Found my {topic} comedy-romance match 🤪❤️ #{slug}Magic {tags}",
+        "{topic} + giggles + heart eyes ✨ #{slug}Vibes {tags}",
+    ),
+    ("short", "blend"): (
+        "{topic} + {blend} energy ✨ #{slug}Magic {tags}",
+        "Perfect {blend} vibes 🌟 #{slug}Mood {tags}",
+        "{topic} through {blend} lens 💫 #{slug}Life {tags}",
+    ),
+    ("long", "funny+romantic"): (
+        "So here's the thing about {topic} - it's got me feeling like the main character in a romantic comedy, except I can't tell if I'm falling in love or just falling over my own two feet. Either way, I'm here for this chaotic energy that somehow makes perfect sense. Life's too short not to laugh at your own love story, right? Sometimes the best relationships are built on inside jokes and shared adventures. This is what happens when romance meets comedy in real life. 😂💕 #{slug}Love {tags} #RomCom",
+        "They told me {topic} was serious business, but nobody warned me I'd be over here making heart eyes while simultaneously crafting the world's corniest jokes. Plot twist: apparently you can be swoony AND silly at the same time, and honestly? It's the best combination I never knew I needed. When you find someone who laughs at your terrible puns and still thinks you're attractive, you hold onto that forever. This is what happens when humor meets heart. 🤪❤️ #{slug}Magic {tags} #LoveAndLaughs",
+        "Update from the front lines of {topic}: I've discovered that the secret ingredient to everything is being equal parts dreamy romantic and absolute goofball. Some days you're writing poetry, other days you're making terrible jokes, but every day you're authentically, beautifully, chaotically yourself. And that's the kind of energy I'm bringing to everything now. Because why choose between heart eyes and belly laughs when you can have both? ✨ #{slug}Vibes {tags} #AuthenticChaos",
+    ),
+    ("long", "blend"): (
+        "There's something magical that happens when you approach {topic} with {blend} energy - suddenly everything feels more intentional, more meaningful, more authentically you. It's like finding the perfect filter for life, except instead of changing how you look, it changes how you feel about everything around you. This is what happens when you stop forcing yourself into boxes and start embracing the beautiful complexity of who you actually are. Why settle for one-dimensional when life is meant to be a full spectrum experience? ✨ #{slug}Magic {tags} #Authentic",
+        "Been thinking a lot about how {topic} hits different when you're channeling that perfect {blend} vibe. It's not about being one thing or another - it's about finding that sweet spot where all parts of your personality can coexist and actually enhance each other. Like a perfectly balanced playlist where every song flows into the next, creating something bigger than the sum of its parts. This is how we're meant to live - not in rigid categories, but in beautiful, flowing authenticity. 🌟 #{slug}Mood {tags} #RealTalk",
+        "Here's what I've learned about seeing {topic} through a {blend} lens: it's not just about changing your perspective, it's about expanding it. When you allow yourself to hold space for seemingly contradictory energies, you create room for growth, for surprise, for the kind of authentic moments that make life feel less like performance and more like art. This is how I choose to see the world now - complex, nuanced, and beautifully contradictory, just like life should be. 💫 #{slug}Life {tags} #BeYou",
+    ),
+    ("medium", "funny+romantic"): (
+        "When {topic} makes you laugh until you fall in love all over again 😂💕 Can't tell if I'm falling for the moment or just falling over my own feet, but either way I'm here for it! This is what happens when romance meets comedy in the best possible way. #{slug}Love {tags} #RomCom",
+        "Found someone who thinks my {topic} jokes are actually romantic... definitely a keeper! 🤪❤️ Plot twist: apparently you can be swoony AND silly at the same time, and honestly? It's the perfect combination I never knew I needed. #{slug}Magic {tags} #LoveAndLaughs",
+        "They say laughter is the best medicine, but {topic} with you is pure magic 😍🎭 Some days you're writing poetry, other days you're making terrible puns, but every day you're authentically, beautifully, chaotically yourself. This is my kind of energy! ✨ #{slug}Vibes {tags} #AuthenticChaos",
+    ),
+    ("medium", "adventurous+chill"): (
+        "Finding adventure in {topic} while keeping my zen intact 🏔️☮️ It's called balanced exploration, and I'm absolutely here for it! Sometimes the best adventures happen when you're completely relaxed about the outcome. #{slug}Balance {tags} #AdventurousZen",
+        "Sometimes the best adventures happen when you're completely relaxed about {topic} 🌊✨ Ready for anything but also totally fine doing absolutely nothing - it's the perfect mindset! Both mountain climbing and Netflix marathons count as valid exploration. #{slug}Vibes {tags} #ChillAdventure",
+        "Peaceful exploration of {topic} - because not all adventures need adrenaline 🧘‍♀️🗺️ Found my sweet spot: adventurous enough to try new things, chill enough to actually enjoy them. Perfect balance between pushing boundaries and savoring moments! #{slug}Journey {tags} #MindfulAdventure",
+    ),
+    ("medium", "professional+funny"): (
+        "Bringing humor to the workplace: {topic} edition 💼😄 Turns out balancing business acumen with a healthy sense of humor is actually the secret sauce. Who knew professionalism could be this fun? #{slug}Success {tags} #ProfessionallyFunny",
+        "When {topic} meets corporate comedy - productivity through laughter! 📈🎭 Apparently you can close deals AND crack jokes - revolutionary concept, honestly. Serious goals don't always require serious faces. #{slug}Growth {tags} #BusinessHumor",
+        "Serious about success, silly about everything else - especially {topic} 🎯😂 The best boardrooms have the best laughs, and I'm here to prove it. Sometimes the best ideas come from the silliest moments! #{slug}Life {tags} #WorkHardLaughHard",
+    ),
+    ("medium", "multi"): (
+        "{topic} hits different when you blend {blend} energy together ✨ There's something beautiful about embracing all facets of who you are instead of picking just one. Why choose one vibe when you can be authentically multifaceted? #{slug}Fusion {tags} #Authentic",
+        "Why choose one vibe when {topic} can be {blend} all at once? 🌟 It's not about being one thing or another - it's about being completely, authentically you. Complex, nuanced, and beautifully contradictory! #{slug}Multifaceted {tags} #RealTalk",
+        "Embracing every shade of {topic} - {blend} and unapologetically me 💫 When you allow yourself to hold space for seemingly contradictory energies, you create room for authentic growth. This is how I choose to see the world! #{slug}Journey {tags} #BeYou",
+    ),
+    ("medium", "blend"): (
+        "When {topic} meets {blend} energy - pure magic happens ✨ There's something beautiful about embracing all facets of who you are instead of picking just one. This is what authentic living looks like! #{slug}Magic {tags} #Authentic",
+        "Blending {blend} vibes with {topic} for the perfect mood 🌟 It's not about being one thing or another - it's about being authentically, completely you. Complex and beautifully contradictory! #{slug}Vibes {tags} #RealTalk",
+        "{topic} through a {blend} lens - this is how I see the world 💫 When you stop forcing yourself into boxes and start embracing beautiful complexity, everything feels more meaningful. This is my authentic energy! #{slug}Perspective {tags} #BeYou",
+    ),
+}
+
+# Medium captions also have dedicated copy for these tone pairs
+MEDIUM_PAIRS = (
+    ("adventurous", "chill", "adventurous+chill"),
+    ("professional", "funny", "professional+funny"),
+)
+
+# Values passed to a compiled template, in this order
+FIELDS = ("topic", "slug", "tags", "blend")
+
+
+def compile_template(lines):
+    """Turn template lines into a %-format string plus a getter that orders the values for it"""
+    literal_parts = []
+    positions = []
+    for literal, field, _, _ in string.Formatter().parse('\n'.join(lines)):
+        literal_parts.append(literal.replace('%', '%%'))
+        if field is not None:
+            literal_parts.append('%s')
+            positions.append(FIELDS.index(field))
+    # itemgetter with a single index returns a bare value, so always pass at least two
+    getter = operator.itemgetter(*positions) if len(positions) > 1 else (lambda values: (values[positions[0]],))
+    return ''.join(literal_parts), getter
+
+
+# Each template's three lines are compiled once, at import
+COMPILED_TEMPLATES = {key: compile_template(lines) for key, lines in MOCK_TEMPLATES.items()}
+
+# Numbered form of the same templates, for the rare inputs that still need cleaning
+NUMBERED_TEMPLATES = {
+    key: compile_template([f"{i}. {line}" for i, line in enumerate(lines, 1)])
+    for key, lines in MOCK_TEMPLATES.items()
+}
+
+
+def canonical_combo(tones, length):
+    """Pick the template family for a tone list, matching the original if/elif precedence"""
+    if 'funny' in tones and 'romantic' in tones:
+        return "funny+romantic"
+    if length != "medium":
+        return "blend"
+    for first, second, combo in MEDIUM_PAIRS:
+        if first in tones and second in tones:
+            return combo
+    return "multi" if len(tones) > 2 else "blend"
+
+
+@functools.lru_cache(maxsize=4096)
+def tone_plan(tone, length):
+    """Parse a tone string once per (tone, length): template, hashtags and blended description"""
+    length = length if length in ("short", "long") else "medium"
+    tones = [t.strip().lower() for t in tone.split(',') if t.strip()]
+    combo = canonical_combo(tones, length)
+    
+    tags = ''.join([f"#{t.title()}" for t in tones])
+    if combo == "multi":
+        blend = ', '.join(tones[:-1]) + f', and {tones[-1]}'
+    else:
+        blend = ' and '.join(tones)
+    
+    # Empty hashtags leave trailing spaces, and newlines inside tones would split
+    # captions; those rare inputs still go through the full cleaning pass
+    needs_cleaning = not tags or '\n' in tags or '\n' in blend
+    return (length, combo), tags, blend, needs_cleaning
+
+
+class MockCaptionEngine:
+    """Renders demo captions from precompiled templates, already in cleaned form"""
+    
+    def __init__(self, cleaner):
+        # cleaner is only used for unusual input (newlines, no usable tones)
+        self.cleaner = cleaner
+    
+    def render(self, topic, tone, length="medium"):
+        """Render 3 newline-separated captions for one topic, tone and length"""
+        key, tags, blend, needs_cleaning = tone_plan(tone, length)
+        values = (topic, topic.replace(' ', ''), tags, blend)
+        if needs_cleaning or '\n' in topic:
+            template, getter = NUMBERED_TEMPLATES[key]
+            return self.cleaner(template % getter(values))
+        template, getter = COMPILED_TEMPLATES[key]
+        return template % getter(values)
+    
+    def render_batch(self, requests):
+        """Render captions for many (topic, tone, length) requests in one call"""
+        results = []
+        append = results.append
+        slugs = {}
+        for topic, tone, length in requests:
+            key, tags, blend, needs_cleaning = tone_plan(tone, length)
+            if needs_cleaning or '\n' in topic:
+                append(self.render(topic, tone, length))
+                continue
+            # Hashtag slugs are shared by every request for the same topic in the batch
+            slug = slugs.get(topic)
+            if slug is None:
+                slug = slugs[topic] = topic.replace(' ', '')
+            template, getter = COMPILED_TEMPLATES[key]
+            append(template % getter((topic, slug, tags, blend)))
+        return results
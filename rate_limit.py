@@ -0,0 +1,315 @@
+import os
+import re
+import time
+import random
+import logging
+import threading
+from collections import OrderedDict
+
+from client_pool import hash_api_key
+
+# OpenAI durations look like "1s", "6m0s", "20ms" or "1h2m3.5s"
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+_DURATION_SCALE = {'ms': 0.001, 's': 1.0, 'm': 60.0, 'h': 3600.0}
+
+# Status codes the SDK would normally retry itself (its own retries are disabled)
+RETRYABLE_STATUS = {408, 409, 429}
+
+
+class RateLimitTimeout(Exception):
+    """The key stayed rate limited for longer than the request's deadline allowed"""
+
+
+def parse_duration(value):
+    """Parse an x-ratelimit-reset-* duration into seconds (None if unparseable)"""
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * _DURATION_SCALE[unit] for amount, unit in parts)
+
+
+def retry_after_seconds(headers):
+    """Seconds the server asked us to wait before retrying, from retry-after(-ms) headers"""
+    if headers is None:
+        return None
+    value = headers.get('retry-after-ms')
+    if value:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            # HTTP-date form; treat as "soon" rather than parsing clocks we may not agree on
+            return None
+    return None
+
+
+def is_hard_quota_error(e):
+    """True for 429s that mean the account is out of credit, which retrying cannot fix"""
+    if getattr(e, 'code', None) == 'insufficient_quota':
+        return True
+    body = getattr(e, 'body', None)
+    if isinstance(body, dict) and 'insufficient_quota' in (body.get('code'), body.get('type')):
+        return True
+    return 'quota' in str(e).lower()
+
+
+def is_retryable_error(e):
+    """Transient failures worth retrying: 429 (not hard quota), 5xx and connection errors"""
+    status = getattr(e, 'status_code', None)
+    if status is not None:
+        if status == 429:
+            return not is_hard_quota_error(e)
+        return status in RETRYABLE_STATUS or status >= 500
+    try:
+        from openai import APIConnectionError
+    except ImportError:
+        return False
+    return isinstance(e, APIConnectionError)
+
+
+def estimate_request_tokens(messages, max_tokens):
+    """Rough TPM cost of a request: ~4 characters per prompt token plus the completion budget"""
+    prompt_chars = sum(len(m.get('content') or '') for m in messages)
+    return prompt_chars // 4 + max_tokens
+
+
+class TokenBucket:
+    """Continuously refilling bucket; tokens may go negative to queue reservations in order"""
+
+    __slots__ = ('capacity', 'rate', 'tokens', 'updated')
+
+    def __init__(self, capacity, rate):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_for(self):
+        """Seconds until the reservations already taken are covered"""
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate if self.rate > 0 else float('inf')
+
+    def sync(self, limit, remaining, reset, now):
+        """Resize from x-ratelimit-* headers; the server's remaining count caps our estimate"""
+        self.refill(now)
+        self.capacity = limit
+        if reset and limit > remaining:
+            self.rate = (limit - remaining) / reset
+        else:
+            self.rate = limit / 60.0
+        self.tokens = min(self.tokens, remaining)
+
+
+class _KeyLimiter:
+    """Request and token buckets for one API key, created lazily from response headers"""
+
+    __slots__ = ('buckets', 'blocked_until')
+
+    def __init__(self):
+        self.buckets = {}
+        self.blocked_until = 0.0
+
+
+class RateLimiter:
+    """Client-side rate limiting in front of chat.completions.create, per API key.
+
+    Buckets are sized from the x-ratelimit-* headers of earlier responses, so
+    requests queue locally (up to the deadline) instead of drawing a 429. When
+    a 429 still arrives, the call is retried with jittered exponential backoff
+    that honours Retry-After. Hard quota errors are raised immediately.
+    """
+
+    def __init__(self, deadline=20.0, base_delay=0.5, max_delay=8.0, max_retries=6, max_keys=1024):
+        self.deadline = deadline
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retries = max_retries
+        self.max_keys = max_keys
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {
+            'calls': 0,
+            'queued': 0,
+            'queued_seconds': 0.0,
+            'retries': 0,
+            'upstream_429s': 0,
+            'hard_quota_errors': 0,
+            'deadline_exceeded': 0,
+        }
+
+    def _limiter(self, key_hash):
+        # Caller holds self._lock
+        limiter = self._keys.get(key_hash)
+        if limiter is None:
+            limiter = self._keys[key_hash] = _KeyLimiter()
+            while len(self._keys) > self.max_keys:
+                self._keys.popitem(last=False)
+        else:
+            self._keys.move_to_end(key_hash)
+        return limiter
+
+    def reserve(self, key_hash, cost, deadline):
+        """Take a request slot and cost tokens, returning how long to wait before sending.
+
+        Raises RateLimitTimeout (without reserving anything) if the wait would
+        run past the deadline.
+        """
+        now = time.monotonic()
+        costs = {'requests': 1, 'tokens': cost}
+        with self._lock:
+            self.stats['calls'] += 1
+            limiter = self._limiter(key_hash)
+            wait = max(0.0, limiter.blocked_until - now)
+            taken = []
+            for name, bucket in limiter.buckets.items():
+                bucket.refill(now)
+                amount = min(costs.get(name, 0), bucket.capacity)
+                bucket.tokens -= amount
+                taken.append((bucket, amount))
+                wait = max(wait, bucket.wait_for())
+            if now + wait > deadline:
+                for bucket, amount in taken:
+                    bucket.tokens += amount
+                self.stats['deadline_exceeded'] += 1
+                raise RateLimitTimeout(f"Rate limit queue wait of {wait:.1f}s exceeds the request deadline")
+            if wait > 0:
+                self.stats['queued'] += 1
+                self.stats['queued_seconds'] += wait
+        return wait
+
+    def observe(self, key_hash, headers):
+        """Size this key's buckets from the x-ratelimit-* headers of a response"""
+        if headers is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            limiter = self._limiter(key_hash)
+            for name in ('requests', 'tokens'):
+                try:
+                    limit = int(headers.get(f'x-ratelimit-limit-{name}'))
+                    remaining = int(headers.get(f'x-ratelimit-remaining-{name}'))
+                except (TypeError, ValueError):
+                    continue
+                if limit <= 0:
+                    continue
+                reset = parse_duration(headers.get(f'x-ratelimit-reset-{name}'))
+                bucket = limiter.buckets.get(name)
+                if bucket is None:
+                    bucket = limiter.buckets[name] = TokenBucket(limit, limit / 60.0)
+                bucket.sync(limit, remaining, reset, now)
+
+    def backoff(self, key_hash, error, attempt, deadline):
+        """Delay before retrying a transient failure, or None if the deadline doesn't allow one"""
+        headers = getattr(getattr(error, 'response', None), 'headers', None)
+        retry_after = retry_after_seconds(headers)
+        if retry_after is not None:
+            # Respect the server's hint, with a little jitter so waiters don't stampede back
+            delay = retry_after + random.uniform(0, self.base_delay)
+        else:
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+        now = time.monotonic()
+        with self._lock:
+            if getattr(error, 'status_code', None) == 429:
+                self.stats['upstream_429s'] += 1
+                # Hold every queued request for this key back until the server is ready again
+                limiter = self._limiter(key_hash)
+                limiter.blocked_until = max(limiter.blocked_until, now + delay)
+                for bucket in limiter.buckets.values():
+                    bucket.tokens = min(bucket.tokens, 0)
+            if attempt >= self.max_retries or now + delay > deadline:
+                self.stats['deadline_exceeded'] += 1
+                return None
+            self.stats['retries'] += 1
+        return delay
+
+    def _prepare(self, api_key):
+        return hash_api_key(api_key or ''), time.monotonic() + self.deadline
+
+    def call(self, api_key, send, cost=1):
+        """Run send() (a with_raw_response create call) under the key's limits and return the parsed result"""
+        key_hash, deadline = self._prepare(api_key)
+        attempt = 0
+        while True:
+            wait = self.reserve(key_hash, cost, deadline)
+            if wait:
+                time.sleep(wait)
+            try:
+                raw = send()
+            except Exception as e:
+                if not self._should_retry(e):
+                    raise
+                delay = self.backoff(key_hash, e, attempt, deadline)
+                if delay is None:
+                    raise
+                logging.warning(f"OpenAI request failed ({e}); retrying in {delay:.2f}s")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self.observe(key_hash, raw.headers)
+            return raw.parse()
+
+    async def async_call(self, api_key, send, cost=1):
+        """Async counterpart of call(); waits with asyncio.sleep so the event loop stays free"""
+        # Imported here so sync workers don't load asyncio at startup
+        import asyncio
+        key_hash, deadline = self._prepare(api_key)
+        attempt = 0
+        while True:
+            wait = self.reserve(key_hash, cost, deadline)
+            if wait:
+                await asyncio.sleep(wait)
+            try:
+                raw = await send()
+            except Exception as e:
+                if not self._should_retry(e):
+                    raise
+                delay = self.backoff(key_hash, e, attempt, deadline)
+                if delay is None:
+                    raise
+                logging.warning(f"OpenAI request failed ({e}); retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self.observe(key_hash, raw.headers)
+            return raw.parse()
+
+    def _should_retry(self, e):
+        if getattr(e, 'status_code', None) == 429 and is_hard_quota_error(e):
+            with self._lock:
+                self.stats['hard_quota_errors'] += 1
+            return False
+        return is_retryable_error(e)
+
+    def snapshot(self):
+        with self._lock:
+            data = dict(self.stats)
+            data['queued_seconds'] = round(data['queued_seconds'], 3)
+            data['keys'] = len(self._keys)
+        return data
+
+
+def create_rate_limiter_from_env():
+    """Configure client-side rate limiting from OPENAI_RETRY_* environment variables"""
+    return RateLimiter(
+        deadline=float(os.environ.get("OPENAI_RETRY_DEADLINE", "20")),
+        base_delay=float(os.environ.get("OPENAI_RETRY_BASE_DELAY", "0.5")),
+        max_delay=float(os.environ.get("OPENAI_RETRY_MAX_DELAY", "8")),
+        max_retries=int(os.environ.get("OPENAI_MAX_RETRIES", "6")),
+    )
@@ -0,0 +1,330 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+from itertools import islice
+
+try:
+    import fcntl
+except ImportError:  # Windows: cross-worker coalescing is unavailable
+    fcntl = None
+
+
+class _Call:
+    """One in-flight generation that later identical requests can wait on"""
+
+    __slots__ = ('done', 'owner', 'result', 'error', 'followers', 'items', 'changed', 'abandoned')
+
+    def __init__(self, owner):
+        self.done = threading.Event()
+        self.owner = owner
+        self.result = None
+        self.error = None
+        self.followers = 0
+        # Streamed calls: items produced so far, and a condition signalled as each one arrives
+        self.items = []
+        self.changed = threading.Condition()
+        self.abandoned = False
+
+
+class SingleFlight:
+    """Coalesce identical in-flight generations so only one upstream call runs per key.
+
+    Followers receive the leader's result. A leader's error is only shared with
+    followers using the same API key (owner); anyone else retries on their own,
+    so one user's quota or auth failure never reaches another user.
+    """
+
+    def __init__(self, lock_dir=None, follower_timeout=120.0, lock_timeout=60.0):
+        self.follower_timeout = follower_timeout
+        self.lock_timeout = lock_timeout
+        self.lock_dir = lock_dir if lock_dir and fcntl is not None else None
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+        self._calls = {}
+        # (event loop, key) -> (owner, future) for async_do
+        self._async_calls = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            'leaders': 0,
+            'coalesced': 0,
+            'shared_errors': 0,
+            'error_retries': 0,
+            'follower_timeouts': 0,
+            'cross_worker_waits': 0,
+            'cross_worker_hits': 0,
+            'cross_worker_timeouts': 0,
+        }
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def do(self, key, owner, fn, recheck=None):
+        """Run fn() for key unless an identical call is already in flight, then share its result.
+
+        recheck() is consulted after waiting on another worker's lock; if it returns
+        a value (e.g. the shared cache was filled meanwhile) that value is used.
+        """
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                if call is None:
+                    call = _Call(owner)
+                    self._calls[key] = call
+                    self.stats['leaders'] += 1
+                    leader = True
+                else:
+                    call.followers += 1
+                    leader = False
+
+            if leader:
+                return self._lead(key, call, fn, recheck)
+
+            if not call.done.wait(self.follower_timeout):
+                # The leader is stuck; do the work ourselves rather than wait forever
+                self._count('follower_timeouts')
+                return fn()
+            if call.error is None:
+                self._count('coalesced')
+                return call.result
+            if call.owner == owner:
+                self._count('shared_errors')
+                raise call.error
+            # Different API key: the failure may be specific to the leader's key, so retry
+            self._count('error_retries')
+
+    def _lead(self, key, call, fn, recheck):
+        try:
+            with self._worker_lock(key) as waited:
+                result = recheck() if waited and recheck is not None else None
+                if result is not None:
+                    self._count('cross_worker_hits')
+                else:
+                    result = fn()
+            call.result = result
+            return result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+
+    def stream(self, key, owner, fn, recheck=None):
+        """Generator counterpart of do(): fn() returns an iterator whose items are replayed to
+        identical requests as they arrive.
+
+        recheck() may return a list of items (e.g. cached captions) to replay instead,
+        after waiting on another worker's lock. If the leader fails for a different
+        owner, stops early or stalls, followers run fn() themselves and continue after
+        the items they have already replayed.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call(owner)
+                self._calls[key] = call
+                self.stats['leaders'] += 1
+                leader = True
+            else:
+                call.followers += 1
+                leader = False
+
+        if leader:
+            yield from self._lead_stream(key, call, fn, recheck)
+            return
+
+        sent = 0
+        while True:
+            with call.changed:
+                if sent >= len(call.items) and not call.done.is_set():
+                    call.changed.wait(self.follower_timeout)
+                items = call.items[sent:]
+                finished = call.done.is_set()
+            if items:
+                sent += len(items)
+                yield from items
+            elif finished:
+                break
+            else:
+                # The leader is stuck; finish the work ourselves rather than wait forever
+                self._count('follower_timeouts')
+                yield from islice(fn(), sent, None)
+                return
+
+        if call.error is None and not call.abandoned:
+            self._count('coalesced')
+            return
+        if call.error is not None and call.owner == owner:
+            self._count('shared_errors')
+            raise call.error
+        self._count('error_retries')
+        yield from islice(fn(), sent, None)
+
+    def _lead_stream(self, key, call, fn, recheck):
+        try:
+            with self._worker_lock(key) as waited:
+                items = recheck() if waited and recheck is not None else None
+                if items is not None:
+                    self._count('cross_worker_hits')
+                else:
+                    items = fn()
+                for item in items:
+                    with call.changed:
+                        call.items.append(item)
+                        call.changed.notify_all()
+                    yield item
+        except GeneratorExit:
+            # The leader's client went away mid-stream; followers carry on by themselves
+            call.abandoned = True
+            raise
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            with call.changed:
+                call.done.set()
+                call.changed.notify_all()
+
+    async def async_do(self, key, owner, fn):
+        """Async counterpart of do() for one event loop: identical calls await the leader's coroutine fn().
+
+        Errors are shared by owner the same way. Coalescing is per event loop only;
+        waiting on another worker's file lock would block the loop.
+        """
+        # Imported here so sync workers don't load asyncio at startup
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        while True:
+            call = self._async_calls.get((loop, key))
+            if call is None:
+                future = loop.create_future()
+                call = self._async_calls[(loop, key)] = (owner, future)
+                self._count('leaders')
+                try:
+                    result = await fn()
+                except Exception as e:
+                    future.set_exception(e)
+                    # Mark it retrieved, so a call without followers doesn't log a warning
+                    future.exception()
+                    raise
+                else:
+                    future.set_result(result)
+                    return result
+                finally:
+                    if self._async_calls.get((loop, key)) is call:
+                        del self._async_calls[(loop, key)]
+                    if not future.done():
+                        future.cancel()
+
+            leader_owner, future = call
+            try:
+                result = await asyncio.wait_for(asyncio.shield(future), self.follower_timeout)
+            except asyncio.TimeoutError:
+                self._count('follower_timeouts')
+                return await fn()
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The leader was cancelled rather than us; try again
+                continue
+            except Exception:
+                if leader_owner == owner:
+                    self._count('shared_errors')
+                    raise
+                self._count('error_retries')
+                continue
+            self._count('coalesced')
+            return result
+
+    def _worker_lock(self, key):
+        return _FileLock(self, key) if self.lock_dir else _NoLock()
+
+    def snapshot(self):
+        with self._lock:
+            data = dict(self.stats)
+            data['in_flight'] = len(self._calls) + len(self._async_calls)
+        data['cross_worker'] = self.lock_dir is not None
+        return data
+
+
+class _NoLock:
+    def __enter__(self):
+        return False
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _FileLock:
+    """flock()-based lock per key, shared by every worker process on this machine.
+
+    If the lock can't be had within lock_timeout the call goes ahead uncoordinated,
+    leaving the file to the worker that holds it.
+    """
+
+    def __init__(self, flight, key):
+        self.flight = flight
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+        self.path = os.path.join(flight.lock_dir, f"{digest}.lock")
+        self.handle = None
+        self.locked = False
+
+    def __enter__(self):
+        try:
+            self.handle = open(self.path, 'a')
+        except OSError as e:
+            logging.warning(f"Single-flight lock unavailable: {e}")
+            return False
+        try:
+            fcntl.flock(self.handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            self.locked = True
+            return False
+        except BlockingIOError:
+            pass
+
+        # Another worker is generating the same key; wait for it (bounded)
+        self.flight._count('cross_worker_waits')
+        deadline = time.monotonic() + self.flight.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            try:
+                fcntl.flock(self.handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                self.locked = True
+                return True
+            except BlockingIOError:
+                continue
+        # Still held: go ahead without the lock, but still re-check in case the other worker finished
+        self.flight._count('cross_worker_timeouts')
+        logging.warning(f"Single-flight lock wait timed out after {self.flight.lock_timeout:g}s; generating without it")
+        return True
+
+    def __exit__(self, *exc):
+        if self.handle is None:
+            return False
+        if self.locked:
+            try:
+                # Unlinking can race with a new waiter and cost at most one duplicate call
+                os.unlink(self.path)
+            except OSError:
+                pass
+            fcntl.flock(self.handle, fcntl.LOCK_UN)
+            self.locked = False
+        self.handle.close()
+        return False
+
+
+def create_single_flight_from_env():
+    """Configure request coalescing from SINGLE_FLIGHT_* environment variables"""
+    return SingleFlight(
+        lock_dir=os.environ.get("SINGLE_FLIGHT_LOCK_DIR") or None,
+        follower_timeout=float(os.environ.get("SINGLE_FLIGHT_TIMEOUT", "120")),
+    )
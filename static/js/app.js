@@ -0,0 +1,910 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const form = document.getElementById('captionForm');
+    const generateBtn = document.getElementById('generateBtn');
+    const loadingSpinner = document.getElementById('loadingSpinner');
+    const copyButtons = document.querySelectorAll('.copy-btn');
+
+    const generateBtnHTML = generateBtn.innerHTML;
+
+    // Form submission with loading animation
+    form.addEventListener('submit', function(e) {
+        generateBtn.disabled = true;
+        generateBtn.innerHTML = '<i class="fas fa-spinner fa-spin me-2"></i>Generating...';
+        loadingSpinner.style.display = 'block';
+
+        // Scroll to loading spinner
+        loadingSpinner.scrollIntoView({ behavior: 'smooth' });
+
+        // Queue a background job when job mode is on, else stream captions in place when supported
+        if (form.dataset.jobUrl && window.fetch) {
+            e.preventDefault();
+            submitJob(new FormData(form));
+        } else if (form.dataset.streamUrl && window.fetch && window.ReadableStream && window.TextDecoder) {
+            e.preventDefault();
+            streamCaptions(new FormData(form));
+        }
+    });
+
+    // Messages for generation errors that leave the user on the page (same wording as the server's flashes)
+    const GENERATION_ERROR_MESSAGES = {
+        rate_limited: 'OpenAI is busy right now. Please wait a few seconds and try again.',
+        unavailable: 'OpenAI is temporarily unavailable. Please try again shortly.',
+        queue_full: 'Too many captions are being generated right now. Please try again shortly.',
+        not_found: 'This caption request has expired. Please generate again.',
+        expired: 'This caption request waited too long in the queue. Please try again.',
+        error: 'An error occurred while generating captions. Please try again.'
+    };
+
+    // Show a failed generation: the API key or quota modal, else a flash that keeps the page as it is
+    function showGenerationError(error) {
+        const kind = error && error.kind;
+        if (kind === 'auth' || kind === 'api_key_required') {
+            window.showApiKeySetup();
+        } else if (kind === 'quota') {
+            window.showQuotaExceeded();
+        } else {
+            resetGenerateButton();
+            const message = GENERATION_ERROR_MESSAGES[kind] || (error && error.message) || GENERATION_ERROR_MESSAGES.error;
+            showFlash(message, 'error');
+        }
+    }
+
+    // Job mode: submit returns a job ID at once, then poll until a worker finishes it.
+    // The pending job is kept in sessionStorage so a reload (or server restart) resumes polling.
+    const JOB_STORAGE_KEY = 'captionJob';
+    // The server only holds a poll open when JOB_POLL_MAX_WAIT allows it; otherwise polls return at once
+    const JOB_POLL_WAIT = 5;
+    const JOB_POLL_INTERVAL = 1000;
+    const JOB_POLL_MAX_INTERVAL = 3000;
+
+    const sleep = ms => new Promise(resolve => setTimeout(resolve, ms));
+
+    async function submitJob(formData) {
+        try {
+            let response = null;
+            try {
+                response = await fetch(form.dataset.jobUrl, {
+                    method: 'POST',
+                    body: formData,
+                    headers: { 'Accept': 'application/json' }
+                });
+            } catch (networkError) {
+                throw { kind: 'unavailable' };
+            }
+            const payload = await response.json();
+            if (!response.ok) {
+                throw { kind: payload.error_kind, message: payload.error };
+            }
+            const job = {
+                pollUrl: payload.poll_url,
+                topic: formData.get('topic'),
+                tone: formData.get('tone')
+            };
+            sessionStorage.setItem(JOB_STORAGE_KEY, JSON.stringify(job));
+            await pollJob(job);
+        } catch (error) {
+            // Never fall back to a form post here: that would generate on the web worker and bypass the queue
+            sessionStorage.removeItem(JOB_STORAGE_KEY);
+            showGenerationError(error);
+        }
+    }
+
+    async function pollJob(job) {
+        let failures = 0;
+        let interval = JOB_POLL_INTERVAL;
+        while (true) {
+            const started = Date.now();
+            let response = null;
+            try {
+                response = await fetch(`${job.pollUrl}?wait=${JOB_POLL_WAIT}`, {
+                    headers: { 'Accept': 'application/json' }
+                });
+            } catch (networkError) {
+                response = null;
+            }
+
+            // Keep polling through restarts: network errors and 5xx back off and retry
+            if (!response || response.status >= 500) {
+                failures += 1;
+                if (failures > 30) {
+                    throw { kind: 'unavailable' };
+                }
+                await sleep(Math.min(1000 * failures, 5000));
+                continue;
+            }
+            failures = 0;
+
+            const payload = await response.json();
+            if (!response.ok) {
+                throw { kind: payload.error_kind, message: payload.error };
+            }
+            if (payload.status === 'done') {
+                sessionStorage.removeItem(JOB_STORAGE_KEY);
+                const results = createResultsContainer(job.topic, job.tone);
+                payload.captions.forEach(caption => appendCaptionCard(results, caption));
+                resetGenerateButton();
+                results.scrollIntoView({ behavior: 'smooth', block: 'start' });
+                return;
+            }
+            if (payload.status === 'failed') {
+                throw { kind: payload.error_kind, message: payload.error };
+            }
+
+            // A poll that came back at once wasn't held open, so wait before asking again
+            const elapsed = Date.now() - started;
+            if (elapsed < interval) {
+                await sleep(interval - elapsed);
+                interval = Math.min(interval + 500, JOB_POLL_MAX_INTERVAL);
+            }
+        }
+    }
+
+    function resumePendingJob() {
+        const stored = sessionStorage.getItem(JOB_STORAGE_KEY);
+        if (!stored || !form.dataset.jobUrl || !window.fetch) {
+            return;
+        }
+        generateBtn.disabled = true;
+        generateBtn.innerHTML = '<i class="fas fa-spinner fa-spin me-2"></i>Generating...';
+        loadingSpinner.style.display = 'block';
+        pollJob(JSON.parse(stored)).catch(error => {
+            sessionStorage.removeItem(JOB_STORAGE_KEY);
+            showGenerationError(error);
+        });
+    }
+
+    // Shown when OpenAI missed the latency budget or is failing and the server sent fallback captions
+    const DEGRADED_MESSAGES = {
+        cache: 'OpenAI is slow or unavailable right now, so these are recently generated captions for the same request.',
+        mock: 'OpenAI is slow or unavailable right now, so these are demo captions. Try again shortly for AI-generated ones.'
+    };
+
+    // Streaming generation: render each caption as soon as the server emits it
+    async function streamCaptions(formData) {
+        let results = null;
+        let received = 0;
+        // Set once /stream answers; from then on the server has generated, so errors never resubmit
+        let started = false;
+
+        function handleEvent(raw) {
+            let event = 'message';
+            let data = '';
+            raw.split('\n').forEach(line => {
+                if (line.startsWith('event: ')) {
+                    event = line.slice(7);
+                } else if (line.startsWith('data: ')) {
+                    data += line.slice(6);
+                }
+            });
+            const payload = data ? JSON.parse(data) : {};
+
+            if (event === 'caption') {
+                if (!results) {
+                    results = createResultsContainer(formData.get('topic'), formData.get('tone'));
+                    loadingSpinner.style.display = 'none';
+                    results.scrollIntoView({ behavior: 'smooth', block: 'start' });
+                }
+                appendCaptionCard(results, payload.caption);
+                received += 1;
+            } else if (event === 'degraded') {
+                showFlash(DEGRADED_MESSAGES[payload.source] || DEGRADED_MESSAGES.mock, 'warning');
+            } else if (event === 'done') {
+                resetGenerateButton();
+            } else if (event === 'error') {
+                throw payload;
+            }
+        }
+
+        try {
+            const response = await fetch(form.dataset.streamUrl, {
+                method: 'POST',
+                body: formData,
+                headers: { 'Accept': 'text/event-stream' }
+            });
+            if (!response.ok || !response.body) {
+                throw { kind: 'unavailable' };
+            }
+            started = true;
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) {
+                    break;
+                }
+                buffer += decoder.decode(value, { stream: true });
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    handleEvent(buffer.slice(0, boundary));
+                    buffer = buffer.slice(boundary + 2);
+                }
+            }
+            if (!received) {
+                throw { kind: 'empty' };
+            }
+            resetGenerateButton();
+        } catch (error) {
+            if (!started) {
+                // /stream never ran (old proxy, network error): fall back to the regular form post
+                form.submit();
+            } else {
+                // Keep any captions already on screen rather than generating again
+                showGenerationError(error);
+            }
+        }
+    }
+
+    resumePendingJob();
+
+    function resetGenerateButton() {
+        generateBtn.disabled = false;
+        generateBtn.innerHTML = generateBtnHTML;
+        loadingSpinner.style.display = 'none';
+    }
+
+    // Show a dismissible alert like the server-rendered flash messages, above the form
+    function showFlash(message, category) {
+        document.querySelectorAll('.alert[data-client-flash]').forEach(alert => alert.remove());
+        const alert = document.createElement('div');
+        alert.className = `alert alert-${{ error: 'danger', warning: 'warning' }[category] || 'success'} alert-dismissible fade show`;
+        alert.setAttribute('role', 'alert');
+        alert.dataset.clientFlash = 'true';
+        alert.innerHTML = `
+            <i class="fas fa-${{ error: 'exclamation-triangle', warning: 'hourglass-half' }[category] || 'check-circle'} me-2"></i>
+            <span class="flash-text"></span>
+            <button type="button" class="btn-close" data-bs-dismiss="alert" aria-label="Close"></button>`;
+        alert.querySelector('.flash-text').textContent = message;
+        const generatorCard = document.querySelector('.generator-card');
+        generatorCard.parentNode.insertBefore(alert, generatorCard);
+        alert.scrollIntoView({ behavior: 'smooth', block: 'center' });
+    }
+
+    // Build the same results markup the server renders for captions
+    function createResultsContainer(topic, tone) {
+        const existing = document.getElementById('results');
+        if (existing) {
+            existing.remove();
+        }
+
+        const container = document.createElement('div');
+        container.className = 'results-container';
+        container.id = 'results';
+        container.innerHTML = `
+            <div class="results-header">
+                <div class="results-title">
+                    <i class="fas fa-sparkles me-2"></i>
+                    Your AI-Generated Captions
+                </div>
+                <div class="results-subtitle">
+                    <i class="fas fa-tag me-1"></i>
+                    Topic: <span class="highlight-text results-topic"></span> • Tone: <span class="highlight-text results-tone"></span>
+                </div>
+            </div>
+            <div class="caption-grid"></div>
+            <div class="results-footer">
+                <a href="${window.location.pathname}" class="new-caption-btn">
+                    <i class="fas fa-plus me-2"></i>
+                    Generate New Captions
+                </a>
+            </div>`;
+        container.querySelector('.results-topic').textContent = topic;
+        container.querySelector('.results-tone').textContent = tone;
+
+        const separator = document.querySelector('.section-separator');
+        separator.parentNode.insertBefore(container, separator);
+        return container;
+    }
+
+    function appendCaptionCard(results, caption) {
+        const card = document.createElement('div');
+        card.className = 'caption-card';
+        card.innerHTML = `
+            <div class="caption-content">
+                <div class="caption-text"></div>
+                <div class="caption-actions">
+                    <button class="copy-btn-modern" title="Copy to clipboard">
+                        <i class="fas fa-copy"></i>
+                        <span>Copy</span>
+                    </button>
+                </div>
+            </div>`;
+        card.querySelector('.caption-text').textContent = caption;
+        const button = card.querySelector('.copy-btn-modern');
+        button.setAttribute('data-caption', caption);
+        bindCopyButton(button);
+        results.querySelector('.caption-grid').appendChild(card);
+    }
+
+    // Copy to clipboard functionality (legacy and modern)
+    const allCopyButtons = document.querySelectorAll('.copy-btn, .copy-btn-modern');
+    allCopyButtons.forEach(bindCopyButton);
+
+    function bindCopyButton(button) {
+        button.addEventListener('click', function() {
+            const caption = this.getAttribute('data-caption');
+
+            // Modern clipboard API with fallback
+            if (navigator.clipboard && window.isSecureContext) {
+                navigator.clipboard.writeText(caption).then(() => {
+                    showCopySuccess(this);
+                }).catch(() => {
+                    fallbackCopyTextToClipboard(caption);
+                    showCopySuccess(this);
+                });
+            } else {
+                fallbackCopyTextToClipboard(caption);
+                showCopySuccess(this);
+            }
+        });
+    }
+
+    // Fallback copy function
+    function fallbackCopyTextToClipboard(text) {
+        const tempTextarea = document.createElement('textarea');
+        tempTextarea.value = text;
+        document.body.appendChild(tempTextarea);
+        tempTextarea.select();
+        document.execCommand('copy');
+        document.body.removeChild(tempTextarea);
+    }
+
+    // Show copy success feedback
+    function showCopySuccess(button) {
+        const originalHTML = button.innerHTML;
+
+        if (button.classList.contains('copy-btn-modern')) {
+            // Modern button style
+            button.innerHTML = '<i class="fas fa-check"></i><span>Copied!</span>';
+            button.classList.add('copied');
+
+            // Reset button after 2 seconds
+            setTimeout(() => {
+                button.innerHTML = originalHTML;
+                button.classList.remove('copied');
+            }, 2000);
+        } else {
+            // Legacy button style
+            button.innerHTML = '<i class="fas fa-check"></i>';
+            button.classList.remove('btn-outline-primary');
+            button.classList.add('btn-success');
+
+            // Reset button after 2 seconds
+            setTimeout(() => {
+                button.innerHTML = originalHTML;
+                button.classList.remove('btn-success');
+                button.classList.add('btn-outline-primary');
+            }, 2000);
+        }
+    }
+
+    // Add typing animation to form inputs
+    const inputs = document.querySelectorAll('input, select');
+    inputs.forEach(input => {
+        input.addEventListener('focus', function() {
+            this.style.transform = 'scale(1.02)';
+        });
+
+        input.addEventListener('blur', function() {
+            this.style.transform = 'scale(1)';
+        });
+    });
+
+    // Add hover effects to cards
+    const cards = document.querySelectorAll('.card, .feature-card');
+    cards.forEach(card => {
+        card.addEventListener('mouseenter', function() {
+            this.style.transform = 'translateY(-5px) scale(1.02)';
+        });
+
+        card.addEventListener('mouseleave', function() {
+            this.style.transform = 'translateY(0) scale(1)';
+        });
+    });
+
+    // Parallax effect for floating icons
+    window.addEventListener('scroll', function() {
+        const scrolled = window.pageYOffset;
+        const parallax = document.querySelector('.floating-icons');
+        if (parallax) {
+            const speed = scrolled * 0.5;
+            parallax.style.transform = `translateY(${speed}px)`;
+        }
+    });
+
+    // Random caption preview on page load
+    const sampleCaptions = [
+        "✨ Living my best life one post at a time",
+        "🌅 Chasing sunsets and dreams",
+        "💪 Stronger than yesterday",
+        "🎯 Focus on the goal, not the obstacles",
+        "😂 Life's too short for boring captions"
+    ];
+
+    // Show random sample caption hint
+    const topicInput = document.getElementById('topic');
+    let hintIndex = 0;
+
+    function rotatePlaceholder() {
+        if (topicInput && !topicInput.value) {
+            hintIndex = (hintIndex + 1) % sampleCaptions.length;
+            topicInput.placeholder = sampleCaptions[hintIndex];
+        }
+    }
+
+    setInterval(rotatePlaceholder, 3000);
+
+    // Auto-scroll to results section if captions are present (rendered by the server)
+    if (document.getElementById('results')) {
+        setTimeout(() => {
+            const resultsSection = document.getElementById('results');
+            if (resultsSection) {
+                resultsSection.scrollIntoView({ 
+                    behavior: 'smooth', 
+                    block: 'start' 
+                });
+            }
+        }, 500);
+    }
+
+    // Post the current topic and tone with a trigger flag, so the server renders a modal without generating
+    function showModal(trigger) {
+        const fields = {
+            topic: document.getElementById('topic').value,
+            tone: document.getElementById('tone').value,
+            [trigger]: 'true'
+        };
+
+        const form = document.createElement('form');
+        form.method = 'POST';
+        form.style.display = 'none';
+
+        Object.entries(fields).forEach(([name, value]) => {
+            const input = document.createElement('input');
+            input.type = 'hidden';
+            input.name = name;
+            input.value = value;
+            form.appendChild(input);
+        });
+
+        document.body.appendChild(form);
+        form.submit();
+    }
+
+    // API Key Setup functionality
+    window.showApiKeySetup = function() {
+        showModal('trigger_api_setup');
+    };
+
+    // Quota exceeded modal (demo mode or a different key)
+    window.showQuotaExceeded = function() {
+        showModal('trigger_quota_modal');
+    };
+
+    // Clear API Key Session functionality
+    window.clearApiKeySession = function() {
+        // Create a form to submit the clear session request
+        const form = document.createElement('form');
+        form.method = 'POST';
+        form.action = document.body.dataset.clearSessionUrl;
+        form.style.display = 'none';
+
+        document.body.appendChild(form);
+        form.submit();
+    };
+
+    // Tone selection functionality
+    const toneInput = document.getElementById('tone');
+    const toneTags = document.querySelectorAll('.tone-tag');
+    const currentTone = toneInput.value;
+
+    // Set initial selection if there's a value
+    if (currentTone) {
+        toneTags.forEach(tag => {
+            if (tag.getAttribute('data-tone') === currentTone) {
+                tag.classList.add('selected');
+            }
+        });
+    }
+
+    // Handle multiple tone selection
+    let selectedTones = [];
+
+    // Initialize from current value
+    if (currentTone) {
+        selectedTones = currentTone.split(',').map(t => t.trim()).filter(t => t);
+        toneTags.forEach(tag => {
+            const toneValue = tag.getAttribute('data-tone');
+            if (selectedTones.includes(toneValue)) {
+                tag.classList.add('multi-selected');
+            }
+        });
+    }
+
+    const updateToneInput = () => {
+        toneInput.value = selectedTones.join(', ');
+    };
+
+    // Handle typing in the tone input field
+    toneInput.addEventListener('input', function() {
+        const inputValue = this.value;
+        selectedTones = inputValue.split(',').map(t => t.trim()).filter(t => t);
+
+        // Update visual selection of tags
+        toneTags.forEach(tag => {
+            const toneValue = tag.getAttribute('data-tone');
+            if (selectedTones.includes(toneValue)) {
+                tag.classList.add('multi-selected');
+            } else {
+                tag.classList.remove('multi-selected');
+            }
+        });
+    });
+
+    toneTags.forEach(tag => {
+        tag.addEventListener('click', function() {
+            const toneValue = this.getAttribute('data-tone');
+
+            if (this.classList.contains('multi-selected')) {
+                // Remove from selection
+                this.classList.remove('multi-selected');
+                selectedTones = selectedTones.filter(t => t !== toneValue);
+            } else {
+                // Add to selection
+                this.classList.add('multi-selected');
+                selectedTones.push(toneValue);
+            }
+
+            // Update text input value
+            updateToneInput();
+        });
+    });
+
+    // Load more tones functionality with memory
+    const loadMoreBtn = document.getElementById('loadMoreTones');
+    const extendedTones = document.querySelectorAll('.tone-extended');
+    const loadMoreText = document.querySelector('.load-more-text');
+    const loadMoreIcon = document.querySelector('.load-more-icon');
+    let isExpanded = false;
+
+    // Check if current tone is in extended list
+    const shouldShowExtended = () => {
+        if (currentTone) {
+            const selectedTones = currentTone.split(',').map(t => t.trim());
+            return selectedTones.some(tone => {
+                return Array.from(extendedTones).some(extTone => 
+                    extTone.getAttribute('data-tone') === tone
+                );
+            });
+        }
+        return false;
+    };
+
+    if (shouldShowExtended()) {
+        // Show extended tones
+        extendedTones.forEach(tone => {
+            tone.classList.add('show');
+        });
+        loadMoreText.textContent = 'Show Less Tones';
+        loadMoreBtn.classList.add('expanded');
+        isExpanded = true;
+    }
+
+    loadMoreBtn.addEventListener('click', function() {
+        if (isExpanded) {
+            // Hide extended tones in reverse order, slightly faster
+            const reversedTones = Array.from(extendedTones).reverse();
+            reversedTones.forEach((tone, index) => {
+                setTimeout(() => {
+                    tone.classList.remove('show');
+                }, index * 40);
+            });
+
+            loadMoreText.textContent = 'Show More Tones';
+            loadMoreBtn.classList.remove('expanded');
+            isExpanded = false;
+        } else {
+            // Show extended tones with staggered animation
+            extendedTones.forEach((tone, index) => {
+                setTimeout(() => {
+                    tone.classList.add('show');
+                }, index * 50);
+            });
+
+            loadMoreText.textContent = 'Show Less Tones';
+            loadMoreBtn.classList.add('expanded');
+            isExpanded = true;
+        }
+    });
+
+    // Tutorial System
+    const tutorialOverlay = document.getElementById('tutorialOverlay');
+    const tutorialSpotlight = document.getElementById('tutorialSpotlight');
+    const tutorialSpotlightCutout = document.getElementById('tutorialSpotlightCutout');
+    const tutorialTooltip = document.getElementById('tutorialTooltip');
+    const tutorialTitle = document.getElementById('tutorialTitle');
+    const tutorialDescription = document.getElementById('tutorialDescription');
+    const tutorialProgressBar = document.getElementById('tutorialProgressBar');
+    const tutorialCounter = document.getElementById('tutorialCounter');
+    const tutorialNext = document.getElementById('tutorialNext');
+    const tutorialPrev = document.getElementById('tutorialPrev');
+    const tutorialSkip = document.getElementById('tutorialSkip');
+    const tutorialStartBtn = document.getElementById('tutorialStartBtn');
+
+    let currentStep = 0;
+    const totalSteps = 6;
+
+    const tutorialSteps = [
+        {
+            title: "Welcome to Caption Generator!",
+            description: "Let's take a quick tour to help you create amazing Instagram captions. This will only take a minute!",
+            target: null,
+            position: "center"
+        },
+        {
+            title: "Enter Your Topic",
+            description: "Start by describing what your post is about. Be specific for better results - like 'sunset beach walk' or 'homemade pasta dinner'.",
+            target: "#topic",
+            position: "right"
+        },
+        {
+            title: "Choose Your Tone",
+            description: "Select multiple tones to create unique captions that blend different styles. Try combinations like 'funny + romantic' or 'professional + inspirational'.",
+            target: ".tone-grid",
+            position: "right"
+        },
+        {
+            title: "Generate Captions",
+            description: "Click this button to generate 3 unique captions that blend all your selected tones together. Each caption will capture your chosen mood perfectly.",
+            target: ".generate-btn",
+            position: "left"
+        },
+        {
+            title: "Explore Features", 
+            description: "Discover our key features: multi-tone blending, AI power, unlimited possibilities, and custom API key support for extended use.",
+            target: ".section-separator",
+            position: "bottom"
+        },
+        {
+            title: "You're Ready!",
+            description: "That's it! Start creating engaging captions for your Instagram posts. Need help again? Click the question mark button anytime.",
+            target: null,
+            position: "center"
+        }
+    ];
+
+    function showTutorial() {
+        currentStep = 0;
+        tutorialOverlay.classList.add('active');
+        tutorialStartBtn.classList.add('hidden');
+        tutorialSpotlight.classList.remove('show');
+        updateTutorialStep();
+    }
+
+    function hideTutorial() {
+        tutorialOverlay.classList.remove('active');
+        tutorialStartBtn.classList.remove('hidden');
+
+        // Reset any highlighted elements
+        resetHighlightedElements();
+
+        // Hide spotlight
+        tutorialSpotlight.style.display = 'none';
+    }
+
+    function updateTutorialStep() {
+        const step = tutorialSteps[currentStep];
+
+        // Update content
+        tutorialTitle.textContent = step.title;
+        tutorialDescription.textContent = step.description;
+        tutorialCounter.textContent = `${currentStep + 1}/${totalSteps}`;
+
+        // Update progress bar
+        const progress = ((currentStep + 1) / totalSteps) * 100;
+        tutorialProgressBar.style.width = `${progress}%`;
+
+        // Update navigation buttons
+        tutorialPrev.style.display = currentStep > 0 ? 'block' : 'none';
+
+        if (currentStep === 0) {
+            tutorialNext.textContent = 'Start';
+        } else if (currentStep === totalSteps - 1) {
+            tutorialNext.textContent = 'Done';
+            tutorialNext.classList.add('primary');
+        } else {
+            tutorialNext.textContent = 'Next';
+            tutorialNext.classList.remove('primary');
+        }
+
+        // Position spotlight and tooltip
+        positionTutorialElements(step);
+    }
+
+    function resetHighlightedElements() {
+        // Reset any previously highlighted elements
+        document.querySelectorAll('[style*="z-index: 10003"]').forEach(el => {
+            el.style.position = '';
+            el.style.zIndex = '';
+            el.style.filter = '';
+            el.style.transform = '';
+            el.style.transition = '';
+            el.style.outline = '';
+            el.style.outlineOffset = '';
+            el.style.borderRadius = '';
+            el.style.boxShadow = '';
+            el.style.background = '';
+            el.style.animation = '';
+        });
+
+        // Also reset by common selectors to ensure cleanup
+        ['#topic', '.tone-grid', '#generateBtn', '.generate-btn', '.features-section', '#features-container', '.section-separator'].forEach(selector => {
+            const element = document.querySelector(selector);
+            if (element) {
+                element.style.position = '';
+                element.style.zIndex = '';
+                element.style.filter = '';
+                element.style.transform = '';
+                element.style.transition = '';
+                element.style.outline = '';
+                element.style.outlineOffset = '';
+                element.style.borderRadius = '';
+                element.style.boxShadow = '';
+                element.style.background = '';
+                element.style.animation = '';
+            }
+        });
+    }
+
+    function positionTutorialElements(step) {
+        // First, reset ALL previously highlighted elements
+        resetHighlightedElements();
+
+        if (step.target && step.position !== 'center') {
+            const target = document.querySelector(step.target);
+            if (target) {
+                // Use instant scroll to avoid timing issues
+                target.scrollIntoView({ behavior: 'instant', block: 'center' });
+
+                // Calculate base position BEFORE applying any effects
+                const baseRect = target.getBoundingClientRect();
+                const padding = 20; // Account for outline offset
+
+                // Create simple spotlight effect
+                const centerX = baseRect.left + (baseRect.width / 2);
+                const centerY = baseRect.top + (baseRect.height / 2);
+                tutorialSpotlight.style.setProperty('--spotlight-x', `${centerX}px`);
+                tutorialSpotlight.style.setProperty('--spotlight-y', `${centerY}px`);
+                tutorialSpotlight.style.display = 'block';
+
+                // Apply visual effects AFTER positioning
+                target.style.position = 'relative';
+                target.style.zIndex = '10003';
+                target.style.filter = 'brightness(1.4) contrast(1.2) drop-shadow(0 0 20px rgba(102, 126, 234, 0.8))';
+                target.style.transition = 'all 0.3s ease';
+                target.style.outline = '3px solid rgba(102, 126, 234, 1)';
+                target.style.outlineOffset = '6px';
+                target.style.borderRadius = '8px';
+                target.style.boxShadow = '0 0 30px rgba(102, 126, 234, 0.6), 0 0 60px rgba(118, 75, 162, 0.4)';
+                target.style.animation = 'tutorialHighlight 2s ease-in-out infinite';
+
+                // Position tooltip using the original base rect
+                const rect = baseRect;
+
+                // Position tooltip with correct dimensions
+                let tooltipTop, tooltipLeft;
+                const viewportWidth = window.innerWidth;
+                const viewportHeight = window.innerHeight;
+
+                // Get actual tooltip dimensions
+                const tooltipRect = tutorialTooltip.getBoundingClientRect();
+                const tooltipWidth = Math.max(320, tooltipRect.width || 320);
+                const tooltipHeight = Math.max(200, tooltipRect.height || 200);
+
+                const halfTooltipWidth = tooltipWidth / 2;
+                const halfTooltipHeight = tooltipHeight / 2;
+                const margin = 20; // Safe margin from viewport edges
+
+                if (step.position === 'bottom') {
+                    tooltipTop = rect.bottom + padding + 15;
+                    tooltipLeft = rect.left + (rect.width / 2) - halfTooltipWidth;
+                    // Check if tooltip goes off bottom
+                    if (tooltipTop + tooltipHeight > viewportHeight - margin) {
+                        tooltipTop = rect.top - padding - tooltipHeight;
+                    }
+                } else if (step.position === 'top') {
+                    tooltipTop = rect.top - padding - tooltipHeight;
+                    tooltipLeft = rect.left + (rect.width / 2) - halfTooltipWidth;
+                    // Check if tooltip goes off top
+                    if (tooltipTop < margin) {
+                        tooltipTop = rect.bottom + padding + 15;
+                    }
+                } else if (step.position === 'right') {
+                    tooltipTop = rect.top + (rect.height / 2) - halfTooltipHeight;
+                    tooltipLeft = rect.right + padding + 15;
+                    // Check if tooltip goes off right edge
+                    if (tooltipLeft + tooltipWidth > viewportWidth - margin) {
+                        tooltipLeft = rect.left - padding - tooltipWidth;
+                        // If still off screen, position above/below
+                        if (tooltipLeft < margin) {
+                            tooltipLeft = rect.left + (rect.width / 2) - halfTooltipWidth;
+                            tooltipTop = rect.top > tooltipHeight + margin ? rect.top - padding - tooltipHeight : rect.bottom + padding + 15;
+                        }
+                    }
+                } else if (step.position === 'left') {
+                    tooltipTop = rect.top + (rect.height / 2) - halfTooltipHeight;
+                    tooltipLeft = rect.left - padding - tooltipWidth;
+                    // Check if tooltip goes off left edge
+                    if (tooltipLeft < margin) {
+                        tooltipLeft = rect.right + padding + 15;
+                        // If still off screen, position above/below
+                        if (tooltipLeft + tooltipWidth > viewportWidth - margin) {
+                            tooltipLeft = rect.left + (rect.width / 2) - halfTooltipWidth;
+                            tooltipTop = rect.top > tooltipHeight + margin ? rect.top - padding - tooltipHeight : rect.bottom + padding + 15;
+                        }
+                    }
+                }
+
+                // Final safety check with proper margins
+                tooltipTop = Math.max(margin, Math.min(tooltipTop, viewportHeight - tooltipHeight - margin));
+                tooltipLeft = Math.max(margin, Math.min(tooltipLeft, viewportWidth - tooltipWidth - margin));
+
+                tutorialTooltip.style.top = `${tooltipTop}px`;
+                tutorialTooltip.style.left = `${tooltipLeft}px`;
+                tutorialTooltip.style.transform = 'none';
+                tutorialTooltip.style.display = 'block';
+            }
+        } else {
+            // Center tutorial (no target) - hide spotlight
+            tutorialSpotlight.style.display = 'none';
+            tutorialTooltip.style.top = '50%';
+            tutorialTooltip.style.left = '50%';
+            tutorialTooltip.style.transform = 'translate(-50%, -50%)';
+            tutorialTooltip.style.display = 'block';
+        }
+    }
+
+    // Event listeners
+    tutorialStartBtn.addEventListener('click', showTutorial);
+    tutorialSkip.addEventListener('click', hideTutorial);
+
+    tutorialNext.addEventListener('click', function() {
+        if (currentStep < totalSteps - 1) {
+            currentStep++;
+            updateTutorialStep();
+        } else {
+            hideTutorial();
+        }
+    });
+
+    tutorialPrev.addEventListener('click', function() {
+        if (currentStep > 0) {
+            currentStep--;
+            updateTutorialStep();
+        }
+    });
+
+    // Close tutorial on overlay click
+    tutorialOverlay.addEventListener('click', function(e) {
+        if (e.target === tutorialOverlay) {
+            hideTutorial();
+        }
+    });
+
+    // Check if first-time user and show tutorial (disabled for now)
+    // const hasSeenTutorial = localStorage.getItem('hasSeenTutorial');
+    // if (!hasSeenTutorial) {
+    //     setTimeout(() => {
+    //         showTutorial();
+    //         localStorage.setItem('hasSeenTutorial', 'true');
+    //     }, 1500); // Show after page loads
+    // }
+
+    // Reposition tutorial on window resize
+    window.addEventListener('resize', function() {
+        if (tutorialOverlay.classList.contains('active')) {
+            updateTutorialStep();
+        }
+    });
+});
@@ -0,0 +1,87 @@
+import time
+import threading
+
+from candidate_pool import CandidatePool
+
+
+def wait_for_refills(pool, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while pool.snapshot()['refills_in_flight']:
+        assert time.monotonic() < deadline, "refill did not finish"
+        time.sleep(0.01)
+
+
+def captions(prefix, count):
+    return [f"{prefix} {index}" for index in range(count)]
+
+
+def test_take_serves_whole_sets_in_order():
+    pool = CandidatePool(set_size=3)
+    assert pool.take('session', 'key', 3) is None
+    pool.add('session', 'key', captions('c', 5))
+    assert pool.take('session', 'key', 3) == ['c 0', 'c 1', 'c 2']
+    # Two left is not a whole set
+    assert pool.take('session', 'key', 3) is None
+    stats = pool.snapshot()
+    assert stats['hits'] == 1 and stats['misses'] == 2
+
+
+def test_add_skips_captions_already_waiting():
+    pool = CandidatePool()
+    pool.add('session', 'key', ['a', 'b'])
+    pool.add('session', 'key', ['b', 'c'])
+    assert pool.snapshot()['pooled_captions'] == 3
+
+
+def test_low_water_defaults_to_two_sets():
+    assert CandidatePool(set_size=3).low_water == 6
+    assert CandidatePool(set_size=3, low_water=4).low_water == 4
+
+
+def test_refill_starts_while_a_set_is_still_pooled():
+    pool = CandidatePool(set_size=3)
+    produced = []
+
+    def produce():
+        produced.append(1)
+        return captions(f"refill {len(produced)}", 6)
+
+    pool.add('session', 'key', captions('c', 6))
+    # At the low-water mark: nothing to do yet
+    assert pool.refill('session', 'key', produce) is False
+    pool.take('session', 'key', 3)
+    assert pool.refill('session', 'key', produce) is True
+    wait_for_refills(pool)
+    # The next click is still a hit, and the refill has landed behind it
+    assert pool.take('session', 'key', 3) == ['c 3', 'c 4', 'c 5']
+    assert pool.snapshot()['pooled_captions'] == 6
+    assert len(produced) == 1
+
+
+def test_only_one_refill_runs_per_session_and_key():
+    pool = CandidatePool()
+    release = threading.Event()
+    pool.refill('session', 'key', lambda: release.wait(5) and [])
+    assert pool.refill('session', 'key', lambda: []) is False
+    release.set()
+    wait_for_refills(pool)
+
+
+def test_refill_does_not_recreate_a_discarded_session():
+    pool = CandidatePool()
+    release = threading.Event()
+    pool.add('session', 'key', ['a'])
+    pool.refill('session', 'key', lambda: release.wait(5) and captions('late', 6))
+    pool.discard_session('session')
+    release.set()
+    wait_for_refills(pool)
+    assert pool.snapshot()['sessions'] == 0
+
+
+def test_sessions_are_lru_bounded_and_expire():
+    pool = CandidatePool(max_sessions=2, ttl=0.05)
+    for session in ('a', 'b', 'c'):
+        pool.add(session, 'key', ['x'])
+    assert pool.snapshot()['sessions'] == 2 and pool.snapshot()['evictions'] == 1
+    time.sleep(0.1)
+    assert pool.snapshot()['sessions'] == 0
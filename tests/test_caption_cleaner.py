@@ -0,0 +1,75 @@
+import json
+import random
+
+from main import (clean_caption_content, IncrementalCaptionCleaner, IncrementalStructuredCaptionParser,
+                  parse_structured_captions)
+
+RAW_CAPTIONS = """**Funny Tone:**
+1. Coffee first, adulting second ☕😂 #CoffeeLover
+2. Sip happens ✨ #CoffeeTime
+
+10. Brewed to perfection 🌟 #CoffeeMagic
+   Trailing line without a number   """
+
+
+def stream(cleaner, text, sizes):
+    """Feed text in chunks of the given sizes and return every caption emitted along the way"""
+    emitted = []
+    position = 0
+    for size in sizes:
+        emitted.extend(cleaner.feed(text[position:position + size]))
+        position += size
+    emitted.extend(cleaner.feed(text[position:]))
+    emitted.extend(cleaner.finish())
+    return emitted
+
+
+def test_clean_caption_content_drops_headers_and_numbers():
+    assert clean_caption_content(RAW_CAPTIONS).split('\n') == [
+        "Coffee first, adulting second ☕😂 #CoffeeLover",
+        "Sip happens ✨ #CoffeeTime",
+        "Brewed to perfection 🌟 #CoffeeMagic",
+        "Trailing line without a number",
+    ]
+
+
+def test_incremental_cleaner_matches_batch_cleaner_for_any_chunking():
+    rng = random.Random(3)
+    expected = clean_caption_content(RAW_CAPTIONS)
+    for _ in range(200):
+        sizes = [rng.randint(1, 12) for _ in range(len(RAW_CAPTIONS) // 4)]
+        cleaner = IncrementalCaptionCleaner()
+        emitted = stream(cleaner, RAW_CAPTIONS, sizes)
+        assert '\n'.join(emitted) == expected
+        assert cleaner.result() == expected
+
+
+def test_incremental_cleaner_emits_a_caption_only_once_its_line_ends():
+    cleaner = IncrementalCaptionCleaner()
+    assert cleaner.feed("1. First cap") == []
+    assert cleaner.feed("tion\n2. Sec") == ["First caption"]
+    assert cleaner.feed("ond") == []
+    assert cleaner.finish() == ["Second"]
+    assert cleaner.finish() == []
+
+
+def test_structured_parser_matches_batch_parser_for_any_chunking():
+    content = json.dumps({"captions": [
+        {"text": 'Quotes " and {braces} [brackets] \\ inside', "emoji": "✨", "hashtags": ["One", "#two words"]},
+        {"text": "Split\nacross lines", "emoji": "", "hashtags": []},
+        {"text": "Third", "emoji": "🌟", "hashtags": ["Three"]},
+    ]}, ensure_ascii=False)
+    expected = parse_structured_captions(content)
+    rng = random.Random(5)
+    for _ in range(200):
+        sizes = [rng.randint(1, 9) for _ in range(len(content) // 3)]
+        assert stream(IncrementalStructuredCaptionParser(), content, sizes) == expected
+
+
+def test_structured_parser_emits_each_caption_when_its_object_closes():
+    parser = IncrementalStructuredCaptionParser()
+    assert parser.feed('{"captions": [{"text": "One", "emoji": "", "hasht') == []
+    assert parser.feed('ags": ["A"]}, {"text": "Tw') == ["One #A"]
+    # A caption cut off by max_tokens is dropped rather than half-shown
+    assert parser.finish() == []
+    assert parser.result() == "One #A"
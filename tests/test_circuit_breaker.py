@@ -0,0 +1,89 @@
+import time
+
+import pytest
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError, CLOSED, OPEN, HALF_OPEN
+from main import translate_openai_error, degrade_reason, UpstreamError
+
+
+class FakeStatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"Error code: {status_code}")
+        self.status_code = status_code
+
+
+def fail(status_code):
+    def send():
+        raise FakeStatusError(status_code)
+    return send
+
+
+def breaker(**options):
+    settings = dict(failure_ratio=0.5, min_calls=4, window=30.0, slow_call_seconds=10.0, open_seconds=0.05,
+                    half_open_probes=2)
+    settings.update(options)
+    return CircuitBreaker(**settings)
+
+
+def test_opens_once_the_failure_share_reaches_the_ratio():
+    cb = breaker()
+    for _ in range(2):
+        cb.call(lambda: 'ok')
+    with pytest.raises(FakeStatusError):
+        cb.call(fail(500))
+    assert cb.state == CLOSED
+    with pytest.raises(FakeStatusError):
+        cb.call(fail(503))
+    assert cb.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        cb.call(lambda: 'ok')
+    assert cb.snapshot()['rejected'] == 1
+
+
+def test_client_errors_do_not_count_against_upstream_health():
+    cb = breaker(min_calls=2)
+    for status in (400, 401, 429, 429):
+        with pytest.raises(FakeStatusError):
+            cb.call(fail(status))
+    assert cb.state == CLOSED
+    assert cb.snapshot()['window_calls'] == 0
+
+
+def test_slow_calls_count_as_failures():
+    cb = breaker(min_calls=2)
+    cb.record(12.0, True)
+    cb.record(11.0, True)
+    assert cb.state == OPEN
+    assert cb.snapshot()['slow_calls'] == 2
+
+
+def test_half_open_probes_close_the_breaker_when_they_succeed():
+    cb = breaker(min_calls=1)
+    cb.record(0.1, False)
+    assert cb.state == OPEN
+    time.sleep(0.06)
+    assert cb.allow() and cb.allow()
+    assert cb.state == HALF_OPEN
+    # Only half_open_probes calls go through while probing
+    assert not cb.allow()
+    cb.record(0.1, True)
+    cb.record(0.1, True)
+    assert cb.state == CLOSED
+
+
+def test_a_failed_probe_opens_the_breaker_again():
+    cb = breaker(min_calls=1)
+    cb.record(0.1, False)
+    time.sleep(0.06)
+    with pytest.raises(FakeStatusError):
+        cb.call(fail(502))
+    assert cb.state == OPEN
+    assert cb.snapshot()['opened'] == 2
+
+
+def test_only_transient_upstream_errors_are_served_degraded():
+    assert degrade_reason(translate_openai_error(CircuitOpenError("open"))) == 'circuit_open'
+    assert degrade_reason(translate_openai_error(FakeStatusError(503))) == 'upstream_error'
+    assert isinstance(translate_openai_error(FakeStatusError(500)), UpstreamError)
+    for error in (FakeStatusError(400), ValueError("Expecting value: line 1 column 1")):
+        assert degrade_reason(translate_openai_error(error)) is None
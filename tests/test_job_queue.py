@@ -0,0 +1,107 @@
+import time
+
+import pytest
+
+from job_queue import JobQueue, JobFailed, RetryJob, QueueFull, QUEUED, RUNNING, DONE, FAILED
+
+
+def make_queue(tmp_path, handler=lambda job: 'captions', **options):
+    return JobQueue(str(tmp_path / 'jobs.db'), handler, **options)
+
+
+def stored(queue, job_id):
+    """The raw row, including the API key that get() never returns"""
+    return dict(queue._connect().execute("SELECT * FROM caption_jobs WHERE id = ?", (job_id,)).fetchone())
+
+
+def run_next(queue):
+    job = queue._claim()
+    assert job is not None
+    queue._run(job)
+    return job['id']
+
+
+def test_job_runs_and_clears_its_api_key(tmp_path):
+    queue = make_queue(tmp_path)
+    job_id = queue.submit('coffee', 'Funny', api_key='sk-test')
+    assert queue.get(job_id)['status'] == QUEUED
+    assert stored(queue, job_id)['api_key'] == 'sk-test'
+
+    run_next(queue)
+    job = queue.get(job_id)
+    assert job['status'] == DONE and job['result'] == 'captions'
+    assert 'api_key' not in job
+    assert stored(queue, job_id)['api_key'] is None
+
+
+def test_higher_priority_jobs_are_claimed_first(tmp_path):
+    queue = make_queue(tmp_path)
+    low = queue.submit('a', 'Funny', priority=1)
+    high = queue.submit('b', 'Funny', priority=9)
+    assert queue.get(low)['position'] == 1
+    assert queue._claim()['id'] == high
+
+
+def test_expired_lease_is_reclaimed(tmp_path):
+    queue = make_queue(tmp_path, lease_seconds=0.05)
+    job_id = queue.submit('coffee', 'Funny')
+    first = queue._claim()
+    assert first['id'] == job_id and first['attempts'] == 1
+    # The claiming worker died without finishing; nobody can take the job until its lease runs out
+    assert queue._claim() is None
+    time.sleep(0.1)
+    again = queue._claim()
+    assert again['id'] == job_id and again['attempts'] == 2
+    assert queue.snapshot()['reclaimed'] == 1
+
+
+def test_transient_failures_are_retried_with_backoff_then_failed(tmp_path):
+    def handler(job):
+        raise RetryJob("OpenAI is busy", 'rate_limited')
+
+    queue = make_queue(tmp_path, handler, max_attempts=2)
+    job_id = queue.submit('coffee', 'Funny', api_key='sk-test')
+    run_next(queue)
+    row = stored(queue, job_id)
+    assert row['status'] == QUEUED and row['run_after'] > time.time()
+    # Not runnable again until the backoff passes
+    assert queue._claim() is None
+
+    queue._connect().execute("UPDATE caption_jobs SET run_after = 0 WHERE id = ?", (job_id,))
+    run_next(queue)
+    job = queue.get(job_id)
+    assert job['status'] == FAILED and job['error_kind'] == 'rate_limited'
+    assert stored(queue, job_id)['api_key'] is None
+
+
+def test_permanent_failures_fail_at_once(tmp_path):
+    def handler(job):
+        raise JobFailed("Invalid API key", 'auth')
+
+    queue = make_queue(tmp_path, handler)
+    job_id = queue.submit('coffee', 'Funny')
+    run_next(queue)
+    job = queue.get(job_id)
+    assert job['status'] == FAILED and job['error_kind'] == 'auth' and job['attempts'] == 1
+
+
+def test_prune_expires_stale_jobs_and_clears_their_keys(tmp_path):
+    queue = make_queue(tmp_path, queue_ttl=0.05, lease_seconds=0.05)
+    waiting = queue.submit('a', 'Funny', api_key='sk-waiting')
+    abandoned = queue.submit('b', 'Funny', api_key='sk-abandoned')
+    queue._connect().execute("UPDATE caption_jobs SET status = ?, lease_expires = 0 WHERE id = ?",
+                             (RUNNING, abandoned))
+    time.sleep(0.1)
+    queue.prune()
+    for job_id in (waiting, abandoned):
+        assert queue.get(job_id)['error_kind'] == 'expired'
+        assert stored(queue, job_id)['api_key'] is None
+    assert queue.snapshot()['expired'] == 2
+
+
+def test_full_queue_rejects_submits(tmp_path):
+    queue = make_queue(tmp_path, max_depth=1)
+    queue.submit('a', 'Funny')
+    with pytest.raises(QueueFull):
+        queue.submit('b', 'Funny')
+    assert queue.snapshot()['rejected'] == 1
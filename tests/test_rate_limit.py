@@ -0,0 +1,127 @@
+import pytest
+
+import rate_limit
+from rate_limit import RateLimiter, RateLimitTimeout, parse_duration, retry_after_seconds, is_hard_quota_error
+
+
+class FakeResponse:
+    def __init__(self, headers=None):
+        self.headers = headers or {}
+
+
+class FakeStatusError(Exception):
+    """Stands in for an openai.APIStatusError"""
+
+    def __init__(self, status_code, headers=None, code=None):
+        super().__init__(f"Error code: {status_code}")
+        self.status_code = status_code
+        self.code = code
+        self.response = FakeResponse(headers)
+
+
+class FakeRaw:
+    """Stands in for a with_raw_response result"""
+
+    def __init__(self, headers=None, result='ok'):
+        self.headers = headers or {}
+        self.result = result
+
+    def parse(self):
+        return self.result
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record sleeps instead of waiting"""
+    recorded = []
+    monkeypatch.setattr(rate_limit.time, 'sleep', recorded.append)
+    return recorded
+
+
+def test_parse_duration():
+    assert parse_duration("1s") == 1.0
+    assert parse_duration("20ms") == pytest.approx(0.02)
+    assert parse_duration("6m0s") == 360.0
+    assert parse_duration("1h2m3.5s") == pytest.approx(3723.5)
+    assert parse_duration("2.5") == 2.5
+    assert parse_duration("soon") is None
+    assert parse_duration(None) is None
+
+
+def test_retry_after_prefers_milliseconds_and_ignores_dates():
+    assert retry_after_seconds({'retry-after-ms': '1500', 'retry-after': '9'}) == 1.5
+    assert retry_after_seconds({'retry-after': '2'}) == 2.0
+    assert retry_after_seconds({'retry-after': 'Wed, 21 Oct 2015 07:28:00 GMT'}) is None
+    assert retry_after_seconds(None) is None
+
+
+def test_hard_quota_errors_are_told_apart_from_transient_429s():
+    assert is_hard_quota_error(FakeStatusError(429, code='insufficient_quota'))
+    assert not is_hard_quota_error(FakeStatusError(429, code='rate_limit_exceeded'))
+
+
+def test_requests_queue_once_the_bucket_from_headers_is_empty():
+    limiter = RateLimiter(deadline=60)
+    limiter.observe('key', {'x-ratelimit-limit-requests': '60', 'x-ratelimit-remaining-requests': '1',
+                            'x-ratelimit-reset-requests': '1s'})
+    deadline = rate_limit.time.monotonic() + 60
+    assert limiter.reserve('key', 1, deadline) == 0
+    # 59 requests come back per second, so the next one waits about 1/59s
+    assert 0 < limiter.reserve('key', 1, deadline) < 0.1
+    assert limiter.snapshot()['queued'] == 1
+
+
+def test_wait_past_the_deadline_raises_and_gives_the_reservation_back():
+    limiter = RateLimiter()
+    limiter.observe('key', {'x-ratelimit-limit-requests': '1', 'x-ratelimit-remaining-requests': '0',
+                            'x-ratelimit-reset-requests': '60s'})
+    bucket = limiter._keys['key'].buckets['requests']
+    with pytest.raises(RateLimitTimeout):
+        limiter.reserve('key', 1, rate_limit.time.monotonic() + 1)
+    assert bucket.tokens == pytest.approx(0, abs=0.01)
+    assert limiter.snapshot()['deadline_exceeded'] == 1
+
+
+def test_429_is_retried_after_retry_after(sleeps):
+    limiter = RateLimiter(base_delay=0.1)
+    outcomes = [FakeStatusError(429, {'retry-after': '2'}), FakeRaw(result='captions')]
+
+    def send():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert limiter.call('sk-test', send) == 'captions'
+    # Sleeps aren't real here, so the key is still blocked when the retry reserves and it waits again
+    assert 2.0 <= sleeps[0] <= 2.1 and all(0 < s <= sleeps[0] for s in sleeps)
+    stats = limiter.snapshot()
+    assert stats['upstream_429s'] == 1 and stats['retries'] == 1
+
+
+def test_hard_quota_and_client_errors_are_not_retried(sleeps):
+    limiter = RateLimiter()
+    for error in (FakeStatusError(429, code='insufficient_quota'), FakeStatusError(400)):
+        calls = []
+
+        def send():
+            calls.append(1)
+            raise error
+
+        with pytest.raises(FakeStatusError):
+            limiter.call('sk-test', send)
+        assert len(calls) == 1
+    assert sleeps == []
+    assert limiter.snapshot()['hard_quota_errors'] == 1
+
+
+def test_retries_stop_at_the_deadline(sleeps):
+    limiter = RateLimiter(deadline=1.0)
+
+    def send():
+        raise FakeStatusError(429, {'retry-after': '5'})
+
+    with pytest.raises(FakeStatusError):
+        limiter.call('sk-test', send)
+    assert sleeps == []
+    assert limiter.snapshot()['deadline_exceeded'] == 1
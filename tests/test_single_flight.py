@@ -0,0 +1,129 @@
+import os
+import time
+import threading
+
+import pytest
+
+from single_flight import SingleFlight, _FileLock
+
+
+def run_concurrently(count, target):
+    """Start count threads on target(index) at once and return their results (or exceptions)"""
+    results = [None] * count
+    barrier = threading.Barrier(count)
+
+    def worker(index):
+        barrier.wait()
+        try:
+            results[index] = target(index)
+        except Exception as e:
+            results[index] = e
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    return results
+
+
+def slow_call(release, calls, result='captions', error=None):
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        if error is not None:
+            raise error
+        return result
+    return fn
+
+
+def test_identical_calls_share_one_upstream_call():
+    flight = SingleFlight()
+    release, calls = threading.Event(), []
+    fn = slow_call(release, calls)
+    threading.Timer(0.2, release.set).start()
+    assert run_concurrently(5, lambda i: flight.do('key', 'owner', fn)) == ['captions'] * 5
+    assert len(calls) == 1
+    assert flight.snapshot()['coalesced'] == 4
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_errors_are_shared_with_the_same_owner_only():
+    flight = SingleFlight()
+    release, calls = threading.Event(), []
+    leader_error = ValueError("quota exceeded for the leader's key")
+    outcomes = {}
+
+    def call(name, owner, fn):
+        try:
+            outcomes[name] = flight.do('key', owner, fn)
+        except Exception as e:
+            outcomes[name] = e
+
+    threads = [threading.Thread(target=call, args=('leader', 'owner-a', slow_call(release, calls, error=leader_error)))]
+    threads[0].start()
+    wait_until(lambda: 'key' in flight._calls)
+    for owner in ('owner-a', 'owner-b'):
+        threads.append(threading.Thread(target=call, args=(owner, owner, lambda: 'own captions')))
+        threads[-1].start()
+    wait_until(lambda: flight._calls['key'].followers == 2)
+    release.set()
+    for thread in threads:
+        thread.join(10)
+
+    assert outcomes['leader'] is leader_error
+    # Same API key: the leader's error applies; another key retries on its own
+    assert outcomes['owner-a'] is leader_error
+    assert outcomes['owner-b'] == 'own captions'
+    assert len(calls) == 1
+
+
+def test_stream_followers_replay_the_leaders_items():
+    flight = SingleFlight()
+    release, calls = threading.Event(), []
+
+    def produce():
+        calls.append(1)
+        release.wait(5)
+        yield from ['one', 'two', 'three']
+
+    threading.Timer(0.2, release.set).start()
+    results = run_concurrently(4, lambda i: list(flight.stream('key', 'owner', produce)))
+    assert results == [['one', 'two', 'three']] * 4
+    assert len(calls) == 1
+
+
+def test_stream_followers_finish_by_themselves_when_the_leader_goes_away():
+    flight = SingleFlight()
+    leader = flight.stream('key', 'owner', lambda: iter(['one', 'two', 'three']))
+    assert next(leader) == 'one'
+    follower = flight.stream('key', 'owner', lambda: iter(['one', 'two', 'three']))
+    assert next(follower) == 'one'
+    # The leader's client disconnects after one caption
+    leader.close()
+    assert list(follower) == ['two', 'three']
+
+
+def test_file_lock_timeout_leaves_the_holders_lock_alone(tmp_path):
+    fcntl = pytest.importorskip("fcntl")
+    holder = SingleFlight(lock_dir=str(tmp_path))
+    waiter = SingleFlight(lock_dir=str(tmp_path), lock_timeout=0.1)
+    held = _FileLock(holder, 'key')
+    assert held.__enter__() is False
+    try:
+        with _FileLock(waiter, 'key') as waited:
+            # Timed out: the call goes ahead uncoordinated, after re-checking the cache
+            assert waited is True
+        assert os.path.exists(held.path)
+        with open(held.path, 'a') as handle, pytest.raises(BlockingIOError):
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        assert waiter.snapshot()['cross_worker_timeouts'] == 1
+    finally:
+        held.__exit__(None, None, None)
+    assert not os.path.exists(held.path)